@@ -0,0 +1,190 @@
+# async_routes.py
+"""
+async def variants of the form routes running on the AsyncEngine.
+Mounted under /api/async/forms when ASYNC_DB_ENABLED is set.
+"""
+from fastapi import APIRouter, HTTPException, Depends, Request, status
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from datetime import datetime
+
+from database import get_async_sessionmaker
+from models import User, FormSubmission
+from schemas import FormSubmissionCreate, FormSubmissionResponse, FormSubmissionUpdate
+from crud import (
+    submissions_query, submission_by_id_query, paginate_submissions, next_cursor,
+    parse_form_data_filters, update_submission_columns, UpdateConflict
+)
+from serializers import submission_response, submissions_response
+from stats import record_created, record_changed
+from change_feed import record_changes, submission_payload
+from cache import USER_CACHE_ENABLED, MISSING, resolve_token, user_cache
+from metrics import timed
+
+router = APIRouter(prefix="/api/async/forms", tags=["async forms"])
+
+security = HTTPBearer()
+
+# Dependency to get an async database session
+async def get_async_db():
+    async with get_async_sessionmaker()() as db:
+        yield db
+
+# Dependency to get current user
+async def get_current_user_async(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(get_async_db)
+):
+    with timed("jwt"):
+        user_id = resolve_token(credentials.credentials)
+    if not user_id:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid authentication credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    with timed("user_lookup"):
+        user = user_cache.get(user_id) if USER_CACHE_ENABLED else MISSING
+        if user is MISSING:
+            user = await db.get(User, user_id)
+            if user and USER_CACHE_ENABLED:
+                db.expunge(user)
+                user_cache.set(user_id, user)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User not found"
+        )
+    return user
+
+async def get_owned_submission(db: AsyncSession, user_id: int, submission_id: int) -> FormSubmission:
+    # Query objects are only used to build the statement; execution is async
+    statement = submission_by_id_query(db.sync_session, user_id, submission_id).statement
+    submission = (await db.scalars(statement)).first()
+    if not submission:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Form submission not found"
+        )
+    return submission
+
+@router.post("/submit", response_model=FormSubmissionResponse, status_code=status.HTTP_201_CREATED)
+async def submit_form_async(
+    form_data: FormSubmissionCreate,
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Submit a new form with various data fields
+    """
+    now = datetime.utcnow()
+    db_form = FormSubmission(
+        user_id=current_user.id,
+        form_type=form_data.form_type,
+        title=form_data.title,
+        description=form_data.description,
+        category=form_data.category,
+        priority=form_data.priority,
+        status="submitted",
+        form_data=form_data.form_data,
+        attachments=form_data.attachments,
+        submitted_at=now,
+        updated_at=now
+    )
+
+    db.add(db_form)
+    await db.run_sync(
+        lambda session: record_created(session, current_user.id, [("submitted", db_form.form_type, db_form.priority)])
+    )
+    await db.flush()
+    await db.run_sync(
+        lambda session: record_changes(session, current_user.id, "created", [submission_payload(db_form.id, db_form)])
+    )
+    await db.commit()
+
+    return submission_response(db_form, status_code=status.HTTP_201_CREATED)
+
+@router.get("/submissions", response_model=List[FormSubmissionResponse])
+async def get_user_submissions_async(
+    request: Request,
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
+    skip: int = 0,
+    limit: int = 10,
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    form_type: Optional[str] = None
+):
+    """
+    Get all form submissions for the authenticated user with optional filters
+    """
+    try:
+        form_data = parse_form_data_filters(request.query_params)
+        query = submissions_query(
+            db.sync_session, current_user.id, status=status, form_type=form_type, form_data=form_data
+        )
+        statement = paginate_submissions(query, limit, skip=skip, cursor=cursor).statement
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    submissions = (await db.scalars(statement)).all()
+
+    headers = {}
+    cursor_for_next_page = next_cursor(submissions, limit)
+    if cursor_for_next_page:
+        headers["X-Next-Cursor"] = cursor_for_next_page
+
+    return submissions_response(submissions, headers=headers)
+
+@router.get("/submissions/{submission_id}", response_model=FormSubmissionResponse)
+async def get_submission_by_id_async(
+    submission_id: int,
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Get a specific form submission by ID
+    """
+    submission = await get_owned_submission(db, current_user.id, submission_id)
+    return submission_response(submission)
+
+@router.put("/submissions/{submission_id}", response_model=FormSubmissionResponse)
+async def update_submission_async(
+    submission_id: int,
+    form_update: FormSubmissionUpdate,
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Update a form submission
+    """
+    def update(session):
+        # Same version-guarded UPDATE as the sync route, so the stats move from the row's real previous values
+        previous, row = update_submission_columns(
+            session, current_user.id, submission_id, form_update.model_dump(exclude_none=True)
+        )
+        if row is not None:
+            if previous is not None:
+                record_changed(
+                    session, current_user.id, (previous.status, previous.form_type, previous.priority),
+                    (row.status, row.form_type, row.priority)
+                )
+            record_changes(session, current_user.id, "updated", [submission_payload(row.id, row)])
+        return row
+
+    try:
+        row = await db.run_sync(update)
+    except UpdateConflict:
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Form submission is being modified, retry")
+    if row is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Form submission not found"
+        )
+
+    await db.commit()
+
+    return submission_response(row)
@@ -0,0 +1,547 @@
+# attachments.py
+"""
+File attachments for submissions.
+
+Uploads are streamed to a staging file while being hashed, then moved into a
+content-addressed blob store (blobs/<sha256[:2]>/<sha256>), so identical files
+are stored once however often they are uploaded. Two ways in:
+
+    multipart/form-data   one request, any number of file parts, parsed as it arrives
+    resumable uploads     create an upload, then PATCH raw chunks at Upload-Offset
+                          until the declared size is reached
+
+Downloads honour Range / If-Range and use the server's zero-copy send
+extension when it offers one. Unreferenced blobs and abandoned uploads are
+removed by:
+
+    python attachments.py gc [--grace-hours 1]
+"""
+from datetime import datetime, timedelta
+from typing import Any, Callable, List, Optional, Tuple
+from urllib.parse import quote
+from sqlalchemy import select
+from sqlalchemy.orm import Query, Session
+from starlette.responses import Response
+import anyio
+import argparse
+import hashlib
+import mimetypes
+import os
+import re
+import secrets
+
+try:
+    import fcntl
+except ImportError:  # Windows: concurrent PATCHes to one upload are not detected
+    fcntl = None
+
+from multipart.multipart import MultipartParser, parse_options_header
+
+from database import SessionLocal
+from models import Attachment, AttachmentUpload
+
+# Configuration
+ATTACHMENT_DIR = os.getenv("ATTACHMENT_DIR", "attachments")
+ATTACHMENT_MAX_BYTES = int(os.getenv("ATTACHMENT_MAX_BYTES", str(50 * 1024 * 1024)))
+# Resumable uploads untouched for this long are deleted by `python attachments.py gc`
+ATTACHMENT_UPLOAD_TTL_HOURS = float(os.getenv("ATTACHMENT_UPLOAD_TTL_HOURS", "24"))
+
+CHUNK_SIZE = 1024 * 1024
+DEFAULT_CONTENT_TYPE = "application/octet-stream"
+# Attachment bytes never change for a given id
+DOWNLOAD_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class InvalidUpload(ValueError):
+    """
+    Raised for a malformed upload request
+    """
+
+
+class AttachmentTooLarge(Exception):
+    """
+    Raised when a file grows past ATTACHMENT_MAX_BYTES or its declared size
+    """
+
+
+class UploadOffsetMismatch(Exception):
+    """
+    Raised when a chunk does not start where the upload currently ends
+    """
+
+    def __init__(self, offset: int):
+        super().__init__(f"Upload is at offset {offset}")
+        self.offset = offset
+
+
+class UploadBusy(Exception):
+    """
+    Raised when another request is writing to the same resumable upload
+    """
+
+
+class UploadGone(Exception):
+    """
+    Raised when a resumable upload was completed (or removed) by another request
+    """
+
+
+def clean_filename(filename: Optional[str]) -> str:
+    name = os.path.basename((filename or "").replace("\\", "/"))
+    name = "".join(char for char in name if char.isprintable())[:255]
+    return name or "attachment"
+
+
+def guess_content_type(filename: str, declared: Optional[str] = None) -> str:
+    if declared and "/" in declared:
+        return declared[:100]
+    return mimetypes.guess_type(filename)[0] or DEFAULT_CONTENT_TYPE
+
+
+class BlobStore:
+    """
+    Content-addressed files under one root; staging files live on the same
+    filesystem so they can be renamed into place atomically
+    """
+
+    def __init__(self, root: str = ATTACHMENT_DIR):
+        self.root = root
+        self.blobs_dir = os.path.join(root, "blobs")
+        self.uploads_dir = os.path.join(root, "uploads")
+
+    def blob_path(self, digest: str) -> str:
+        return os.path.join(self.blobs_dir, digest[:2], digest)
+
+    def staging_path(self, name: str) -> str:
+        os.makedirs(self.uploads_dir, exist_ok=True)
+        return os.path.join(self.uploads_dir, name)
+
+    def commit(self, staged_path: str, digest: str) -> None:
+        """
+        Move a fully written staging file to its blob path, or drop it if that content is already stored
+        """
+        target = self.blob_path(digest)
+        if os.path.exists(target):
+            os.unlink(staged_path)
+            # Fresh mtime keeps gc from collecting the blob before the new reference is committed
+            os.utime(target)
+            return
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(staged_path, target)
+
+
+store = BlobStore()
+
+
+class StagedFile:
+    """
+    A file being written to the staging area, hashed as it goes
+    """
+
+    def __init__(self, path: str, filename: str, content_type: str, max_bytes: int = ATTACHMENT_MAX_BYTES):
+        self.path = path
+        self.filename = filename
+        self.content_type = content_type
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.sha256 = None
+        self._hash = hashlib.sha256()
+        self._file = open(path, "wb")
+
+    def write(self, data: bytes) -> None:
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            raise AttachmentTooLarge(f"Attachments are limited to {self.max_bytes} bytes")
+        self._hash.update(data)
+        self._file.write(data)
+
+    def close(self) -> None:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self.sha256 = self._hash.hexdigest()
+
+    def discard(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+class MultipartReader:
+    """
+    Incremental multipart/form-data parser that streams each file part into a
+    StagedFile. Not async: feed() it body chunks from a worker thread.
+    Non-file fields are ignored.
+    """
+
+    def __init__(self, content_type: str, staging: BlobStore = store):
+        media_type, options = parse_options_header(content_type)
+        boundary = options.get(b"boundary")
+        if media_type != b"multipart/form-data" or not boundary:
+            raise InvalidUpload("Expected a multipart/form-data body")
+        self.store = staging
+        self.files: List[StagedFile] = []
+        self._current: Optional[StagedFile] = None
+        self._headers = {}
+        self._field = b""
+        self._value = b""
+        self._parser = MultipartParser(boundary, {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        })
+
+    def _on_part_begin(self):
+        self._headers = {}
+
+    def _on_header_field(self, data, start, end):
+        self._field += data[start:end]
+
+    def _on_header_value(self, data, start, end):
+        self._value += data[start:end]
+
+    def _on_header_end(self):
+        self._headers[self._field.lower()] = self._value
+        self._field = self._value = b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        if b"filename" not in options:
+            return
+        filename = clean_filename(options[b"filename"].decode("utf-8", "replace"))
+        declared_type = self._headers.get(b"content-type", b"").decode("latin-1").strip()
+        self._current = StagedFile(
+            self.store.staging_path(f"{secrets.token_hex(16)}.tmp"),
+            filename, guess_content_type(filename, declared_type)
+        )
+        self.files.append(self._current)
+
+    def _on_part_data(self, data, start, end):
+        if self._current is not None:
+            self._current.write(data[start:end])
+
+    def _on_part_end(self):
+        if self._current is not None:
+            self._current.close()
+            self._current = None
+
+    def feed(self, chunk: bytes) -> None:
+        self._parser.write(chunk)
+
+    def finish(self) -> List[StagedFile]:
+        self._parser.finalize()
+        if self._current is not None or not self.files:
+            raise InvalidUpload("The multipart body contains no complete file part")
+        return self.files
+
+    def discard(self) -> None:
+        for staged in self.files:
+            staged.discard()
+
+
+async def read_multipart(request, staging: BlobStore = store) -> List[StagedFile]:
+    """
+    Stream a multipart/form-data request body into staged files without holding it in memory
+    """
+    reader = MultipartReader(request.headers.get("content-type", ""), staging)
+    try:
+        async for chunk in request.stream():
+            if chunk:
+                await anyio.to_thread.run_sync(reader.feed, chunk)
+        return await anyio.to_thread.run_sync(reader.finish)
+    except BaseException:
+        await anyio.to_thread.run_sync(reader.discard)
+        raise
+
+
+def add_attachment(db: Session, submission_id: int, user_id: int, path: str, filename: str,
+                   content_type: str, size: int, digest: str) -> Attachment:
+    store.commit(path, digest)
+    attachment = Attachment(
+        submission_id=submission_id, user_id=user_id, filename=filename,
+        content_type=content_type, size=size, sha256=digest
+    )
+    db.add(attachment)
+    return attachment
+
+
+def attachments_query(db: Session, user_id: int, submission_id: int) -> Query:
+    """
+    A submission's attachments, oldest first
+    """
+    return db.query(Attachment).filter(
+        Attachment.submission_id == submission_id, Attachment.user_id == user_id
+    ).order_by(Attachment.id)
+
+
+def attachment_by_id_query(db: Session, user_id: int, submission_id: int, attachment_id: int) -> Query:
+    return db.query(Attachment).filter(
+        Attachment.id == attachment_id,
+        Attachment.submission_id == submission_id,
+        Attachment.user_id == user_id
+    )
+
+
+def store_attachments(db: Session, submission_id: int, user_id: int, files: List[StagedFile]) -> List[Attachment]:
+    """
+    Move staged files into the blob store and record them against the submission.
+    The caller commits.
+    """
+    attachments = [
+        add_attachment(db, submission_id, user_id, staged.path, staged.filename,
+                       staged.content_type, staged.size, staged.sha256)
+        for staged in files
+    ]
+    db.flush()
+    return attachments
+
+
+# Resumable uploads
+
+def create_upload(db: Session, submission_id: int, user_id: int, filename: str,
+                  content_type: Optional[str], size: int) -> AttachmentUpload:
+    if size > ATTACHMENT_MAX_BYTES:
+        raise AttachmentTooLarge(f"Attachments are limited to {ATTACHMENT_MAX_BYTES} bytes")
+    filename = clean_filename(filename)
+    upload = AttachmentUpload(
+        id=secrets.token_hex(16), submission_id=submission_id, user_id=user_id,
+        filename=filename, content_type=guess_content_type(filename, content_type), size=size
+    )
+    open(upload_path(upload.id), "wb").close()
+    db.add(upload)
+    return upload
+
+
+def upload_by_id_query(db: Session, user_id: int, upload_id: str) -> Query:
+    return db.query(AttachmentUpload).filter(AttachmentUpload.id == upload_id, AttachmentUpload.user_id == user_id)
+
+
+def upload_path(upload_id: str) -> str:
+    return store.staging_path(f"{upload_id}.part")
+
+
+def upload_offset(upload_id: str) -> int:
+    """
+    Bytes received so far. The file is the source of truth: bytes written by a
+    request that died halfway still count, so the client resumes right after them.
+    """
+    try:
+        return os.path.getsize(upload_path(upload_id))
+    except FileNotFoundError:
+        return 0
+
+
+class UploadChunkWriter:
+    """
+    Appends one PATCH body to a resumable upload's file under an exclusive lock
+    """
+
+    def __init__(self, upload: AttachmentUpload, offset: int):
+        self.upload = upload
+        path = upload_path(upload.id)
+        try:
+            self._file = open(path, "r+b")
+        except FileNotFoundError:
+            raise UploadGone()
+        if fcntl is not None:
+            try:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                self._file.close()
+                raise UploadBusy()
+        try:
+            # Completing moves the file into the blob store; an inode we opened before that is not the upload
+            moved = os.fstat(self._file.fileno()).st_ino != os.stat(path).st_ino
+        except FileNotFoundError:
+            moved = True
+        if moved:
+            self._file.close()
+            raise UploadGone()
+        self._file.seek(0, os.SEEK_END)
+        self.offset = self._file.tell()
+        if offset != self.offset:
+            self.close()
+            raise UploadOffsetMismatch(self.offset)
+
+    def write(self, data: bytes) -> None:
+        if self.offset + len(data) > self.upload.size:
+            raise AttachmentTooLarge(f"Upload is declared as {self.upload.size} bytes")
+        self._file.write(data)
+        self.offset += len(data)
+
+    def sync(self) -> None:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        self.sync()
+        self._file.close()
+
+
+async def append_chunk(request, upload: AttachmentUpload, offset: int,
+                       complete: Callable[[], Any]) -> Tuple[int, Any]:
+    """
+    Stream the request body onto the upload. Returns the new offset and, once
+    every byte is in, the result of complete(), which runs while the upload is
+    still locked so two requests can never both complete it.
+    """
+    writer = await anyio.to_thread.run_sync(UploadChunkWriter, upload, offset)
+    completed = None
+    try:
+        async for chunk in request.stream():
+            if chunk:
+                await anyio.to_thread.run_sync(writer.write, chunk)
+        if writer.offset == upload.size:
+            await anyio.to_thread.run_sync(writer.sync)
+            completed = await anyio.to_thread.run_sync(complete)
+    finally:
+        await anyio.to_thread.run_sync(writer.close)
+    return writer.offset, completed
+
+
+def complete_upload(db: Session, upload: AttachmentUpload) -> Attachment:
+    """
+    Hash the finished upload, move it into the blob store and replace the upload with an attachment.
+    The caller commits.
+    """
+    path = upload_path(upload.id)
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for block in iter(lambda: handle.read(CHUNK_SIZE), b""):
+            digest.update(block)
+    db.delete(upload)
+    attachment = add_attachment(db, upload.submission_id, upload.user_id, path, upload.filename,
+                                upload.content_type, upload.size, digest.hexdigest())
+    db.flush()
+    return attachment
+
+
+# Downloads
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    (start, end inclusive) for a single-range Range header; None means send the whole file.
+    Raises ValueError when the range cannot be satisfied.
+    """
+    if not header:
+        return None
+    match = _RANGE.match(header.strip())
+    if not match or not any(match.groups()):
+        # Multiple or malformed ranges: RFC 9110 lets us ignore Range and send everything
+        return None
+    first, last = match.groups()
+    if not first:
+        length = int(last)
+        if length == 0 or size == 0:
+            raise ValueError("Unsatisfiable range")
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or (last and int(last) < start):
+        raise ValueError("Unsatisfiable range")
+    return start, end
+
+
+class BlobResponse(Response):
+    """
+    Streams (part of) a blob from disk. Uses the ASGI zero-copy send extension
+    (sendfile) when the server offers it, otherwise reads it in chunks off the event loop.
+    """
+
+    def __init__(self, path: str, size: int, media_type: str, headers: dict,
+                 byte_range: Optional[Tuple[int, int]] = None):
+        super().__init__(status_code=206 if byte_range else 200, headers=headers, media_type=media_type)
+        self.path = path
+        self.start, end = byte_range or (0, size - 1)
+        self.length = end - self.start + 1
+        self.headers["Content-Length"] = str(self.length)
+        self.headers["Accept-Ranges"] = "bytes"
+        if byte_range:
+            self.headers["Content-Range"] = f"bytes {self.start}-{end}/{size}"
+
+    async def __call__(self, scope, receive, send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"] == "HEAD" or self.length <= 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        async with await anyio.open_file(self.path, "rb") as handle:
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                await send({
+                    "type": "http.response.zerocopysend", "file": handle.wrapped.fileno(),
+                    "offset": self.start, "count": self.length, "more_body": False,
+                })
+                return
+            await handle.seek(self.start)
+            remaining = self.length
+            while remaining:
+                chunk = await handle.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+def download_headers(attachment: Attachment) -> dict:
+    return {
+        # The content hash is a natural strong ETag
+        "ETag": f'"{attachment.sha256}"',
+        "Cache-Control": DOWNLOAD_CACHE_CONTROL,
+        "Content-Disposition": f"attachment; filename*=UTF-8''{quote(attachment.filename)}",
+        # Uploaded content is served as a download, never sniffed and rendered
+        "X-Content-Type-Options": "nosniff",
+    }
+
+
+# Maintenance
+
+def collect_garbage(db: Session, grace: timedelta) -> Tuple[int, int]:
+    """
+    Delete blobs no attachment references, and uploads (and leftover staging
+    files) untouched for ATTACHMENT_UPLOAD_TTL_HOURS. Blobs younger than grace
+    are kept, since an upload may have just stored one and not committed its row yet.
+    """
+    upload_cutoff = (datetime.now() - timedelta(hours=ATTACHMENT_UPLOAD_TTL_HOURS)).timestamp()
+    stale_uploads = 0
+    for upload in db.scalars(select(AttachmentUpload)).all():
+        path = upload_path(upload.id)
+        if not os.path.exists(path) or os.path.getmtime(path) < upload_cutoff:
+            db.delete(upload)
+            stale_uploads += 1
+    db.commit()
+    live_uploads = {f"{upload_id}.part" for upload_id in db.scalars(select(AttachmentUpload.id))}
+    for name in os.listdir(store.uploads_dir) if os.path.isdir(store.uploads_dir) else ():
+        path = os.path.join(store.uploads_dir, name)
+        if name not in live_uploads and os.path.getmtime(path) < upload_cutoff:
+            os.unlink(path)
+
+    referenced = set(db.scalars(select(Attachment.sha256).distinct()))
+    blob_cutoff = (datetime.now() - grace).timestamp()
+    removed = 0
+    for directory, _, names in os.walk(store.blobs_dir):
+        for name in names:
+            path = os.path.join(directory, name)
+            if name not in referenced and os.path.getmtime(path) < blob_cutoff:
+                os.unlink(path)
+                removed += 1
+    return removed, stale_uploads
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the attachment store")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    gc = subcommands.add_parser("gc", help="delete unreferenced blobs and abandoned uploads")
+    gc.add_argument("--grace-hours", type=float, default=1.0)
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        blobs, uploads = collect_garbage(db, timedelta(hours=args.grace_hours))
+    print(f"Deleted {blobs} unreferenced blobs and {uploads} abandoned uploads")
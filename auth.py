@@ -1,9 +1,15 @@
 # auth.py
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+import asyncio
 import os
+import threading
+import time
+
+from metrics import observe_password_hash
 
 # Secret key for JWT token (in production, use environment variable)
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here-change-in-production")
@@ -25,6 +31,147 @@ def get_password_hash(password: str) -> str:
     """
     return pwd_context.hash(password)
 
+# Password hashing worker pool
+# bcrypt is deliberately slow, so it runs on a dedicated bounded pool instead of
+# the request threadpool. "process" sidesteps the GIL, "thread" is cheaper to start.
+HASH_EXECUTOR = os.getenv("HASH_EXECUTOR", "thread")
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Maximum number of hash jobs waiting for a worker before new ones are rejected
+HASH_QUEUE_MAX = int(os.getenv("HASH_QUEUE_MAX", "64"))
+
+
+class HashingOverloaded(Exception):
+    """
+    Raised when the hashing queue is full and the job was shed
+    """
+
+
+def _timed_call(func, *args) -> Tuple[object, float, float]:
+    """
+    Run a hashing function inside a worker and report when it started and how long it took
+    """
+    started = time.time()
+    result = func(*args)
+    return result, started, time.time() - started
+
+
+class PasswordHasher:
+    """
+    Bounded worker pool for bcrypt hashing and verification with async entry points
+    """
+
+    def __init__(self, executor: str = HASH_EXECUTOR, workers: int = HASH_WORKERS,
+                 queue_max: int = HASH_QUEUE_MAX):
+        self.executor_kind = executor
+        self.workers = max(1, workers)
+        self.queue_max = max(0, queue_max)
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.queue_wait_seconds = 0.0
+        self.hash_seconds = 0.0
+        self.max_queue_wait_seconds = 0.0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    if self.executor_kind == "process":
+                        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                    else:
+                        self._executor = ThreadPoolExecutor(
+                            max_workers=self.workers, thread_name_prefix="bcrypt"
+                        )
+        return self._executor
+
+    def _acquire(self) -> None:
+        with self._lock:
+            if self._in_flight >= self.workers + self.queue_max:
+                self.rejected += 1
+                raise HashingOverloaded("Password hashing queue is full")
+            self._in_flight += 1
+
+    def _release(self, submitted: float, started: float, elapsed: float) -> None:
+        wait = max(0.0, started - submitted)
+        with self._lock:
+            self._in_flight -= 1
+            self.completed += 1
+            self.queue_wait_seconds += wait
+            self.hash_seconds += elapsed
+            self.max_queue_wait_seconds = max(self.max_queue_wait_seconds, wait)
+
+    async def _run(self, operation: str, func, *args):
+        self._acquire()
+        submitted = time.time()
+        try:
+            loop = asyncio.get_running_loop()
+            result, started, elapsed = await loop.run_in_executor(
+                self._get_executor(), _timed_call, func, *args
+            )
+        except BaseException:
+            with self._lock:
+                self._in_flight -= 1
+            raise
+        self._release(submitted, started, elapsed)
+        observe_password_hash(operation, elapsed)
+        return result
+
+    async def hash(self, password: str) -> str:
+        """
+        Hash a password on the worker pool
+        """
+        return await self._run("hash", get_password_hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        """
+        Verify a password on the worker pool
+        """
+        return await self._run("verify", verify_password, plain_password, hashed_password)
+
+    def stats(self) -> dict:
+        """
+        Snapshot of queue depth and cumulative queue-wait vs. hash timings
+        """
+        with self._lock:
+            completed = self.completed
+            return {
+                "executor": self.executor_kind,
+                "workers": self.workers,
+                "queue_max": self.queue_max,
+                "in_flight": self._in_flight,
+                "queued": max(0, self._in_flight - self.workers),
+                "completed": completed,
+                "rejected": self.rejected,
+                "queue_wait_seconds_total": self.queue_wait_seconds,
+                "hash_seconds_total": self.hash_seconds,
+                "queue_wait_seconds_max": self.max_queue_wait_seconds,
+                "queue_wait_seconds_avg": self.queue_wait_seconds / completed if completed else 0.0,
+                "hash_seconds_avg": self.hash_seconds / completed if completed else 0.0,
+            }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+password_hasher = PasswordHasher()
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """
+    Verify a plain password against its hash without blocking the event loop
+    """
+    return await password_hasher.verify(plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """
+    Generate password hash without blocking the event loop
+    """
+    return await password_hasher.hash(password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """
     Create JWT access token
@@ -39,15 +186,23 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def verify_token(token: str) -> Optional[int]:
+def decode_token(token: str) -> Optional[dict]:
     """
-    Verify JWT token and return user ID
+    Verify JWT token and return its payload
     """
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: int = payload.get("user_id")
-        if user_id is None:
-            return None
-        return user_id
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
     except JWTError:
-        return None
\ No newline at end of file
+        return None
+
+def verify_token(token: str) -> Optional[int]:
+    """
+    Verify JWT token and return user ID
+    """
+    payload = decode_token(token)
+    if payload is None:
+        return None
+    user_id: int = payload.get("user_id")
+    if user_id is None:
+        return None
+    return user_id
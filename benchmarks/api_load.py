@@ -0,0 +1,403 @@
+# benchmarks/api_load.py
+"""
+Mixed-workload load test for the whole API: seed users and submissions,
+drive a weighted mix of register/login/submit/list/get/update requests at a
+fixed concurrency and report throughput and p50/p95/p99 per endpoint as JSON.
+
+Usage (from the project root):
+    python -m benchmarks.api_load --users 1000 --submissions 100000 --concurrency 50 --duration 30
+    python -m benchmarks.api_load --mix list=60,get=30,update=10 --output results.json
+    python -m benchmarks.api_load --compare results.json --max-regression 15   # exit 1 on a p95 regression
+    python -m benchmarks.api_load --in-process                                 # no server, ASGI transport
+    python -m benchmarks.api_load --url http://127.0.0.1:8000 --users 20       # seed through the API
+
+By default the API runs under a local uvicorn on a fresh SQLite database
+seeded directly with core inserts (one bcrypt hash shared by every user).
+Runs use a fixed --seed, so two runs with the same arguments issue the same
+request mix; keep the JSON files and diff them with --compare.
+"""
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.common import PROJECT_ROOT, BENCH_PASSWORD, serve, percentile
+
+DEFAULT_MIX = "list=40,get=25,submit=15,update=10,login=8,register=2"
+FORM_TYPES = ["incident_report", "feedback", "request", "complaint", "suggestion"]
+PRIORITIES = ["low", "medium", "high", "urgent"]
+STATUSES = ["submitted", "in_progress", "completed", "rejected"]
+
+
+def user_phone(index: int) -> str:
+    return f"7{index:09d}"
+
+
+def make_form(rng: random.Random, index: int) -> dict:
+    return {
+        "form_type": rng.choice(FORM_TYPES),
+        "title": f"Load test submission {index}",
+        "description": "Generated by benchmarks.api_load",
+        "category": "general",
+        "priority": rng.choice(PRIORITIES),
+        "form_data": {"location": f"plant-{rng.randint(1, 9)}", "severity": rng.randint(1, 5)},
+    }
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"Unknown operation '{name}'. Known: {', '.join(OPERATIONS)}")
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+def seed_database(database_url: str, users: int, submissions: int, seed: int, batch_size: int = 20000) -> None:
+    """
+    Create the schema and insert users/submissions with batched core inserts
+    """
+    from sqlalchemy import create_engine, insert
+    from sqlalchemy.orm import Session
+
+    from database import Base
+    from models import User, FormSubmission
+    from auth import get_password_hash
+    from stats import rebuild_stats
+    import search  # noqa: F401  (installs the full-text index with the table)
+
+    engine = create_engine(database_url)
+    Base.metadata.create_all(bind=engine)
+    hashed_password = get_password_hash(BENCH_PASSWORD)
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(insert(User.__table__), [
+            {"phone_number": user_phone(i), "full_name": f"Load User {i}", "hashed_password": hashed_password,
+             "is_active": True, "created_at": now, "updated_at": now}
+            for i in range(users)
+        ])
+    for offset in range(0, submissions, batch_size):
+        rows = []
+        for i in range(offset, min(offset + batch_size, submissions)):
+            submitted_at = now - timedelta(seconds=submissions - i)
+            rows.append({
+                **make_form(rng, i), "user_id": i % users + 1, "status": rng.choice(STATUSES),
+                "submitted_at": submitted_at, "updated_at": submitted_at,
+            })
+        with engine.begin() as conn:
+            conn.execute(insert(FormSubmission.__table__), rows)
+    with Session(engine) as db:
+        rebuild_stats(db)
+        db.commit()
+    engine.dispose()
+
+
+async def seed_through_api(client: httpx.AsyncClient, users: int, submissions: int, seed: int) -> None:
+    """
+    Seed a running server that the harness cannot reach on disk (--url)
+    """
+    rng = random.Random(seed)
+    per_user = submissions // users if users else 0
+    for i in range(users):
+        await client.post("/api/auth/register", json={
+            "phone_number": user_phone(i), "full_name": f"Load User {i}", "password": BENCH_PASSWORD,
+        })
+        if not per_user:
+            continue
+        headers = await login(client, user_phone(i))
+        for offset in range(0, per_user, 500):
+            items = [make_form(rng, j) for j in range(offset, min(offset + 500, per_user))]
+            response = await client.post("/api/forms/submit/bulk", json={"items": items}, headers=headers)
+            response.raise_for_status()
+
+
+async def login(client: httpx.AsyncClient, phone: str) -> Dict[str, str]:
+    response = await client.post("/api/auth/login", json={"phone_number": phone, "password": BENCH_PASSWORD})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+class Session:
+    """
+    One logged-in benchmark user and the submission ids it can read/update
+    """
+
+    def __init__(self, phone: str, headers: Dict[str, str], ids: List[int]):
+        self.phone = phone
+        self.headers = headers
+        self.ids = ids
+
+
+async def op_register(client, session, rng, state):
+    phone = f"8{next(state['register_counter']):09d}"
+    return await client.post("/api/auth/register", json={
+        "phone_number": phone, "full_name": "Registered Load User", "password": BENCH_PASSWORD,
+    })
+
+
+async def op_login(client, session, rng, state):
+    response = await client.post("/api/auth/login", json={"phone_number": session.phone, "password": BENCH_PASSWORD})
+    if response.status_code == 200:
+        session.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    return response
+
+
+async def op_submit(client, session, rng, state):
+    response = await client.post(
+        "/api/forms/submit", json=make_form(rng, next(state["submit_counter"])), headers=session.headers
+    )
+    if response.status_code == 201:
+        session.ids.append(response.json()["id"])
+    return response
+
+
+async def op_list(client, session, rng, state):
+    return await client.get("/api/forms/submissions", params={"limit": 20}, headers=session.headers)
+
+
+async def op_get(client, session, rng, state):
+    if not session.ids:
+        return await op_list(client, session, rng, state)
+    return await client.get(f"/api/forms/submissions/{rng.choice(session.ids)}", headers=session.headers)
+
+
+async def op_update(client, session, rng, state):
+    if not session.ids:
+        return await op_submit(client, session, rng, state)
+    return await client.put(
+        f"/api/forms/submissions/{rng.choice(session.ids)}",
+        json={"status": rng.choice(STATUSES), "priority": rng.choice(PRIORITIES)},
+        headers=session.headers,
+    )
+
+
+OPERATIONS = {
+    "register": op_register,
+    "login": op_login,
+    "submit": op_submit,
+    "list": op_list,
+    "get": op_get,
+    "update": op_update,
+}
+
+
+async def prepare_sessions(client: httpx.AsyncClient, users: int, active_users: int) -> List[Session]:
+    """
+    Log in the active users and collect a sample of their submission ids
+    """
+    sessions = []
+    for i in range(min(users, active_users)):
+        headers = await login(client, user_phone(i))
+        response = await client.get("/api/forms/submissions", params={"fields": "id", "limit": 200}, headers=headers)
+        response.raise_for_status()
+        sessions.append(Session(user_phone(i), headers, [row["id"] for row in response.json()]))
+    return sessions
+
+
+async def drive(client: httpx.AsyncClient, sessions: List[Session], mix: Dict[str, float],
+                concurrency: int, duration: float, warmup: float, seed: int) -> dict:
+    """
+    Run `concurrency` workers issuing mixed requests; samples taken during warmup are discarded
+    """
+    latencies: Dict[str, List[float]] = {name: [] for name in mix}
+    errors: Dict[str, Dict[str, int]] = {name: {} for name in mix}
+    state = {"register_counter": itertools.count(), "submit_counter": itertools.count()}
+    names, weights = list(mix), list(mix.values())
+    started = time.perf_counter()
+    measure_from = started + warmup
+    deadline = measure_from + duration
+
+    async def worker(index: int):
+        rng = random.Random(seed * 1000 + index)
+        while True:
+            now = time.perf_counter()
+            if now >= deadline:
+                return
+            name = rng.choices(names, weights)[0]
+            session = rng.choice(sessions)
+            try:
+                response = await OPERATIONS[name](client, session, rng, state)
+                outcome = response.status_code
+            except httpx.HTTPError as exc:
+                outcome = type(exc).__name__
+            finished = time.perf_counter()
+            if now < measure_from:
+                continue
+            if isinstance(outcome, int) and outcome < 400:
+                latencies[name].append((finished - now) * 1000)
+            else:
+                errors[name][str(outcome)] = errors[name].get(str(outcome), 0) + 1
+
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - measure_from
+
+    endpoints = {}
+    for name in names:
+        samples = latencies[name]
+        endpoints[name] = {
+            "requests": len(samples),
+            "errors": sum(errors[name].values()),
+            "error_statuses": errors[name],
+            "rps": round(len(samples) / elapsed, 1),
+            "mean_ms": round(sum(samples) / len(samples), 2) if samples else 0.0,
+            "p50_ms": round(percentile(samples, 50), 2),
+            "p95_ms": round(percentile(samples, 95), 2),
+            "p99_ms": round(percentile(samples, 99), 2),
+            "max_ms": round(max(samples), 2) if samples else 0.0,
+        }
+    all_samples = [sample for samples in latencies.values() for sample in samples]
+    totals = {
+        "requests": len(all_samples),
+        "errors": sum(endpoint["errors"] for endpoint in endpoints.values()),
+        "rps": round(len(all_samples) / elapsed, 1),
+        "p50_ms": round(percentile(all_samples, 50), 2),
+        "p95_ms": round(percentile(all_samples, 95), 2),
+        "p99_ms": round(percentile(all_samples, 99), 2),
+        "elapsed_s": round(elapsed, 2),
+    }
+    return {"totals": totals, "endpoints": endpoints}
+
+
+def environment() -> dict:
+    try:
+        revision = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, capture_output=True, text=True, timeout=10
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        revision = None
+    return {
+        "git_revision": revision,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "sqlite": sqlite3.sqlite_version,
+        "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+    }
+
+
+def compare(current: dict, baseline: dict, max_regression: Optional[float]) -> bool:
+    """
+    Print per-endpoint p95 / throughput change against a previous run. Returns False on a regression.
+    """
+    ok = True
+    # stdout carries the JSON report, so the comparison goes to stderr
+    print(f"{'endpoint':<10} {'p95 before':>11} {'p95 now':>9} {'change':>8} {'rps before':>11} {'rps now':>9}",
+          file=sys.stderr)
+    for name, now in current["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(name)
+        if not before or not before["p95_ms"]:
+            continue
+        change = (now["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100
+        flag = ""
+        if max_regression is not None and change > max_regression:
+            ok = False
+            flag = "  REGRESSION"
+        print(f"{name:<10} {before['p95_ms']:>9.1f}ms {now['p95_ms']:>7.1f}ms {change:>+7.1f}% "
+              f"{before['rps']:>11.1f} {now['rps']:>9.1f}{flag}", file=sys.stderr)
+    return ok
+
+
+async def run_against(client: httpx.AsyncClient, args, mix: Dict[str, float], seed_via_api: bool) -> dict:
+    if seed_via_api:
+        await seed_through_api(client, args.users, args.submissions, args.seed)
+    sessions = await prepare_sessions(client, args.users, args.active_users)
+    return await drive(client, sessions, mix, args.concurrency, args.duration, args.warmup, args.seed)
+
+
+def run(args, mix: Dict[str, float]) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    if args.url:
+        async def remote():
+            async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=60.0) as client:
+                return await run_against(client, args, mix, seed_via_api=True)
+        return asyncio.run(remote())
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = f"sqlite:///{os.path.join(tmp, 'load.db')}"
+        # database.py reads DATABASE_URL on import, which seeding and --in-process both trigger
+        os.environ["DATABASE_URL"] = database_url
+        os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+        print(f"Seeding {args.users:,} users and {args.submissions:,} submissions...", file=sys.stderr)
+        started = time.perf_counter()
+        seed_database(database_url, args.users, args.submissions, args.seed)
+        print(f"Seeded in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+        if args.in_process:
+            from main import create_app
+            app = create_app()
+
+            async def in_process():
+                transport = httpx.ASGITransport(app=app)
+                async with app.router.lifespan_context(app):
+                    async with httpx.AsyncClient(transport=transport, base_url="http://api", timeout=60.0) as client:
+                        return await run_against(client, args, mix, seed_via_api=False)
+            return asyncio.run(in_process())
+
+        with serve(env={"DATABASE_URL": database_url}) as base_url:
+            async def local():
+                async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as client:
+                    return await run_against(client, args, mix, seed_via_api=False)
+            return asyncio.run(local())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--submissions", type=int, default=10000)
+    parser.add_argument("--active-users", type=int, default=20, help="users that log in and drive the load")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=20.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=2.0, help="seconds of load discarded before measuring")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"operation=weight pairs (default {DEFAULT_MIX})")
+    parser.add_argument("--seed", type=int, default=1)
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", help="benchmark an already running server instead of starting one")
+    target.add_argument("--in-process", action="store_true", help="call the app through httpx.ASGITransport")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    parser.add_argument("--compare", help="JSON report of a previous run to compare against")
+    parser.add_argument("--max-regression", type=float,
+                        help="with --compare, exit 1 if any endpoint's p95 grew by more than this percent")
+    args = parser.parse_args()
+
+    report = {
+        "benchmark": "api_load",
+        "config": {
+            "users": args.users, "submissions": args.submissions, "active_users": args.active_users,
+            "concurrency": args.concurrency, "duration_s": args.duration, "warmup_s": args.warmup,
+            "mix": args.mix, "seed": args.seed,
+            "target": args.url or ("in-process" if args.in_process else "uvicorn"),
+        },
+        "environment": environment(),
+        **run(args, args.mix),
+    }
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as handle:
+            handle.write(output + "\n")
+    if args.compare:
+        with open(args.compare) as handle:
+            baseline = json.load(handle)
+        if not compare(report, baseline, args.max_regression):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# benchmarks/async_load.py
+"""
+Compare requests/sec and p99 latency of the sync form routes (/api/forms)
+against their async variants (/api/async/forms) at several concurrency levels.
+
+Usage (from the project root):
+    python -m benchmarks.async_load --concurrency 50 200 1000 --duration 10
+
+The client runs in a single process, so at very high concurrency it can become
+the bottleneck itself; compare the two variants against each other, not
+against absolute numbers from other machines.
+"""
+from typing import Dict, List
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+from benchmarks.common import serve, percentile, auth_headers
+
+VARIANTS = {
+    "sync": "/api/forms",
+    "async": "/api/async/forms",
+}
+
+
+async def drive(base_url: str, path: str, headers: Dict[str, str], concurrency: int, duration: float) -> dict:
+    """
+    Keep `concurrency` clients issuing GET requests against path for `duration` seconds
+    """
+    latencies: List[float] = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, limits=limits, timeout=60.0) as client:
+        async def worker():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                try:
+                    response = await client.get(path)
+                    if response.status_code != 200:
+                        errors += 1
+                        continue
+                except httpx.HTTPError:
+                    errors += 1
+                    continue
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 50),
+        "p99_ms": percentile(latencies, 99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[50, 200, 1000])
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--submissions", type=int, default=100)
+    args = parser.parse_args()
+
+    results = {}
+    with serve(env={"ASYNC_DB_ENABLED": "true"}) as base_url:
+        headers = auth_headers(base_url)
+        items = [{"form_type": "feedback", "title": f"Load {i}"} for i in range(args.submissions)]
+        httpx.post(f"{base_url}/api/forms/submit/bulk", json={"items": items}, headers=headers).raise_for_status()
+
+        for concurrency in args.concurrency:
+            for variant, prefix in VARIANTS.items():
+                result = asyncio.run(drive(base_url, f"{prefix}/submissions", headers, concurrency, args.duration))
+                results[f"{variant}@{concurrency}"] = result
+                print(f"{variant:>5} c={concurrency:<5} {result['rps']:8.1f} req/s  "
+                      f"p50 {result['p50_ms']:8.1f} ms  p99 {result['p99_ms']:8.1f} ms  errors {result['errors']}")
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# benchmarks/common.py
+"""
+Helpers shared by the benchmark scripts: a throwaway uvicorn server,
+percentiles and an authenticated client.
+"""
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BENCH_PHONE = "9000000000"
+BENCH_PASSWORD = "benchpass123"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def serve(env: Optional[Dict[str, str]] = None, args: Optional[List[str]] = None) -> Iterator[str]:
+    """
+    Run the API under uvicorn against a fresh SQLite database and yield its base URL
+    """
+    port = free_port()
+    with tempfile.TemporaryDirectory() as tmp:
+        server_env = {
+            # One client hammering as a handful of users would otherwise measure the rate limiter
+            "RATE_LIMIT_ENABLED": "false",
+            **os.environ,
+            "DATABASE_URL": f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+            **(env or {}),
+        }
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "--factory", "main:create_app", "--port", str(port), "--log-level", "warning",
+             *(args or [])],
+            cwd=PROJECT_ROOT,
+            env=server_env,
+        )
+        base_url = f"http://127.0.0.1:{port}"
+        try:
+            wait_until_ready(base_url)
+            yield base_url
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+
+
+def wait_until_ready(base_url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/health", timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"Server at {base_url} did not become ready")
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """
+    Nearest-rank percentile of samples (0 for an empty list)
+    """
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def auth_headers(base_url: str, phone: str = BENCH_PHONE, password: str = BENCH_PASSWORD) -> Dict[str, str]:
+    """
+    Register (if needed) and log in a benchmark user, returning bearer headers
+    """
+    httpx.post(f"{base_url}/api/auth/register", json={
+        "phone_number": phone, "full_name": "Bench User", "password": password,
+    })
+    response = httpx.post(f"{base_url}/api/auth/login", json={"phone_number": phone, "password": password})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
@@ -0,0 +1,108 @@
+# benchmarks/pagination.py
+"""
+Compare page latency of offset vs. keyset (cursor) pagination on
+/api/forms/submissions for a single user with many submissions.
+
+Usage (from the project root):
+    python -m benchmarks.pagination --rows 1000000 --page 10000
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from database import Base
+from models import User, FormSubmission
+from crud import submissions_query, paginate_submissions, encode_cursor
+
+
+def seed(engine, rows: int, batch_size: int = 50000) -> int:
+    """
+    Insert one user and `rows` submissions using batched core inserts
+    """
+    with engine.begin() as conn:
+        user_id = conn.execute(
+            insert(User.__table__).values(
+                phone_number="9999999999", full_name="Bench User", hashed_password="x"
+            )
+        ).inserted_primary_key[0]
+    start = datetime(2020, 1, 1)
+    for offset in range(0, rows, batch_size):
+        batch = [
+            {
+                "user_id": user_id,
+                "form_type": "feedback",
+                "title": f"Submission {i}",
+                "priority": "medium",
+                "status": "submitted",
+                "submitted_at": start + timedelta(seconds=i),
+                "updated_at": start + timedelta(seconds=i),
+            }
+            for i in range(offset, min(offset + batch_size, rows))
+        ]
+        with engine.begin() as conn:
+            conn.execute(insert(FormSubmission.__table__), batch)
+    return user_id
+
+
+def time_query(build_query, repeat: int) -> float:
+    """
+    Median wall time in milliseconds of running the query returned by build_query
+    """
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        build_query().all()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--page", type=int, default=10_000)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(bind=engine)
+        Session = sessionmaker(bind=engine)
+
+        print(f"Seeding {args.rows:,} submissions...")
+        started = time.perf_counter()
+        user_id = seed(engine, args.rows)
+        print(f"Seeded in {time.perf_counter() - started:.1f}s")
+
+        db = Session()
+        skip = (args.page - 1) * args.limit
+        base = lambda: submissions_query(db, user_id)
+
+        # The cursor a client would hold after reading pages 1..page-1
+        boundary = paginate_submissions(base(), 1, skip=skip - 1).one()
+        cursor = encode_cursor(boundary.submitted_at, boundary.id)
+
+        results = {
+            "offset page 1": time_query(lambda: paginate_submissions(base(), args.limit), args.repeat),
+            f"offset page {args.page:,}": time_query(
+                lambda: paginate_submissions(base(), args.limit, skip=skip), args.repeat
+            ),
+            "cursor page 1": time_query(lambda: paginate_submissions(base(), args.limit), args.repeat),
+            f"cursor page {args.page:,}": time_query(
+                lambda: paginate_submissions(base(), args.limit, cursor=cursor), args.repeat
+            ),
+        }
+        db.close()
+        engine.dispose()
+
+    for name, millis in results.items():
+        print(f"{name:>24}: {millis:8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
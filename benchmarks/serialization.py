@@ -0,0 +1,91 @@
+# benchmarks/serialization.py
+"""
+Measure the cost of turning one FormSubmission row into response bytes,
+comparing the old route path (field-by-field FormSubmissionResponse, FastAPI
+response_model validation, stdlib json) with serializers.py.
+
+Usage (from the project root):
+    python -m benchmarks.serialization --count 2000
+"""
+from datetime import datetime
+from typing import List
+import argparse
+import asyncio
+import time
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from models import FormSubmission
+from schemas import FormSubmissionResponse
+from serializers import submission_json, submissions_json
+
+PAYLOADS = {
+    "small": {"location": "plant-3", "severity": 2},
+    # Roughly 50 KB of nested form data
+    "50KB": {"entries": [{"field": f"field_{i}", "value": "x" * 40} for i in range(700)]},
+}
+
+
+def make_rows(form_data: dict, count: int) -> List[FormSubmission]:
+    now = datetime.utcnow()
+    return [
+        FormSubmission(
+            id=i, user_id=1, form_type="incident_report", title=f"Submission {i}",
+            description="A description", category="safety", priority="high", status="submitted",
+            form_data=form_data, attachments=["a.png"], submitted_at=now, updated_at=now,
+        )
+        for i in range(count)
+    ]
+
+
+def legacy_list(rows: List[FormSubmission]) -> bytes:
+    """
+    What the list route did before: copy fields, then let FastAPI validate and encode
+    """
+    content = [
+        FormSubmissionResponse(
+            id=row.id, user_id=row.user_id, form_type=row.form_type, title=row.title,
+            description=row.description, category=row.category, priority=row.priority,
+            status=row.status, form_data=row.form_data, attachments=row.attachments,
+            submitted_at=row.submitted_at, updated_at=row.updated_at,
+        )
+        for row in rows
+    ]
+    encoded = asyncio.run(serialize_response(field=LIST_FIELD, response_content=content, is_coroutine=True))
+    return JSONResponse(encoded).body
+
+
+LIST_FIELD = create_response_field(name="Response", type_=List[FormSubmissionResponse])
+
+
+def per_item_microseconds(func, rows, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(rows)
+        best = min(best, time.perf_counter() - started)
+    return best / len(rows) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=2000, help="rows per measurement")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    paths = {
+        "legacy list": legacy_list,
+        "fast list": submissions_json,
+        "fast single": lambda rows: [submission_json(row) for row in rows],
+    }
+    for payload_name, form_data in PAYLOADS.items():
+        rows = make_rows(form_data, args.count)
+        for path_name, func in paths.items():
+            micros = per_item_microseconds(func, rows, args.repeat)
+            print(f"{payload_name:>6} {path_name:<12} {micros:10.1f} us/submission")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+# benchmarks/startup.py
+"""
+Measure how long a fresh worker takes to become useful: importing main and
+building the app, running the lifespan startup (schema check included) and answering its first
+and second authenticated request. Every run is a new interpreter, so nothing
+is cached between runs; the report has the median and worst run per phase.
+
+Usage (from the project root):
+    python -m benchmarks.startup --runs 10
+    python -m benchmarks.startup --schema-check skip --output startup.json
+    python -m benchmarks.startup --compare startup.json --max-regression 20   # exit 1 on a regression
+"""
+from typing import Dict, List, Optional
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.common import PROJECT_ROOT
+from benchmarks.api_load import environment, seed_database
+
+PHASES = ("import", "startup", "first_request", "second_request", "total", "process")
+
+
+def child() -> None:
+    """
+    Runs in the fresh interpreter: time each phase and print them as JSON
+    """
+    import httpx  # the client is not part of the app's startup cost
+
+    started = time.perf_counter()
+    timings: Dict[str, float] = {}
+
+    import main
+    app = main.create_app()
+    timings["import"] = time.perf_counter() - started
+
+    async def serve() -> None:
+        mark = time.perf_counter()
+        async with app.router.lifespan_context(app):
+            timings["startup"] = time.perf_counter() - mark
+            headers = {"Authorization": "Bearer " + main.create_access_token(data={"user_id": 1})}
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://api", headers=headers) as client:
+                for phase in ("first_request", "second_request"):
+                    mark = time.perf_counter()
+                    response = await client.get("/api/forms/submissions", params={"limit": 10})
+                    timings[phase] = time.perf_counter() - mark
+                    response.raise_for_status()
+
+    asyncio.run(serve())
+    timings["total"] = timings["import"] + timings["startup"] + timings["first_request"]
+    print(json.dumps(timings))
+
+
+def run_once(env: Dict[str, str]) -> Dict[str, float]:
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-m", "benchmarks.startup", "--child"],
+        cwd=PROJECT_ROOT, env=env, capture_output=True, text=True, timeout=120,
+    )
+    elapsed = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(f"Startup run failed:\n{result.stderr}")
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    # Wall time from spawning the interpreter to its exit, interpreter startup included
+    timings["process"] = elapsed
+    return timings
+
+
+def summarize(runs: List[Dict[str, float]]) -> dict:
+    return {
+        phase: {
+            "median_ms": round(statistics.median(run[phase] for run in runs) * 1000, 2),
+            "max_ms": round(max(run[phase] for run in runs) * 1000, 2),
+        }
+        for phase in PHASES
+    }
+
+
+def compare(current: dict, baseline: dict, max_regression: Optional[float]) -> bool:
+    """
+    Print the median change per phase against a previous run. Returns False on a regression.
+    """
+    ok = True
+    # stdout carries the JSON report, so the comparison goes to stderr
+    print(f"{'phase':<15} {'before':>10} {'now':>10} {'change':>8}", file=sys.stderr)
+    for phase, now in current["phases"].items():
+        before = baseline.get("phases", {}).get(phase)
+        if not before or not before["median_ms"]:
+            continue
+        change = (now["median_ms"] - before["median_ms"]) / before["median_ms"] * 100
+        flag = ""
+        # Only the phases a worker pays for count; process time includes the interpreter itself
+        if max_regression is not None and phase != "process" and change > max_regression:
+            ok = False
+            flag = "  REGRESSION"
+        print(f"{phase:<15} {before['median_ms']:>8.1f}ms {now['median_ms']:>8.1f}ms {change:>+7.1f}%{flag}",
+              file=sys.stderr)
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--submissions", type=int, default=1000, help="rows in the seeded database")
+    parser.add_argument("--schema-check", choices=["create", "verify", "skip"], default="verify",
+                        help="DB_SCHEMA_CHECK for the measured workers")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    parser.add_argument("--compare", help="JSON report of a previous run to compare against")
+    parser.add_argument("--max-regression", type=float,
+                        help="with --compare, exit 1 if any phase's median grew by more than this percent")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child()
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = f"sqlite:///{os.path.join(tmp, 'startup.db')}"
+        seed_database(database_url, 1, args.submissions, seed=1)
+        env = {
+            **os.environ,
+            "DATABASE_URL": database_url,
+            "DB_SCHEMA_CHECK": args.schema_check,
+            "RATE_LIMIT_ENABLED": "false",
+            "ATTACHMENT_DIR": os.path.join(tmp, "attachments"),
+        }
+        runs = [run_once(env) for _ in range(args.runs)]
+
+    report = {
+        "benchmark": "startup",
+        "config": {"runs": args.runs, "submissions": args.submissions, "schema_check": args.schema_check},
+        "environment": environment(),
+        "phases": summarize(runs),
+    }
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as handle:
+            handle.write(output + "\n")
+    if args.compare:
+        with open(args.compare) as handle:
+            baseline = json.load(handle)
+        if not compare(report, baseline, args.max_regression):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
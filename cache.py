@@ -0,0 +1,143 @@
+# cache.py
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from models import User
+from auth import decode_token
+import os
+import threading
+import time
+
+# Verified-token and current-user cache configuration. Opt-in: invalidation only
+# reaches this process's cache, and only for ORM changes, so other workers (and
+# Core UPDATEs) can see a stale or deactivated user for up to USER_CACHE_TTL_SECONDS.
+USER_CACHE_ENABLED = os.getenv("USER_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+USER_CACHE_MAX_SIZE = int(os.getenv("USER_CACHE_MAX_SIZE", "10000"))
+
+MISSING = object()
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries also expire after a time-to-live
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Any:
+        """
+        Return the cached value or MISSING
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISSING
+            value, expires_at = entry
+            if expires_at <= now:
+                del self._data[key]
+                self.misses += 1
+                return MISSING
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Store a value, evicting the least recently used entry when full
+        """
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0 or self.max_size <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+# token -> user id, bounded by the token's own expiry
+token_cache = TTLCache(USER_CACHE_MAX_SIZE, USER_CACHE_TTL_SECONDS)
+# user id -> detached User row
+user_cache = TTLCache(USER_CACHE_MAX_SIZE, USER_CACHE_TTL_SECONDS)
+
+
+def invalidate_user(user_id: int) -> None:
+    """
+    Drop a cached user row so the next request reloads it from the database
+    """
+    user_cache.pop(user_id)
+
+
+def resolve_token(token: str) -> Optional[int]:
+    """
+    Verify a bearer token and return its user id, using the token cache when enabled
+    """
+    user_id = token_cache.get(token) if USER_CACHE_ENABLED else MISSING
+    if user_id is MISSING:
+        payload = decode_token(token)
+        user_id = payload.get("user_id") if payload else None
+        if user_id and USER_CACHE_ENABLED:
+            # Never keep a token cached past its own expiry
+            token_cache.set(token, user_id, ttl=payload["exp"] - time.time() if "exp" in payload else None)
+    return user_id
+
+
+def cache_stats() -> dict:
+    return {
+        "enabled": USER_CACHE_ENABLED,
+        "tokens": token_cache.stats(),
+        "users": user_cache.stats(),
+    }
+
+
+def _register_invalidation_hooks() -> None:
+    def on_user_changed(mapper, connection, target):
+        invalidate_user(target.id)
+        # Invalidate again once the change is visible to other sessions
+        pending = Session.object_session(target)
+        if pending is not None:
+            pending.info.setdefault("invalidated_user_ids", set()).add(target.id)
+
+    event.listen(User, "after_update", on_user_changed)
+    event.listen(User, "after_delete", on_user_changed)
+
+    @event.listens_for(Session, "after_commit")
+    def on_commit(session):
+        for user_id in session.info.pop("invalidated_user_ids", ()):
+            invalidate_user(user_id)
+
+
+_register_invalidation_hooks()
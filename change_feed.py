@@ -0,0 +1,347 @@
+# change_feed.py
+"""
+Change feed for submissions, served as server-sent events on /api/forms/stream.
+
+Every create/update writes a row to submission_changes in the same transaction
+as the change. After commit the events go to a backend, which hands them to the
+SSE subscribers of the affected user in this process:
+
+    memory    in-process only (a single uvicorn worker)
+    database  every worker polls submission_changes, so all workers see every change
+
+The change-log id is the SSE event id, so a reconnecting client's
+Last-Event-ID is replayed from the table. To prune old changes:
+
+    python change_feed.py prune [--hours 24]
+"""
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set
+from sqlalchemy import delete, event, insert, or_, select
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+
+from database import SessionLocal
+from models import SubmissionChange
+
+# Configuration
+CHANGE_FEED_BACKEND = os.getenv("CHANGE_FEED_BACKEND", "memory")
+CHANGE_FEED_POLL_MS = float(os.getenv("CHANGE_FEED_POLL_MS", "500"))
+# How long the poller keeps asking for an id it skipped over; ids can commit out of order, or never (rollback)
+CHANGE_FEED_GAP_SECONDS = float(os.getenv("CHANGE_FEED_GAP_SECONDS", "30"))
+CHANGE_FEED_KEEPALIVE_SECONDS = float(os.getenv("CHANGE_FEED_KEEPALIVE_SECONDS", "15"))
+# Events buffered per connection; a client that falls further behind is disconnected and resumes via Last-Event-ID
+CHANGE_FEED_QUEUE_MAX = int(os.getenv("CHANGE_FEED_QUEUE_MAX", "1000"))
+
+PAYLOAD_FIELDS = ("form_type", "title", "status", "priority", "updated_at")
+REPLAY_LIMIT = 1000
+# Skipped-over ids the poller keeps asking for, at most
+MAX_GAPS = 10000
+# Reconnect delay suggested to EventSource clients
+CHANGE_FEED_RETRY_MS = 3000
+
+changes_table = SubmissionChange.__table__
+
+
+def submission_payload(submission_id: int, values) -> dict:
+    """
+    Event body for a submission, from an ORM row or a dict of column values
+    """
+    payload = {"id": submission_id}
+    for field in PAYLOAD_FIELDS:
+        value = values[field] if isinstance(values, dict) else getattr(values, field)
+        payload[field] = value.isoformat() if isinstance(value, datetime) else value
+    return payload
+
+
+def record_changes(db: Session, user_id: int, event: str, payloads: List[dict]) -> None:
+    """
+    Write change-log rows in the caller's transaction; they are published after it commits
+    """
+    if not payloads:
+        return
+    now = datetime.utcnow()
+    ids = db.execute(
+        insert(SubmissionChange).returning(SubmissionChange.id, sort_by_parameter_order=True),
+        [
+            {"user_id": user_id, "submission_id": payload["id"], "event": event, "payload": payload,
+             "created_at": now}
+            for payload in payloads
+        ]
+    ).scalars()
+    db.info.setdefault("submission_changes", []).extend(
+        {"id": change_id, "user_id": user_id, "event": event, "data": payload}
+        for change_id, payload in zip(ids, payloads)
+    )
+
+
+def changes_since_statement(user_id: int, last_event_id: int, limit: int = REPLAY_LIMIT):
+    return (
+        select(SubmissionChange.id, SubmissionChange.event, SubmissionChange.payload)
+        .where(SubmissionChange.user_id == user_id, SubmissionChange.id > last_event_id)
+        .order_by(SubmissionChange.id)
+        .limit(limit)
+    )
+
+
+def changes_since(user_id: int, last_event_id: int, limit: int = REPLAY_LIMIT) -> List[dict]:
+    """
+    The user's changes after last_event_id, oldest first
+    """
+    with SessionLocal() as db:
+        rows = db.execute(changes_since_statement(user_id, last_event_id, limit)).all()
+    return [{"id": row.id, "user_id": user_id, "event": row.event, "data": row.payload} for row in rows]
+
+
+def prune_changes(db: Session, older_than: timedelta) -> int:
+    result = db.execute(delete(changes_table).where(changes_table.c.created_at < datetime.utcnow() - older_than))
+    return result.rowcount
+
+
+class Subscription:
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=CHANGE_FEED_QUEUE_MAX)
+        self.overflowed = False
+
+    def put(self, event: dict) -> None:
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Wake the stream so it closes; the client resumes from the change log
+            self.overflowed = True
+            self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+
+class ChangeBroker:
+    """
+    Fans events out to this process's SSE subscriptions. Thread-safe: events
+    usually arrive from request threads or the poller.
+    """
+
+    def __init__(self):
+        self._subscriptions: Dict[int, Set[Subscription]] = {}
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def subscribe(self, user_id: int) -> Subscription:
+        self._loop = asyncio.get_running_loop()
+        subscription = Subscription(user_id)
+        with self._lock:
+            self._subscriptions.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    @property
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+    def deliver(self, events: Iterable[dict]) -> None:
+        loop = self._loop
+        if loop is None:
+            return
+        with self._lock:
+            targets = [
+                (subscription, event)
+                for event in events
+                for subscription in self._subscriptions.get(event["user_id"], ())
+            ]
+        for subscription, event in targets:
+            loop.call_soon_threadsafe(subscription.put, event)
+
+
+class MemoryBackend:
+    """
+    Publishes committed changes straight to this process's subscribers
+    """
+
+    def __init__(self, broker: ChangeBroker):
+        self.broker = broker
+
+    def publish(self, events: List[dict]) -> None:
+        self.broker.deliver(events)
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+
+class DatabaseBackend:
+    """
+    Every worker tails submission_changes, so a change committed by any worker reaches all subscribers.
+
+    An id is taken when the row is inserted but only becomes visible when its
+    transaction commits, so a lower id can appear after a higher one. The poller
+    follows the highest id it has seen and remembers the lower ids that were
+    missing; every poll asks for those again until they show up or
+    CHANGE_FEED_GAP_SECONDS pass.
+    """
+
+    def __init__(self, broker: ChangeBroker, poll_ms: float = CHANGE_FEED_POLL_MS):
+        self.broker = broker
+        self.poll_interval = poll_ms / 1000
+        self._task: Optional[asyncio.Task] = None
+        # Apps whose lifespan started the poller; it stops with the last of them
+        self._apps = 0
+        self._last_id = 0
+        # Missing id below _last_id -> monotonic time it was first missed, oldest first
+        self._gaps: Dict[int, float] = {}
+
+    def publish(self, events: List[dict]) -> None:
+        # The poller picks committed rows up from the table
+        pass
+
+    def _latest_id(self) -> int:
+        with SessionLocal() as db:
+            return db.execute(select(SubmissionChange.id).order_by(SubmissionChange.id.desc()).limit(1)).scalar() or 0
+
+    def _fetch(self, payloads: bool = True) -> list:
+        """
+        Rows after the highest id seen or filling a gap, oldest first; only their ids unless payloads
+        """
+        columns = [SubmissionChange.id]
+        if payloads:
+            columns += [SubmissionChange.user_id, SubmissionChange.event, SubmissionChange.payload]
+        unseen = SubmissionChange.id > self._last_id
+        if self._gaps:
+            unseen = or_(unseen, SubmissionChange.id.in_(list(self._gaps)))
+        with SessionLocal() as db:
+            return db.execute(select(*columns).where(unseen).order_by(SubmissionChange.id).limit(REPLAY_LIMIT)).all()
+
+    def _advance(self, rows: list) -> list:
+        """
+        Move past the fetched rows, noting the ids skipped over; returns the rows not seen before
+        """
+        now = time.monotonic()
+        fresh = []
+        for row in rows:
+            if row.id > self._last_id:
+                for missing in range(max(self._last_id + 1, row.id - MAX_GAPS), row.id):
+                    self._gaps[missing] = now
+                self._last_id = row.id
+            elif self._gaps.pop(row.id, None) is None:
+                continue
+            fresh.append(row)
+        # Give up on the oldest gaps: rolled back, or committed too late to be worth the wait
+        for missing, missed_at in list(self._gaps.items()):
+            if now - missed_at < CHANGE_FEED_GAP_SECONDS and len(self._gaps) <= MAX_GAPS:
+                break
+            del self._gaps[missing]
+        return fresh
+
+    async def _poll(self) -> None:
+        # Start behind the latest id, so ids still in flight below it are noted as gaps
+        self._last_id = max(0, await run_in_threadpool(self._latest_id) - REPLAY_LIMIT)
+        self._advance(await run_in_threadpool(self._fetch, False))
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            # Nobody is listening: follow the ids only, instead of reading changes no one will get
+            listening = self.broker.subscriber_count > 0
+            fresh = self._advance(await run_in_threadpool(self._fetch, listening))
+            if listening and fresh:
+                self.broker.deliver(
+                    {"id": row.id, "user_id": row.user_id, "event": row.event, "data": row.payload} for row in fresh
+                )
+
+    async def start(self) -> None:
+        self._apps += 1
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._poll())
+
+    async def stop(self) -> None:
+        self._apps = max(0, self._apps - 1)
+        if self._task is not None and not self._apps:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+BACKENDS = {
+    "memory": MemoryBackend,
+    "database": DatabaseBackend,
+}
+
+broker = ChangeBroker()
+backend = BACKENDS[CHANGE_FEED_BACKEND](broker)
+
+
+def format_event(event: dict) -> str:
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event['data'], separators=(',', ':'))}\n\n"
+
+
+async def event_stream(user_id: int, last_event_id: Optional[int] = None):
+    """
+    SSE body for one client: the replay after last_event_id, then live events and keep-alive comments
+    """
+    # Subscribe before reading the backlog so nothing committed in between is missed
+    subscription = broker.subscribe(user_id)
+    try:
+        yield f"retry: {CHANGE_FEED_RETRY_MS}\n\n"
+        # Live events up to the last replayed id were already sent by the replay
+        last_replayed_id = 0
+        # Page through the backlog; a short page is the end of it
+        while last_event_id is not None:
+            changes = await run_in_threadpool(changes_since, user_id, last_event_id)
+            for change in changes:
+                yield format_event(change)
+            if changes:
+                last_replayed_id = changes[-1]["id"]
+            last_event_id = last_replayed_id if len(changes) == REPLAY_LIMIT else None
+        while True:
+            try:
+                change = await asyncio.wait_for(subscription.queue.get(), CHANGE_FEED_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if change is None:
+                return
+            if change["id"] > last_replayed_id:
+                yield format_event(change)
+    finally:
+        broker.unsubscribe(subscription)
+
+
+@event.listens_for(Session, "after_commit")
+def on_commit(session):
+    events = session.info.pop("submission_changes", None)
+    if events:
+        backend.publish(events)
+
+
+@event.listens_for(Session, "after_rollback")
+def on_rollback(session):
+    session.info.pop("submission_changes", None)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the submission change log")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    prune = subcommands.add_parser("prune", help="delete changes older than --hours")
+    prune.add_argument("--hours", type=float, default=24.0)
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        deleted = prune_changes(db, timedelta(hours=args.hours))
+        db.commit()
+    print(f"Deleted {deleted} change-log rows")
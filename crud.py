@@ -0,0 +1,377 @@
+# crud.py
+from datetime import datetime
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+from sqlalchemy import String, func, insert, literal, select, tuple_, update
+from sqlalchemy.orm import Query, Session
+import base64
+import json
+import re
+
+from models import FormSubmission, PROMOTED_FORM_DATA_KEYS, form_data_value, promoted_column_name
+from schemas import FormSubmissionCreate
+
+
+# Columns a client may ask for with ?fields=, and the "summary" shorthand
+SELECTABLE_FIELDS = tuple(column.name for column in FormSubmission.__table__.columns if column.computed is None)
+SUMMARY_FIELDS = ("id", "title", "status", "priority")
+
+# Query parameters of the form data.<key>[.<key>...]=<value> filter on form_data
+FORM_DATA_FILTER_PREFIX = "data."
+_FORM_DATA_PATH = re.compile(r"^\w+(\.\w+)*$")
+
+
+# Columns returned by a single-submission update: the full representation,
+# or just what the ETag, stats counters and change feed need
+UPDATE_RETURNING_FULL = tuple(getattr(FormSubmission, name) for name in SELECTABLE_FIELDS)
+UPDATE_RETURNING_MINIMAL = (
+    FormSubmission.id, FormSubmission.form_type, FormSubmission.title, FormSubmission.status,
+    FormSubmission.priority, FormSubmission.submitted_at, FormSubmission.updated_at
+)
+# Attempts at an update that keeps losing the race against concurrent writers
+UPDATE_RETRIES = 3
+
+# The version ETags are built from (see etags.row_version)
+_row_version = func.coalesce(FormSubmission.updated_at, FormSubmission.submitted_at)
+
+
+class UpdateConflict(Exception):
+    """
+    Raised when the submission is no longer at the version the update expected
+    """
+
+
+class InvalidCursor(ValueError):
+    """
+    Raised when a pagination cursor cannot be decoded
+    """
+
+
+def encode_cursor(submitted_at: datetime, submission_id: int) -> str:
+    """
+    Build an opaque cursor pointing just after the given row
+    """
+    raw = json.dumps([submitted_at.isoformat(), submission_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Decode a cursor produced by encode_cursor
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        submitted_at, submission_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(submitted_at), int(submission_id)
+    except (ValueError, TypeError) as exc:
+        raise InvalidCursor("Invalid pagination cursor") from exc
+
+
+def submissions_query(
+    db: Session,
+    user_id: int,
+    status: Optional[str] = None,
+    form_type: Optional[str] = None,
+    submitted_from: Optional[datetime] = None,
+    submitted_to: Optional[datetime] = None,
+    form_data: Optional[Mapping[str, str]] = None,
+) -> Query:
+    """
+    Base query for a user's submissions with the list endpoint's filters applied.
+    The date range is inclusive of submitted_from and exclusive of submitted_to.
+    form_data maps dotted key paths to the text value they must equal.
+    """
+    query = db.query(FormSubmission).filter(FormSubmission.user_id == user_id)
+    if status:
+        query = query.filter(FormSubmission.status == status)
+    if form_type:
+        query = query.filter(FormSubmission.form_type == form_type)
+    if submitted_from:
+        query = query.filter(FormSubmission.submitted_at >= submitted_from)
+    if submitted_to:
+        query = query.filter(FormSubmission.submitted_at < submitted_to)
+    for path, value in (form_data or {}).items():
+        query = query.filter(form_data_expression(path, form_type) == value)
+    return query
+
+
+def form_data_expression(path: str, form_type: Optional[str] = None):
+    """
+    Expression for a dotted form_data path. A key promoted for the filtered
+    form_type resolves to its indexed generated column instead of a JSON lookup.
+    """
+    if form_type and path in PROMOTED_FORM_DATA_KEYS.get(form_type, ()):
+        return getattr(FormSubmission, promoted_column_name(form_type, path))
+    keys = path.split(".")
+    return form_data_value(keys[0] if len(keys) == 1 else tuple(keys))
+
+
+def parse_form_data_filters(params: Mapping[str, str]) -> Dict[str, str]:
+    """
+    Collect data.<path>=<value> query parameters into {path: value}
+    """
+    filters = {}
+    for name, value in params.items():
+        if not name.startswith(FORM_DATA_FILTER_PREFIX):
+            continue
+        path = name[len(FORM_DATA_FILTER_PREFIX):]
+        if not _FORM_DATA_PATH.match(path):
+            raise ValueError(f"Invalid form_data filter '{name}'. Use data.<key> or data.<key>.<nested key>")
+        filters[path] = value
+    return filters
+
+
+def submission_by_id_query(db: Session, user_id: int, submission_id: int) -> Query:
+    """
+    Query for a single submission owned by the user
+    """
+    return db.query(FormSubmission).filter(
+        FormSubmission.id == submission_id,
+        FormSubmission.user_id == user_id
+    )
+
+
+def parse_fields(fields: str) -> List[str]:
+    """
+    Turn a ?fields= value into an ordered list of column names
+    """
+    if fields.strip() == "summary":
+        return list(SUMMARY_FIELDS)
+    names = []
+    for name in (part.strip() for part in fields.split(",")):
+        if not name:
+            continue
+        if name not in SELECTABLE_FIELDS:
+            raise ValueError(f"Unknown field '{name}'. Allowed: summary, {', '.join(SELECTABLE_FIELDS)}")
+        if name not in names:
+            names.append(name)
+    if not names:
+        raise ValueError("fields must name at least one column")
+    return names
+
+
+def project_columns(query: Query, names: List[str]) -> Query:
+    """
+    Select only the named columns. (submitted_at, id) are always loaded for
+    the pagination cursor and updated_at for the page ETag.
+    """
+    selected = list(names) + [name for name in ("submitted_at", "id", "updated_at") if name not in names]
+    return query.with_entities(*(FormSubmission.__table__.c[name] for name in selected))
+
+
+def paginate_submissions(query: Query, limit: int, skip: int = 0, cursor: Optional[str] = None) -> Query:
+    """
+    Order newest first and apply either keyset (cursor) or offset pagination
+    """
+    query = query.order_by(FormSubmission.submitted_at.desc(), FormSubmission.id.desc())
+    if cursor:
+        # Seek past the last row of the previous page using the
+        # (user_id, submitted_at, id) index instead of counting skipped rows
+        submitted_at, submission_id = decode_cursor(cursor)
+        query = query.filter(
+            tuple_(FormSubmission.submitted_at, FormSubmission.id) < tuple_(submitted_at, submission_id)
+        )
+    elif skip:
+        query = query.offset(skip)
+    return query.limit(limit)
+
+
+def next_cursor(rows: list, limit: int) -> Optional[str]:
+    """
+    Cursor for the page after rows, or None when this was the last page
+    """
+    if not rows or len(rows) < limit:
+        return None
+    last = rows[-1]
+    return encode_cursor(last.submitted_at, last.id)
+
+
+def submission_row(user_id: int, form: FormSubmissionCreate, submitted_at: datetime) -> dict:
+    """
+    Column values for a new submission, for core INSERTs
+    """
+    return {
+        "user_id": user_id,
+        "form_type": form.form_type,
+        "title": form.title,
+        "description": form.description,
+        "category": form.category,
+        "priority": form.priority,
+        "status": "submitted",
+        "form_data": form.form_data,
+        "attachments": form.attachments,
+        "submitted_at": submitted_at,
+        "updated_at": submitted_at,
+    }
+
+
+def insert_submission_rows(db: Session, rows: List[dict]) -> List[int]:
+    """
+    One multi-row INSERT ... RETURNING; ids come back in input order. The caller owns the transaction.
+    """
+    result = db.execute(
+        insert(FormSubmission).returning(FormSubmission.id, sort_by_parameter_order=True),
+        rows
+    )
+    return list(result.scalars())
+
+
+BULK_COLUMNS = (
+    FormSubmission.id, FormSubmission.status, FormSubmission.form_type,
+    FormSubmission.priority, FormSubmission.category, _row_version.label("version")
+)
+
+
+def bulk_rows_query(query: Query, max_rows: int) -> Query:
+    """
+    The rows a bulk update reads (and locks) first, one more than max_rows to detect too many
+    """
+    return query.with_entities(*BULK_COLUMNS).order_by(FormSubmission.id).limit(max_rows + 1).with_for_update()
+
+
+def bulk_update_statement(user_id: int, rows: list, values: Dict[str, str]):
+    """
+    UPDATE ... RETURNING of the rows still at the version they were read at
+    """
+    return (
+        update(FormSubmission)
+        .where(
+            # The plain id list is what lets the database find the rows by primary key
+            FormSubmission.id.in_([row.id for row in rows]),
+            tuple_(FormSubmission.id, _row_version).in_([(row.id, row.version) for row in rows]),
+            FormSubmission.user_id == user_id
+        )
+        .values(**values, updated_at=datetime.utcnow())
+        .returning(
+            FormSubmission.id, FormSubmission.form_type, FormSubmission.title,
+            FormSubmission.status, FormSubmission.priority, FormSubmission.updated_at
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def bulk_update_submissions(
+    db: Session, user_id: int, query: Query, values: Dict[str, str], max_rows: int
+) -> Tuple[list, list]:
+    """
+    Set values on the submissions the query selects with one UPDATE ... WHERE (id, version) IN (...) RETURNING.
+    Returns the selected rows as they were before the update, and the rows
+    actually updated (already matching rows are skipped). Raises ValueError,
+    before updating anything, when the query selects more than max_rows.
+
+    The previous status/priority move the stats counters, so every row is only
+    updated at the version it was read at (FOR UPDATE also locks them on
+    PostgreSQL; SQLite ignores it). Rows another writer changed in between are
+    read again and retried; UpdateConflict is raised if they keep changing.
+    The caller owns the transaction.
+    """
+    selected = bulk_rows_query(query, max_rows).all()
+    if len(selected) > max_rows:
+        raise ValueError(f"More than {max_rows} submissions match; narrow the filter or pass ids")
+    current = {row.id: row for row in selected}
+    pending = [row for row in selected if any(getattr(row, field) != value for field, value in values.items())]
+    updated = []
+    for _ in range(UPDATE_RETRIES):
+        if not pending:
+            break
+        rows = db.execute(bulk_update_statement(user_id, pending, values)).all()
+        updated.extend(rows)
+        done = {row.id for row in rows}
+        missed = [row.id for row in pending if row.id not in done]
+        if not missed:
+            pending = []
+            break
+        # Changed since the read: take their current values, or drop them if they no longer match
+        for submission_id in missed:
+            del current[submission_id]
+        reread = query.with_entities(*BULK_COLUMNS).filter(FormSubmission.id.in_(missed)).all()
+        current.update((row.id, row) for row in reread)
+        pending = [row for row in reread if any(getattr(row, field) != value for field, value in values.items())]
+    if pending:
+        raise UpdateConflict()
+    return sorted(current.values(), key=lambda row: row.id), updated
+
+
+def merge_patch(target: Any, patch: Any) -> Any:
+    """
+    Apply an RFC 7396 JSON merge patch to target
+    """
+    if not isinstance(patch, dict):
+        return patch
+    result = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = merge_patch(result.get(key), value)
+    return result
+
+
+def update_submission_columns(
+    db: Session,
+    user_id: int,
+    submission_id: int,
+    values: Dict[str, Any],
+    form_data_patch: Optional[dict] = None,
+    expected_versions: Optional[List[datetime]] = None,
+    returning: Sequence = UPDATE_RETURNING_FULL,
+) -> Tuple[Optional[Any], Optional[Any]]:
+    """
+    Update one submission with a single UPDATE ... RETURNING that sets only the given columns.
+    form_data_patch is merged into form_data (RFC 7396); on SQLite json_patch() does it in SQL.
+
+    The current status/form_type/priority are read first only when status or priority
+    change (the stats counters need them). That read and the UPDATE are tied together by
+    the row version instead of a row lock, and retried if another writer gets in between.
+    expected_versions (from If-Match) must contain the current version or UpdateConflict is raised.
+
+    Returns (previous row or None, returned row); both are None when the user has no such submission.
+    """
+    patch_in_sql = form_data_patch is not None and db.get_bind().dialect.name == "sqlite"
+    patch_in_python = form_data_patch is not None and not patch_in_sql
+    needs_current = bool({"status", "priority"} & values.keys()) or patch_in_python
+    owned = (FormSubmission.id == submission_id, FormSubmission.user_id == user_id)
+
+    for _ in range(UPDATE_RETRIES):
+        conditions = list(owned)
+        current = None
+        if needs_current:
+            columns = [FormSubmission.status, FormSubmission.form_type, FormSubmission.priority,
+                       _row_version.label("version")]
+            if patch_in_python:
+                columns.append(FormSubmission.form_data)
+            current = db.execute(select(*columns).where(*owned)).first()
+            if current is None:
+                return None, None
+            if expected_versions is not None and current.version not in expected_versions:
+                raise UpdateConflict()
+            conditions.append(_row_version == current.version)
+        elif expected_versions is not None:
+            conditions.append(_row_version.in_(expected_versions))
+
+        changes = dict(values, updated_at=datetime.utcnow())
+        if patch_in_sql:
+            changes["form_data"] = func.json_patch(
+                func.coalesce(FormSubmission.form_data, literal("{}", String)),
+                literal(json.dumps(form_data_patch), String)
+            )
+        elif patch_in_python:
+            changes["form_data"] = merge_patch(current.form_data, form_data_patch)
+
+        row = db.execute(
+            update(FormSubmission)
+            .where(*conditions)
+            .values(**changes)
+            .returning(*returning)
+            .execution_options(synchronize_session=False)
+        ).first()
+        if row is not None:
+            return current, row
+        if not needs_current:
+            # Nothing matched: either not the user's submission, or If-Match is stale
+            if expected_versions is not None and db.execute(select(FormSubmission.id).where(*owned)).first():
+                raise UpdateConflict()
+            return None, None
+        if expected_versions is not None:
+            # Changed between the read and the UPDATE, so the expected version is gone
+            raise UpdateConflict()
+    raise UpdateConflict()
@@ -0,0 +1,123 @@
+# etags.py
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from fastapi.responses import Response
+import hashlib
+import re
+
+EPOCH = datetime(1970, 1, 1)
+
+# Submissions are private to their owner: caches may store them but must revalidate
+CACHE_CONTROL = "private, no-cache"
+
+_SUBMISSION_ETAG = re.compile(r'^"s(\d+)-([0-9a-f]+)"$')
+
+
+def row_version(row) -> datetime:
+    """
+    Timestamp of the last change to a submission row
+    """
+    return row.updated_at or row.submitted_at
+
+
+def submission_etag(submission_id: int, version: datetime) -> str:
+    """
+    Strong ETag for one submission. It encodes (id, updated_at) directly so
+    If-Match can be turned back into an updated_at comparison.
+    """
+    micros = (version - EPOCH) // EPOCH.resolution
+    return f'"s{submission_id}-{micros:x}"'
+
+
+def parse_submission_etag(etag: str) -> Optional[Tuple[int, datetime]]:
+    """
+    Inverse of submission_etag; None for anything it did not produce
+    """
+    match = _SUBMISSION_ETAG.match(etag.strip())
+    if not match:
+        return None
+    return int(match.group(1)), EPOCH + int(match.group(2), 16) * EPOCH.resolution
+
+
+def if_match_versions(header: str, submission_id: int) -> Optional[List[datetime]]:
+    """
+    Versions of the submission an If-Match header accepts, or None for "*" (any version).
+    Tags that are weak or belong to another submission never match (RFC 9110 13.1.1).
+    """
+    if header.strip() == "*":
+        return None
+    versions = []
+    for tag in header.split(","):
+        parsed = parse_submission_etag(tag)
+        if parsed and parsed[0] == submission_id:
+            versions.append(parsed[1])
+    return versions
+
+
+def list_etag(rows: Iterable, variant: str = "") -> str:
+    """
+    Aggregate ETag for a page: changes when any row on it changes or the set of rows does
+    """
+    digest = hashlib.sha1(variant.encode())
+    for row in rows:
+        digest.update(f"{row.id}:{row_version(row).isoformat()};".encode())
+    return f'"l{digest.hexdigest()}"'
+
+
+def http_date(value: datetime) -> str:
+    return format_datetime(value.replace(tzinfo=timezone.utc), usegmt=True)
+
+
+def cache_headers(etag: str, last_modified: Optional[datetime]) -> Dict[str, str]:
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+
+def submission_cache_headers(row) -> Dict[str, str]:
+    version = row_version(row)
+    return cache_headers(submission_etag(row.id, version), version)
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """
+    Weak comparison of an If-None-Match header against an ETag
+    """
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    wanted = etag[2:] if etag.startswith("W/") else etag
+    return any(
+        (tag.strip()[2:] if tag.strip().startswith("W/") else tag.strip()) == wanted
+        for tag in header.split(",")
+    )
+
+
+def not_modified_since(header: Optional[str], last_modified: Optional[datetime]) -> bool:
+    """
+    True when If-Modified-Since is at or after last_modified (HTTP dates have second precision)
+    """
+    if not header or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    return last_modified.replace(microsecond=0) <= since
+
+
+def is_not_modified(if_none_match: Optional[str], if_modified_since: Optional[str],
+                    etag: str, last_modified: Optional[datetime]) -> bool:
+    # If-Modified-Since is ignored when If-None-Match is present (RFC 9110 13.1.3)
+    if if_none_match:
+        return etag_matches(if_none_match, etag)
+    return not_modified_since(if_modified_since, last_modified)
+
+
+def not_modified_response(headers: Dict[str, str]) -> Response:
+    return Response(status_code=304, headers=headers)
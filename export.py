@@ -0,0 +1,100 @@
+# export.py
+from datetime import datetime
+from typing import Iterable, Iterator
+from sqlalchemy import Select
+from sqlalchemy.orm import Query
+import csv
+import io
+import json
+import zlib
+
+from database import SessionLocal
+from models import FormSubmission
+
+# Rows fetched from the database cursor per round-trip while exporting
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_COLUMNS = [column.name for column in FormSubmission.__table__.columns if column.computed is None]
+JSON_COLUMNS = {"form_data", "attachments"}
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def export_statement(query: Query) -> Select:
+    """
+    Plain column select (no ORM objects) in the order the index stores the rows
+    """
+    return query.with_entities(*(FormSubmission.__table__.c[name] for name in EXPORT_COLUMNS)).order_by(
+        FormSubmission.submitted_at, FormSubmission.id
+    ).statement
+
+
+def iter_rows(statement: Select, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[list]:
+    """
+    Yield batches of row mappings using a server-side cursor, so only one
+    batch is held in memory at a time. Uses its own session because the
+    response keeps streaming after the request's session is released.
+    """
+    db = SessionLocal()
+    try:
+        result = db.execute(statement.execution_options(stream_results=True, yield_per=batch_size))
+        for partition in result.mappings().partitions():
+            yield partition
+    finally:
+        db.close()
+
+
+def ndjson_chunks(batches: Iterable[list]) -> Iterator[bytes]:
+    for batch in batches:
+        yield "".join(
+            json.dumps(dict(row), default=_json_default, separators=(",", ":")) + "\n" for row in batch
+        ).encode()
+
+
+def csv_chunks(batches: Iterable[list]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for batch in batches:
+        for row in batch:
+            writer.writerow([
+                json.dumps(row[name]) if name in JSON_COLUMNS and row[name] is not None
+                else row[name].isoformat() if isinstance(row[name], datetime)
+                else row[name]
+                for name in EXPORT_COLUMNS
+            ])
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def gzip_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """
+    Compress a byte stream on the fly into a single gzip member
+    """
+    compressor = zlib.compressobj(wbits=31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_stream(statement: Select, format: str, gzip: bool = False) -> Iterator[bytes]:
+    """
+    Stream the rows selected by statement as NDJSON or CSV
+    """
+    batches = iter_rows(statement)
+    chunks = csv_chunks(batches) if format == "csv" else ndjson_chunks(batches)
+    return gzip_chunks(chunks) if gzip else chunks
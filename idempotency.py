@@ -0,0 +1,346 @@
+# idempotency.py
+"""
+Idempotency-Key support for the submit routes.
+
+A client that retries a POST with the same Idempotency-Key header gets the
+first attempt's response back instead of creating a duplicate submission.
+Responses are kept in the idempotency_keys table until they expire, with an
+LRU in front of it. This runs as middleware, so a replay skips body validation
+and never touches form_submissions.
+
+Concurrent requests with one key are coalesced. In this process they wait on
+the first request's result. Across workers, the first request claims the key
+row and the others poll it until the response is stored. The claim is a lease
+the running request keeps renewing: if its worker dies, the claim goes stale
+after IDEMPOTENCY_LEASE_SECONDS and the next request with the key takes it over.
+
+    python idempotency.py prune      # delete expired keys
+"""
+from datetime import datetime, timedelta
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+import anyio
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+
+from cache import MISSING, TTLCache, resolve_token
+from database import SessionLocal
+from models import IdempotencyKey
+
+# Configuration
+IDEMPOTENCY_ENABLED = os.getenv("IDEMPOTENCY_ENABLED", "true").lower() in ("1", "true", "yes")
+IDEMPOTENCY_TTL_HOURS = float(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+# How long a duplicate waits for the original request before giving up with 409
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "10"))
+# How long an in-progress claim outlives its last renewal before another request may take it over
+IDEMPOTENCY_LEASE_SECONDS = float(os.getenv("IDEMPOTENCY_LEASE_SECONDS", "30"))
+
+# (method, path) of the routes that honour Idempotency-Key
+IDEMPOTENT_ROUTES = {
+    ("POST", "/api/forms/submit"),
+    ("POST", "/api/forms/submit/bulk"),
+    ("POST", "/api/async/forms/submit"),
+}
+
+# Responses that say nothing final about the request are not stored, so a retry runs it again
+TRANSIENT_STATUSES = {401, 408, 409, 429}
+
+HEADER = b"idempotency-key"
+MAX_KEY_LENGTH = 255
+POLL_SECONDS = 0.05
+
+keys_table = IdempotencyKey.__table__
+
+
+class StoredResponse(NamedTuple):
+    request_hash: str
+    status_code: int
+    headers: List[Tuple[str, str]]
+    body: bytes
+    expires_at: Optional[datetime] = None
+
+
+# storage key -> StoredResponse
+response_cache = TTLCache(IDEMPOTENCY_CACHE_SIZE, IDEMPOTENCY_TTL_HOURS * 3600)
+
+
+def storage_key(user_id: int, method: str, path: str, key: str) -> str:
+    # Keys are scoped per user and route, so two users picking the same key never collide
+    return hashlib.sha256(f"{user_id}\n{method}\n{path}\n{key}".encode()).hexdigest()
+
+
+def _row_response(row) -> StoredResponse:
+    return StoredResponse(row.request_hash, row.status_code, [tuple(header) for header in row.response_headers],
+                          row.response_body, row.expires_at)
+
+
+def cache_response(key: str, response: StoredResponse) -> None:
+    # Never serve a replay from memory after the stored key has expired
+    response_cache.set(key, response, ttl=(response.expires_at - datetime.utcnow()).total_seconds())
+
+
+def key_statement(key: str):
+    return select(keys_table).where(keys_table.c.key == key)
+
+
+def takeover_statement(key: str, claimed_at: datetime, request_hash: str, now: datetime):
+    """
+    Claim a key whose in-progress claim, last renewed at claimed_at, has lapsed; matches no row if it moved on
+    """
+    return update(keys_table).where(
+        keys_table.c.key == key, keys_table.c.status_code.is_(None), keys_table.c.claimed_at == claimed_at
+    ).values(request_hash=request_hash, claimed_at=now)
+
+
+def claim(key: str, user_id: int, request_hash: str) -> Optional[StoredResponse]:
+    """
+    Claim the key for this request. Returns None when claimed, or the stored response
+    (status_code 0 while the original request is still running).
+    """
+    now = datetime.utcnow()
+    with SessionLocal() as db:
+        row = db.execute(key_statement(key)).first()
+        if row is not None and row.expires_at <= now:
+            db.execute(delete(keys_table).where(keys_table.c.key == key, keys_table.c.expires_at <= now))
+            row = None
+        if row is None:
+            try:
+                db.execute(insert(keys_table).values(
+                    key=key, user_id=user_id, request_hash=request_hash, created_at=now, claimed_at=now,
+                    expires_at=now + timedelta(hours=IDEMPOTENCY_TTL_HOURS)
+                ))
+                db.commit()
+                return None
+            except IntegrityError:
+                # Another worker claimed it between our read and insert
+                db.rollback()
+                row = db.execute(key_statement(key)).first()
+                if row is None:
+                    # Not a race but a bad user id (e.g. a deleted user): let the route reject it
+                    return None
+        if row.status_code is None and row.claimed_at <= now - timedelta(seconds=IDEMPOTENCY_LEASE_SECONDS):
+            # The request holding the claim stopped renewing it (its worker died): take it over
+            taken = db.execute(takeover_statement(key, row.claimed_at, request_hash, now)).rowcount
+            db.commit()
+            if taken:
+                return None
+            row = db.execute(key_statement(key)).first()
+            if row is None:
+                return claim(key, user_id, request_hash)
+        if row.status_code is None:
+            return StoredResponse(row.request_hash, 0, [], b"")
+        return _row_response(row)
+
+
+def renew(key: str) -> None:
+    """
+    Extend the lease on a claim whose request is still running
+    """
+    with SessionLocal() as db:
+        db.execute(update(keys_table).where(keys_table.c.key == key, keys_table.c.status_code.is_(None))
+                   .values(claimed_at=datetime.utcnow()))
+        db.commit()
+
+
+def save(key: str, response: StoredResponse) -> StoredResponse:
+    with SessionLocal() as db:
+        expires_at = db.execute(update(keys_table).where(keys_table.c.key == key).values(
+            status_code=response.status_code, response_headers=response.headers, response_body=response.body
+        ).returning(keys_table.c.expires_at)).scalar()
+        db.commit()
+    return response._replace(expires_at=expires_at or datetime.utcnow())
+
+
+def release(key: str) -> None:
+    """
+    Forget a claim whose request failed, so a retry runs it again
+    """
+    with SessionLocal() as db:
+        db.execute(delete(keys_table).where(keys_table.c.key == key, keys_table.c.status_code.is_(None)))
+        db.commit()
+
+
+def prune_keys() -> int:
+    with SessionLocal() as db:
+        result = db.execute(delete(keys_table).where(keys_table.c.expires_at <= datetime.utcnow()))
+        db.commit()
+        return result.rowcount
+
+
+def _bearer_token(headers: Dict[bytes, bytes]) -> Optional[str]:
+    scheme, _, token = headers.get(b"authorization", b"").decode("latin-1").partition(" ")
+    return token.strip() if scheme.lower() == "bearer" and token.strip() else None
+
+
+async def _send_json(send, status_code: int, detail: str, extra_headers: Optional[List] = None) -> None:
+    body = json.dumps({"detail": detail}).encode()
+    headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    await send({"type": "http.response.start", "status": status_code, "headers": headers + (extra_headers or [])})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _replay(send, response: StoredResponse) -> None:
+    headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in response.headers]
+    headers.append((b"idempotent-replayed", b"true"))
+    await send({"type": "http.response.start", "status": response.status_code, "headers": headers})
+    await send({"type": "http.response.body", "body": response.body})
+
+
+class IdempotencyMiddleware:
+    """
+    ASGI middleware that stores and replays responses of IDEMPOTENT_ROUTES per Idempotency-Key
+    """
+
+    def __init__(self, app):
+        self.app = app
+        # storage key -> future resolved with the response of the request running it in this process
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http" or not IDEMPOTENCY_ENABLED
+            or (scope["method"], scope["path"]) not in IDEMPOTENT_ROUTES
+        ):
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        raw_key = headers.get(HEADER)
+        token = _bearer_token(headers)
+        user_id = resolve_token(token) if raw_key is not None and token else None
+        if not user_id:
+            # No key, or unauthenticated: the route handles it (and rejects the latter)
+            await self.app(scope, receive, send)
+            return
+        idempotency_key = raw_key.decode("latin-1").strip()
+        if not idempotency_key or len(idempotency_key) > MAX_KEY_LENGTH:
+            await _send_json(send, 400, f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters")
+            return
+
+        body = await self._read_body(receive)
+        request_hash = hashlib.sha256(body).hexdigest()
+        key = storage_key(user_id, scope["method"], scope["path"], idempotency_key)
+
+        stored = await self._stored_response(key, user_id, request_hash)
+        if stored is not None:
+            if stored.request_hash != request_hash:
+                await _send_json(send, 422, "Idempotency-Key was already used with a different request body")
+            elif stored.status_code == 0:
+                await _send_json(send, 409, "A request with this Idempotency-Key is still in progress",
+                                 [(b"retry-after", b"1")])
+            else:
+                await _replay(send, stored)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        renewing = asyncio.create_task(self._renew(key))
+        try:
+            response = await self._run(scope, body, receive, send)
+            renewing.cancel()
+            if response is not None and response.status_code < 500 and response.status_code not in TRANSIENT_STATUSES:
+                response = await anyio.to_thread.run_sync(save, key, response._replace(request_hash=request_hash))
+                cache_response(key, response)
+                future.set_result(response)
+            else:
+                await anyio.to_thread.run_sync(release, key)
+                future.set_result(None)
+        except BaseException:
+            await anyio.to_thread.run_sync(release, key)
+            if not future.done():
+                future.set_result(None)
+            raise
+        finally:
+            renewing.cancel()
+            self._inflight.pop(key, None)
+
+    @staticmethod
+    async def _renew(key: str) -> None:
+        while True:
+            await asyncio.sleep(IDEMPOTENCY_LEASE_SECONDS / 3)
+            await anyio.to_thread.run_sync(renew, key)
+
+    async def _stored_response(self, key: str, user_id: int, request_hash: str) -> Optional[StoredResponse]:
+        """
+        The response to replay, or None once this request owns the key
+        """
+        deadline = asyncio.get_running_loop().time() + IDEMPOTENCY_WAIT_SECONDS
+        while True:
+            cached = response_cache.get(key)
+            if cached is not MISSING:
+                return cached
+            inflight = self._inflight.get(key)
+            if inflight is not None:
+                # Same process: wait for the original request instead of polling the table
+                try:
+                    remaining = deadline - asyncio.get_running_loop().time()
+                    result = await asyncio.wait_for(asyncio.shield(inflight), remaining)
+                except asyncio.TimeoutError:
+                    return StoredResponse(request_hash, 0, [], b"")
+                if result is not None:
+                    return result
+                # The original failed and released the key: try to claim it ourselves
+                continue
+            stored = await anyio.to_thread.run_sync(claim, key, user_id, request_hash)
+            if stored is None:
+                return None
+            if stored.status_code:
+                cache_response(key, stored)
+                return stored
+            if stored.request_hash != request_hash or asyncio.get_running_loop().time() >= deadline:
+                return stored
+            # Another worker is running it: poll until its response is stored
+            await asyncio.sleep(POLL_SECONDS)
+
+    @staticmethod
+    async def _read_body(receive) -> bytes:
+        chunks = []
+        while True:
+            message = await receive()
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body"):
+                return b"".join(chunks)
+
+    async def _run(self, scope, body: bytes, receive, send) -> Optional[StoredResponse]:
+        """
+        Run the route with the buffered body, passing its response through and keeping a copy
+        """
+        body_sent = False
+        status_code = None
+        headers: List[Tuple[str, str]] = []
+        chunks = []
+
+        async def replay_receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        async def capture_send(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers.extend(
+                    (name.decode("latin-1"), value.decode("latin-1")) for name, value in message.get("headers", [])
+                )
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        await self.app(scope, replay_receive, capture_send)
+        if status_code is None:
+            return None
+        return StoredResponse("", status_code, headers, b"".join(chunks))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain stored idempotency keys")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    subcommands.add_parser("prune", help="delete expired keys")
+    parser.parse_args()
+    print(f"Deleted {prune_keys()} expired idempotency keys")
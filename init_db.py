@@ -1,8 +1,14 @@
 # init_db.py
-from database import Base, engine
+from alembic import command
+from alembic.config import Config
+from database import check_schema, get_engine
 import models
+import search  # noqa: F401  (installs the full-text index when form_submissions is created)
 
 # This will create all tables based on your models
-Base.metadata.create_all(bind=engine)
+check_schema(get_engine(), "create")
+
+# Mark the fresh schema as up to date so `alembic upgrade head` only runs newer migrations
+command.stamp(Config("alembic.ini"), "head")
 
 print("✅ All tables created successfully.")
@@ -1,30 +1,141 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import APIRouter, FastAPI, HTTPException, Depends, Header, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, ORJSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
-from typing import List, Optional
-import uvicorn
+from typing import List, Literal, Optional
+from pydantic import ValidationError
+from contextlib import asynccontextmanager
 from datetime import datetime
 import os
 
 # Import our custom modules
-from database import engine, SessionLocal, Base
-from models import User, FormSubmission
+from database import (
+    SessionLocal, ASYNC_DB_ENABLED, get_engine, check_schema, get_async_engine, dispose_async_engine, pool_stats,
+    UnsupportedDialect
+)
+from models import User, FormSubmission, Attachment, AttachmentUpload
 from schemas import (
     UserCreate, UserResponse, UserLogin, LoginResponse,
-    FormSubmissionCreate, FormSubmissionResponse, FormSubmissionUpdate
+    FormSubmissionCreate, FormSubmissionResponse, FormSubmissionUpdate, FormSubmissionMergePatch,
+    FormSubmissionBulkCreate, BulkSubmitItemResult, BulkSubmitResponse, SubmissionStatsResponse,
+    FormSubmissionBulkUpdate, BulkUpdateItemResult, BulkUpdateResponse, BULK_UPDATE_MAX_ITEMS,
+    QueuedSubmissionResponse, AttachmentResponse, AttachmentUploadCreate, AttachmentUploadResponse
 )
-from auth import verify_token, create_access_token, verify_password, get_password_hash
-
-# Create database tables
-Base.metadata.create_all(bind=engine)
-
-app = FastAPI(
-    title="KPA Form Data API",
-    description="API for managing user authentication and form submissions",
-    version="1.0.0"
+from auth import (
+    create_access_token, verify_password_async, get_password_hash_async,
+    password_hasher, HashingOverloaded
+)
+from crud import (
+    InvalidCursor, submissions_query, submission_by_id_query, paginate_submissions, next_cursor,
+    submission_row, insert_submission_rows, bulk_update_submissions, update_submission_columns,
+    UpdateConflict, UPDATE_RETURNING_FULL, UPDATE_RETURNING_MINIMAL,
+    parse_fields, project_columns, parse_form_data_filters, SUMMARY_FIELDS
+)
+from serializers import (
+    submission_response, submissions_response, summaries_json, projected_json, json_response
+)
+from etags import (
+    list_etag, row_version, cache_headers, submission_cache_headers, is_not_modified, not_modified_response,
+    if_match_versions, etag_matches
+)
+from stats import record_created, record_changed, record_changed_many, user_stats
+from export import MEDIA_TYPES, export_statement, export_stream
+from cache import USER_CACHE_ENABLED, MISSING, resolve_token, user_cache, cache_stats
+from search import InvalidSearch, search_submissions
+from metrics import METRICS_ENABLED, CONTENT_TYPE, MetricsMiddleware, render_metrics, timed
+from write_behind import WRITE_BEHIND_ENABLED, WriteBehindOverloaded, WriteBehindWriter
+from idempotency import IdempotencyMiddleware, response_cache as idempotency_cache
+from ratelimit import RATE_LIMIT_BACKEND, BACKENDS as RATE_LIMIT_BACKENDS, RateLimitMiddleware
+from change_feed import backend as change_feed_backend, event_stream, record_changes, submission_payload
+from attachments import (
+    InvalidUpload, AttachmentTooLarge, UploadOffsetMismatch, UploadBusy, UploadGone, BlobResponse, store,
+    read_multipart, store_attachments, create_upload, upload_offset, append_chunk, complete_upload,
+    attachments_query, attachment_by_id_query, upload_by_id_query,
+    parse_range, download_headers
 )
 
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
+
+router = APIRouter()
+
+def hashing_overloaded_handler(request: Request, exc: HashingOverloaded):
+    # Shed load instead of letting login latency grow without bound
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Authentication service is busy, please retry"},
+        headers={"Retry-After": "1"},
+    )
+
+def write_behind_overloaded_handler(request: Request, exc: WriteBehindOverloaded):
+    # Backpressure: the database is not keeping up with queued submissions
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Submission queue is full, please retry"},
+        headers={"Retry-After": "1"},
+    )
+
+def unsupported_dialect_handler(request: Request, exc: UnsupportedDialect):
+    # The feature exists, just not for this database
+    return JSONResponse(status_code=status.HTTP_501_NOT_IMPLEMENTED, content={"detail": str(exc)})
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Startup and shutdown. Nothing touches the database before this runs.
+    """
+    await run_in_threadpool(check_schema, get_engine())
+    write_behind = app.state.write_behind
+    if write_behind is not None:
+        # Replays journaled submissions left by a crash before accepting new ones
+        write_behind.start()
+    await change_feed_backend.start()
+    try:
+        yield
+    finally:
+        if write_behind is not None:
+            write_behind.stop()
+        await change_feed_backend.stop()
+        password_hasher.shutdown()
+        await dispose_async_engine()
+
+def create_app() -> FastAPI:
+    """
+    Build the application. Building it has no side effects, so workers and tests
+    can create as many as they like; the schema check runs in the lifespan.
+    Stateful parts (the write-behind queue, the rate-limit buckets) belong to the app, on app.state.
+    """
+    app = FastAPI(
+        title="KPA Form Data API",
+        description="API for managing user authentication and form submissions",
+        version="1.0.0",
+        default_response_class=ORJSONResponse,
+        lifespan=lifespan,
+    )
+    app.state.write_behind = WriteBehindWriter(SessionLocal) if WRITE_BEHIND_ENABLED else None
+    app.state.rate_limit_backend = RATE_LIMIT_BACKENDS[RATE_LIMIT_BACKEND]()
+
+    # Replays retried submits by Idempotency-Key before the request reaches validation
+    app.add_middleware(IdempotencyMiddleware)
+
+    # Token buckets per user (optionally per client IP) answer 429 before any DB or bcrypt work
+    app.add_middleware(RateLimitMiddleware, backend=app.state.rate_limit_backend)
+
+    if METRICS_ENABLED:
+        # Per-route latency plus the JWT / user lookup / DB / bcrypt / serialization breakdown, served on /metrics
+        app.add_middleware(MetricsMiddleware)
+
+    app.add_exception_handler(HashingOverloaded, hashing_overloaded_handler)
+    app.add_exception_handler(WriteBehindOverloaded, write_behind_overloaded_handler)
+    app.add_exception_handler(UnsupportedDialect, unsupported_dialect_handler)
+
+    app.include_router(router)
+    if ASYNC_DB_ENABLED:
+        # async def variants of the form routes under /api/async/forms
+        from async_routes import router as async_forms_router
+        app.include_router(async_forms_router)
+    return app
 
 # Dependency to get database session
 def get_db():
@@ -36,8 +147,8 @@ def get_db():
 
 # Dependency to get current user
 def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)):
-    token = credentials.credentials
-    user_id = verify_token(token)
+    with timed("jwt"):
+        user_id = resolve_token(credentials.credentials)
     if not user_id:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -45,7 +156,14 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    user = db.query(User).filter(User.id == user_id).first()
+    with timed("user_lookup"):
+        user = user_cache.get(user_id) if USER_CACHE_ENABLED else MISSING
+        if user is MISSING:
+            user = db.query(User).filter(User.id == user_id).first()
+            if user and USER_CACHE_ENABLED:
+                # Detach so the cached row outlives this request's session
+                db.expunge(user)
+                user_cache.set(user_id, user)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -54,13 +172,15 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
     return user
 
 # API 1: User Authentication API
-@app.post("/api/auth/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-def register_user(user: UserCreate, db: Session = Depends(get_db)):
+@router.post("/api/auth/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
+async def register_user(user: UserCreate, db: Session = Depends(get_db)):
     """
     Register a new user with phone number and password
     """
     # Check if user with phone number already exists
-    existing_user = db.query(User).filter(User.phone_number == user.phone_number).first()
+    existing_user = await run_in_threadpool(
+        db.query(User).filter(User.phone_number == user.phone_number).first
+    )
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -68,7 +188,7 @@ def register_user(user: UserCreate, db: Session = Depends(get_db)):
         )
     
     # Create new user
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash_async(user.password)
     db_user = User(
         phone_number=user.phone_number,
         full_name=user.full_name,
@@ -78,9 +198,12 @@ def register_user(user: UserCreate, db: Session = Depends(get_db)):
         created_at=datetime.utcnow()
     )
     
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    def save_user():
+        db.add(db_user)
+        db.commit()
+        db.refresh(db_user)
+
+    await run_in_threadpool(save_user)
     
     return UserResponse(
         id=db_user.id,
@@ -91,15 +214,17 @@ def register_user(user: UserCreate, db: Session = Depends(get_db)):
         created_at=db_user.created_at
     )
 
-@app.post("/api/auth/login", response_model=LoginResponse)
-def login_user(user_credentials: UserLogin, db: Session = Depends(get_db)):
+@router.post("/api/auth/login", response_model=LoginResponse)
+async def login_user(user_credentials: UserLogin, db: Session = Depends(get_db)):
     """
     Authenticate user with phone number and password
     """
     # Find user by phone number
-    user = db.query(User).filter(User.phone_number == user_credentials.phone_number).first()
+    user = await run_in_threadpool(
+        db.query(User).filter(User.phone_number == user_credentials.phone_number).first
+    )
     
-    if not user or not verify_password(user_credentials.password, user.hashed_password):
+    if not user or not await verify_password_async(user_credentials.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid phone number or password"
@@ -128,15 +253,29 @@ def login_user(user_credentials: UserLogin, db: Session = Depends(get_db)):
     )
 
 # API 2: Form Submission Management API
-@app.post("/api/forms/submit", response_model=FormSubmissionResponse, status_code=status.HTTP_201_CREATED)
+@router.post(
+    "/api/forms/submit",
+    response_model=FormSubmissionResponse,
+    status_code=status.HTTP_201_CREATED,
+    responses={status.HTTP_202_ACCEPTED: {"model": QueuedSubmissionResponse}}
+)
 def submit_form(
     form_data: FormSubmissionCreate,
+    request: Request,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
-    Submit a new form with various data fields
+    Submit a new form with various data fields.
+    With WRITE_BEHIND_ENABLED the form is journaled and queued for a batched
+    insert, and the response is 202 with a receipt instead of the stored row.
     """
+    write_behind = request.app.state.write_behind
+    if write_behind is not None:
+        receipt, submitted_at = write_behind.submit(current_user.id, form_data)
+        queued = QueuedSubmissionResponse(receipt=receipt, status="queued", submitted_at=submitted_at)
+        return json_response(queued.model_dump_json().encode(), status_code=status.HTTP_202_ACCEPTED)
+    
     # Create form submission
     db_form = FormSubmission(
         user_id=current_user.id,
@@ -152,78 +291,315 @@ def submit_form(
     )
     
     db.add(db_form)
+    record_created(db, current_user.id, [("submitted", db_form.form_type, db_form.priority)])
+    # Flush for the id the change-feed event carries
+    db.flush()
+    record_changes(db, current_user.id, "created", [submission_payload(db_form.id, db_form)])
     db.commit()
     db.refresh(db_form)
     
-    return FormSubmissionResponse(
-        id=db_form.id,
-        user_id=db_form.user_id,
-        form_type=db_form.form_type,
-        title=db_form.title,
-        description=db_form.description,
-        category=db_form.category,
-        priority=db_form.priority,
-        status=db_form.status,
-        form_data=db_form.form_data,
-        attachments=db_form.attachments,
-        submitted_at=db_form.submitted_at,
-        updated_at=db_form.updated_at
+    return submission_response(
+        db_form, status_code=status.HTTP_201_CREATED, headers=submission_cache_headers(db_form)
+    )
+
+@router.post("/api/forms/submit/bulk", response_model=BulkSubmitResponse)
+def submit_forms_bulk(
+    bulk: FormSubmissionBulkCreate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Submit many forms at once (e.g. an offline queue being synced).
+    Each item is validated independently; valid items are inserted in one
+    transaction and the result of every item is reported by its index.
+    """
+    results = []
+    valid_forms = []
+    for index, item in enumerate(bulk.items):
+        try:
+            valid_forms.append((index, FormSubmissionCreate.model_validate(item)))
+        except ValidationError as exc:
+            error = "; ".join(
+                f"{'.'.join(str(part) for part in err['loc']) or 'item'}: {err['msg']}" for err in exc.errors()
+            )
+            results.append(BulkSubmitItemResult(index=index, success=False, error=error))
+    
+    if valid_forms:
+        now = datetime.utcnow()
+        rows = [submission_row(current_user.id, form, now) for _, form in valid_forms]
+        ids = insert_submission_rows(db, rows)
+        record_created(
+            db, current_user.id, [("submitted", form.form_type, form.priority) for _, form in valid_forms]
+        )
+        record_changes(
+            db, current_user.id, "created", [submission_payload(new_id, row) for new_id, row in zip(ids, rows)]
+        )
+        db.commit()
+        results.extend(
+            BulkSubmitItemResult(index=index, success=True, id=new_id)
+            for (index, _), new_id in zip(valid_forms, ids)
+        )
+    
+    results.sort(key=lambda result: result.index)
+    return BulkSubmitResponse(
+        created=len(valid_forms),
+        failed=len(results) - len(valid_forms),
+        results=results
+    )
+
+@router.patch("/api/forms/submissions/bulk", response_model=BulkUpdateResponse)
+def update_submissions_bulk(
+    bulk: FormSubmissionBulkUpdate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Set status, priority and/or category on many submissions at once, chosen
+    by `ids` or by a `filter` (status, form_type, submitted_from, submitted_to).
+    All changes are applied with one UPDATE in a single transaction, and the
+    result of every submission is reported by id.
+    """
+    values = bulk.model_dump(include={"status", "priority", "category"}, exclude_none=True)
+    if bulk.ids is not None:
+        query = submissions_query(db, current_user.id).filter(FormSubmission.id.in_(bulk.ids))
+    else:
+        query = submissions_query(db, current_user.id, **bulk.filter.model_dump())
+    try:
+        current, updated = bulk_update_submissions(db, current_user.id, query, values, BULK_UPDATE_MAX_ITEMS)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    except UpdateConflict:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Form submissions are being modified, retry")
+    requested_ids = list(dict.fromkeys(bulk.ids)) if bulk.ids is not None else [row.id for row in current]
+    
+    updated_ids = {row.id for row in updated}
+    record_changed_many(db, current_user.id, [
+        (
+            (row.status, row.form_type, row.priority),
+            (values.get("status", row.status), row.form_type, values.get("priority", row.priority))
+        )
+        for row in current if row.id in updated_ids
+    ])
+    record_changes(db, current_user.id, "updated", [submission_payload(row.id, row) for row in updated])
+    db.commit()
+    
+    found_ids = {row.id for row in current}
+    results = [
+        BulkUpdateItemResult(id=submission_id, success=True, changed=submission_id in updated_ids)
+        if submission_id in found_ids
+        else BulkUpdateItemResult(id=submission_id, success=False, error="Form submission not found")
+        for submission_id in requested_ids
+    ]
+    return BulkUpdateResponse(
+        updated=len(updated_ids),
+        unchanged=len(found_ids) - len(updated_ids),
+        failed=len(requested_ids) - len(found_ids),
+        results=results
     )
 
-@app.get("/api/forms/submissions", response_model=List[FormSubmissionResponse])
+def page_last_modified(rows) -> Optional[datetime]:
+    return max((row_version(row) for row in rows), default=None)
+
+def page_cache_headers(rows, fields: Optional[str]) -> dict:
+    # The field selection changes the representation, so it is part of the ETag
+    return cache_headers(list_etag(rows, variant=fields or ""), page_last_modified(rows))
+
+@router.get("/api/forms/submissions", response_model=List[FormSubmissionResponse])
 def get_user_submissions(
+    request: Request,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
     skip: int = 0,
     limit: int = 10,
+    cursor: Optional[str] = None,
     status: Optional[str] = None,
-    form_type: Optional[str] = None
+    form_type: Optional[str] = None,
+    fields: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    if_modified_since: Optional[str] = Header(None)
 ):
     """
-    Get all form submissions for the authenticated user with optional filters
+    Get all form submissions for the authenticated user with optional filters.
+    Results are newest first; pass the X-Next-Cursor header back as `cursor`
+    to fetch the next page (preferred over `skip` for deep pages).
+    `fields=summary` (id, title, status, priority) or a comma-separated list of
+    columns returns only those fields and reads only those columns.
+    `data.<key>=<value>` (repeatable, `data.a.b` for nested keys) filters on form_data.
     """
-    query = db.query(FormSubmission).filter(FormSubmission.user_id == current_user.id)
+    try:
+        form_data = parse_form_data_filters(request.query_params)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    query = submissions_query(db, current_user.id, status=status, form_type=form_type, form_data=form_data)
     
-    # Apply filters
-    if status:
-        query = query.filter(FormSubmission.status == status)
-    if form_type:
-        query = query.filter(FormSubmission.form_type == form_type)
+    field_names = None
+    if fields:
+        try:
+            field_names = parse_fields(fields)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+        query = project_columns(query, field_names)
     
     # Get submissions with pagination
-    submissions = query.offset(skip).limit(limit).all()
-    
-    return [
-        FormSubmissionResponse(
-            id=submission.id,
-            user_id=submission.user_id,
-            form_type=submission.form_type,
-            title=submission.title,
-            description=submission.description,
-            category=submission.category,
-            priority=submission.priority,
-            status=submission.status,
-            form_data=submission.form_data,
-            attachments=submission.attachments,
-            submitted_at=submission.submitted_at,
-            updated_at=submission.updated_at
+    try:
+        page_query = paginate_submissions(query, limit, skip=skip, cursor=cursor)
+    except InvalidCursor as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    
+    if if_none_match or if_modified_since:
+        # Answer revalidation from (id, updated_at) alone before loading full rows
+        versions = paginate_submissions(
+            project_columns(submissions_query(db, current_user.id, status=status, form_type=form_type,
+                                              form_data=form_data),
+                            ["id", "updated_at"]),
+            limit, skip=skip, cursor=cursor
+        ).all()
+        headers = page_cache_headers(versions, fields)
+        if is_not_modified(if_none_match, if_modified_since, headers["ETag"], page_last_modified(versions)):
+            return not_modified_response(headers)
+    
+    submissions = page_query.all()
+    
+    headers = page_cache_headers(submissions, fields)
+    cursor_for_next_page = next_cursor(submissions, limit)
+    if cursor_for_next_page:
+        headers["X-Next-Cursor"] = cursor_for_next_page
+    
+    if field_names is None:
+        return submissions_response(submissions, headers=headers)
+    if field_names == list(SUMMARY_FIELDS):
+        return json_response(summaries_json(submissions), headers=headers)
+    return json_response(projected_json(submissions, field_names), headers=headers)
+
+@router.get("/api/forms/stats", response_model=SubmissionStatsResponse)
+def get_submission_stats(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Submission counts for the authenticated user by status, form type and priority
+    """
+    return user_stats(db, current_user.id)
+
+@router.get("/api/forms/search", response_model=List[FormSubmissionResponse])
+def search_user_submissions(
+    q: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    limit: int = 10,
+    cursor: Optional[str] = None
+):
+    """
+    Full-text search over the authenticated user's submissions (title,
+    description and text values in form_data), best matches first.
+    Pass the X-Next-Cursor response header back as cursor for the next page.
+    Later pages leave out submissions created after the first one; editing a match
+    between pages can move it across a page boundary, so it may repeat or be missed.
+    """
+    try:
+        submissions, cursor_for_next_page = search_submissions(db, current_user.id, q, limit=limit, cursor=cursor)
+    except InvalidSearch as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    
+    headers = {}
+    if cursor_for_next_page:
+        headers["X-Next-Cursor"] = cursor_for_next_page
+    return submissions_response(submissions, headers=headers)
+
+def stream_user_id(token: str) -> int:
+    # The stream outlives the request, so authenticate on a short-lived session instead of get_db
+    with SessionLocal() as db:
+        return get_current_user(HTTPAuthorizationCredentials(scheme="Bearer", credentials=token), db).id
+
+@router.get("/api/forms/stream", response_class=StreamingResponse)
+async def stream_changes(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
+    token: Optional[str] = None,
+    last_event_id: Optional[int] = Header(None)
+):
+    """
+    Server-sent events for the authenticated user's submission creates and updates.
+    EventSource cannot set headers, so the access token may also be passed as `token`.
+    On reconnect the Last-Event-ID header replays the changes the client missed.
+    """
+    access_token = credentials.credentials if credentials else token
+    if not access_token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
         )
-        for submission in submissions
-    ]
+    user_id = await run_in_threadpool(stream_user_id, access_token)
+    return StreamingResponse(
+        event_stream(user_id, last_event_id),
+        media_type="text/event-stream",
+        # Stop proxies from buffering or caching the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
-@app.get("/api/forms/submissions/{submission_id}", response_model=FormSubmissionResponse)
+@router.get("/api/forms/submissions/export")
+def export_user_submissions(
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    format: Literal["ndjson", "csv"] = "ndjson",
+    status: Optional[str] = None,
+    form_type: Optional[str] = None,
+    submitted_from: Optional[datetime] = None,
+    submitted_to: Optional[datetime] = None,
+    gzip: bool = False
+):
+    """
+    Stream the authenticated user's full submission history as NDJSON or CSV.
+    Rows are read in batches from a server-side cursor, so memory use does not
+    grow with the number of submissions. Accepts the list's data.<key> filters.
+    """
+    try:
+        form_data = parse_form_data_filters(request.query_params)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    
+    # The stream runs after this request's session is released, so it opens its own
+    with SessionLocal() as db:
+        statement = export_statement(submissions_query(
+            db, current_user.id, status=status, form_type=form_type,
+            submitted_from=submitted_from, submitted_to=submitted_to, form_data=form_data
+        ))
+    
+    headers = {"Content-Disposition": f'attachment; filename="submissions.{format}{".gz" if gzip else ""}"'}
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(
+        export_stream(statement, format, gzip=gzip),
+        media_type=MEDIA_TYPES[format],
+        headers=headers
+    )
+
+@router.get("/api/forms/submissions/{submission_id}", response_model=FormSubmissionResponse)
 def get_submission_by_id(
     submission_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    if_none_match: Optional[str] = Header(None),
+    if_modified_since: Optional[str] = Header(None)
 ):
     """
-    Get a specific form submission by ID
+    Get a specific form submission by ID.
+    Supports conditional GET via If-None-Match / If-Modified-Since.
     """
-    submission = db.query(FormSubmission).filter(
-        FormSubmission.id == submission_id,
-        FormSubmission.user_id == current_user.id
-    ).first()
+    query = submission_by_id_query(db, current_user.id, submission_id)
+    
+    if if_none_match or if_modified_since:
+        # Check freshness from (id, updated_at) before loading the full row
+        version = query.with_entities(
+            FormSubmission.id, FormSubmission.updated_at, FormSubmission.submitted_at
+        ).first()
+        if version:
+            headers = submission_cache_headers(version)
+            if is_not_modified(if_none_match, if_modified_since, headers["ETag"], row_version(version)):
+                return not_modified_response(headers)
+    
+    submission = query.first()
     
     if not submission:
         raise HTTPException(
@@ -231,86 +607,357 @@ def get_submission_by_id(
             detail="Form submission not found"
         )
     
-    return FormSubmissionResponse(
-        id=submission.id,
-        user_id=submission.user_id,
-        form_type=submission.form_type,
-        title=submission.title,
-        description=submission.description,
-        category=submission.category,
-        priority=submission.priority,
-        status=submission.status,
-        form_data=submission.form_data,
-        attachments=submission.attachments,
-        submitted_at=submission.submitted_at,
-        updated_at=submission.updated_at
-    )
+    return submission_response(submission, headers=submission_cache_headers(submission))
+
+def apply_submission_update(
+    db: Session,
+    user_id: int,
+    submission_id: int,
+    values: dict,
+    form_data_patch: Optional[dict],
+    if_match: Optional[str],
+    prefer: Optional[str]
+):
+    # Prefer: return=minimal skips returning (and decoding) the large columns; the client gets the new ETag only
+    minimal = prefer is not None and "return=minimal" in prefer.replace(" ", "").lower()
+    try:
+        previous, row = update_submission_columns(
+            db, user_id, submission_id, values, form_data_patch=form_data_patch,
+            expected_versions=if_match_versions(if_match, submission_id) if if_match else None,
+            returning=UPDATE_RETURNING_MINIMAL if minimal else UPDATE_RETURNING_FULL
+        )
+    except UpdateConflict:
+        db.rollback()
+        if if_match:
+            raise HTTPException(
+                status_code=status.HTTP_412_PRECONDITION_FAILED,
+                detail="Form submission was modified; fetch it again and retry"
+            )
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Form submission is being modified, retry")
+    
+    if row is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Form submission not found"
+        )
+    
+    if previous is not None:
+        record_changed(
+            db, user_id, (previous.status, previous.form_type, previous.priority),
+            (row.status, row.form_type, row.priority)
+        )
+    record_changes(db, user_id, "updated", [submission_payload(row.id, row)])
+    db.commit()
+    
+    headers = submission_cache_headers(row)
+    if minimal:
+        headers["Preference-Applied"] = "return=minimal"
+        return Response(status_code=status.HTTP_204_NO_CONTENT, headers=headers)
+    return submission_response(row, headers=headers)
 
-@app.put("/api/forms/submissions/{submission_id}", response_model=FormSubmissionResponse)
+@router.put(
+    "/api/forms/submissions/{submission_id}",
+    response_model=FormSubmissionResponse,
+    responses={status.HTTP_204_NO_CONTENT: {"description": "Updated (Prefer: return=minimal)"}}
+)
 def update_submission(
     submission_id: int,
     form_update: FormSubmissionUpdate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    if_match: Optional[str] = Header(None),
+    prefer: Optional[str] = Header(None)
 ):
     """
-    Update a form submission
+    Update a form submission. Fields left out (or null) keep their value.
+    Send the ETag in If-Match to fail with 412 instead of overwriting a newer change.
     """
-    submission = db.query(FormSubmission).filter(
-        FormSubmission.id == submission_id,
-        FormSubmission.user_id == current_user.id
-    ).first()
-    
-    if not submission:
+    return apply_submission_update(
+        db, current_user.id, submission_id, form_update.model_dump(exclude_none=True), None, if_match, prefer
+    )
+
+@router.patch(
+    "/api/forms/submissions/{submission_id}",
+    response_model=FormSubmissionResponse,
+    responses={status.HTTP_204_NO_CONTENT: {"description": "Updated (Prefer: return=minimal)"}}
+)
+def patch_submission(
+    submission_id: int,
+    patch: FormSubmissionMergePatch,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    if_match: Optional[str] = Header(None),
+    prefer: Optional[str] = Header(None)
+):
+    """
+    Apply a JSON merge patch (RFC 7396, application/merge-patch+json) to a form submission.
+    Members left out are unchanged, null clears description/category/attachments,
+    and form_data is merged key by key so only the changed keys need to be sent.
+    """
+    values = {field: getattr(patch, field) for field in patch.model_fields_set}
+    form_data_patch = values.pop("form_data", None)
+    if "form_data" in patch.model_fields_set and form_data_patch is None:
+        values["form_data"] = None
+    return apply_submission_update(db, current_user.id, submission_id, values, form_data_patch, if_match, prefer)
+
+# Attachments
+def require_submission(db: Session, user_id: int, submission_id: int) -> None:
+    if not submission_by_id_query(db, user_id, submission_id).with_entities(FormSubmission.id).first():
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Form submission not found"
         )
+
+def attachment_error(exc: Exception) -> HTTPException:
+    if isinstance(exc, AttachmentTooLarge):
+        return HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(exc))
+    if isinstance(exc, UploadOffsetMismatch):
+        return HTTPException(
+            status_code=status.HTTP_409_CONFLICT, detail=str(exc), headers={"Upload-Offset": str(exc.offset)}
+        )
+    if isinstance(exc, UploadBusy):
+        return HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Another request is writing this upload")
+    if isinstance(exc, UploadGone):
+        return HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload not found")
+    return HTTPException(status_code=400, detail=str(exc))
+
+ATTACHMENT_ERRORS = (InvalidUpload, AttachmentTooLarge, UploadOffsetMismatch, UploadBusy, UploadGone)
+
+@router.post(
+    "/api/forms/submissions/{submission_id}/attachments",
+    response_model=List[AttachmentResponse],
+    status_code=status.HTTP_201_CREATED,
+    openapi_extra={"requestBody": {"required": True, "content": {"multipart/form-data": {"schema": {
+        "type": "object",
+        "properties": {"file": {"type": "array", "items": {"type": "string", "format": "binary"}}},
+    }}}}}
+)
+async def upload_attachments(
+    submission_id: int,
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Upload one or more files (multipart/form-data) to a submission.
+    Each file part is streamed to disk as it arrives and stored once per distinct content.
+    """
+    await run_in_threadpool(require_submission, db, current_user.id, submission_id)
+    try:
+        files = await read_multipart(request)
+    except ATTACHMENT_ERRORS as exc:
+        raise attachment_error(exc)
     
-    # Update fields
-    if form_update.title is not None:
-        submission.title = form_update.title
-    if form_update.description is not None:
-        submission.description = form_update.description
-    if form_update.category is not None:
-        submission.category = form_update.category
-    if form_update.priority is not None:
-        submission.priority = form_update.priority
-    if form_update.status is not None:
-        submission.status = form_update.status
-    if form_update.form_data is not None:
-        submission.form_data = form_update.form_data
-    if form_update.attachments is not None:
-        submission.attachments = form_update.attachments
-    
-    submission.updated_at = datetime.utcnow()
+    def save():
+        attachments = store_attachments(db, submission_id, current_user.id, files)
+        db.commit()
+        return [AttachmentResponse.model_validate(attachment) for attachment in attachments]
     
+    return await run_in_threadpool(save)
+
+@router.get("/api/forms/submissions/{submission_id}/attachments", response_model=List[AttachmentResponse])
+def list_attachments(
+    submission_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Files uploaded to a submission, oldest first
+    """
+    require_submission(db, current_user.id, submission_id)
+    return attachments_query(db, current_user.id, submission_id).all()
+
+def owned_attachment(db: Session, user_id: int, submission_id: int, attachment_id: int) -> Attachment:
+    attachment = attachment_by_id_query(db, user_id, submission_id, attachment_id).first()
+    if not attachment:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Attachment not found")
+    return attachment
+
+@router.get("/api/forms/submissions/{submission_id}/attachments/{attachment_id}", response_class=BlobResponse)
+def download_attachment(
+    submission_id: int,
+    attachment_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    range_header: Optional[str] = Header(None, alias="Range"),
+    if_range: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None)
+):
+    """
+    Download an attachment. Supports Range (single byte range), If-Range and If-None-Match.
+    """
+    attachment = owned_attachment(db, current_user.id, submission_id, attachment_id)
+    headers = download_headers(attachment)
+    if etag_matches(if_none_match, headers["ETag"]):
+        return not_modified_response(headers)
+    
+    byte_range = None
+    # A Range is only honoured if the client's copy is still current (If-Range)
+    if range_header and (not if_range or if_range.strip() == headers["ETag"]):
+        try:
+            byte_range = parse_range(range_header, attachment.size)
+        except ValueError:
+            return Response(
+                status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                headers={"Content-Range": f"bytes */{attachment.size}"}
+            )
+    return BlobResponse(
+        store.blob_path(attachment.sha256), attachment.size, attachment.content_type, headers, byte_range
+    )
+
+@router.delete(
+    "/api/forms/submissions/{submission_id}/attachments/{attachment_id}",
+    status_code=status.HTTP_204_NO_CONTENT
+)
+def delete_attachment(
+    submission_id: int,
+    attachment_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Remove an attachment. The blob is deleted by `python attachments.py gc` once nothing references it.
+    """
+    db.delete(owned_attachment(db, current_user.id, submission_id, attachment_id))
     db.commit()
-    db.refresh(submission)
-    
-    return FormSubmissionResponse(
-        id=submission.id,
-        user_id=submission.user_id,
-        form_type=submission.form_type,
-        title=submission.title,
-        description=submission.description,
-        category=submission.category,
-        priority=submission.priority,
-        status=submission.status,
-        form_data=submission.form_data,
-        attachments=submission.attachments,
-        submitted_at=submission.submitted_at,
-        updated_at=submission.updated_at
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+def upload_response(upload: AttachmentUpload, offset: int, status_code: int = 200) -> Response:
+    body = AttachmentUploadResponse(
+        id=upload.id, submission_id=upload.submission_id, filename=upload.filename, size=upload.size, offset=offset
     )
+    headers = {"Upload-Offset": str(offset), "Upload-Length": str(upload.size)}
+    return json_response(body.model_dump_json().encode(), status_code=status_code, headers=headers)
+
+@router.post(
+    "/api/forms/submissions/{submission_id}/uploads",
+    response_model=AttachmentUploadResponse,
+    status_code=status.HTTP_201_CREATED
+)
+def create_attachment_upload(
+    submission_id: int,
+    upload: AttachmentUploadCreate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Start a resumable upload of `size` bytes. Send the bytes with
+    PATCH /api/forms/uploads/{id} (Upload-Offset header) in as many chunks as needed.
+    """
+    require_submission(db, current_user.id, submission_id)
+    try:
+        created = create_upload(
+            db, submission_id, current_user.id, upload.filename, upload.content_type, upload.size
+        )
+    except ATTACHMENT_ERRORS as exc:
+        raise attachment_error(exc)
+    db.commit()
+    response = upload_response(created, 0, status_code=status.HTTP_201_CREATED)
+    response.headers["Location"] = f"/api/forms/uploads/{created.id}"
+    return response
+
+def owned_upload(db: Session, user_id: int, upload_id: str) -> AttachmentUpload:
+    upload = upload_by_id_query(db, user_id, upload_id).first()
+    if not upload:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload not found")
+    return upload
+
+@router.api_route("/api/forms/uploads/{upload_id}", methods=["GET", "HEAD"], response_model=AttachmentUploadResponse)
+def get_attachment_upload(
+    upload_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Progress of a resumable upload; resume by sending bytes from `offset` (also in the Upload-Offset header)
+    """
+    upload = owned_upload(db, current_user.id, upload_id)
+    return upload_response(upload, upload_offset(upload.id))
+
+@router.patch(
+    "/api/forms/uploads/{upload_id}",
+    response_model=AttachmentResponse,
+    responses={status.HTTP_204_NO_CONTENT: {"description": "Chunk stored; more bytes expected"}}
+)
+async def append_attachment_upload(
+    upload_id: str,
+    request: Request,
+    upload_offset_header: int = Header(..., alias="Upload-Offset"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Append the raw request body to a resumable upload at Upload-Offset, which must
+    equal the bytes received so far (409 with the current offset otherwise).
+    Returns 204 with the new Upload-Offset, or 201 with the attachment once all bytes are in.
+    """
+    upload = await run_in_threadpool(owned_upload, db, current_user.id, upload_id)
+    content_length = request.headers.get("content-length")
+    
+    def complete():
+        attachment = complete_upload(db, upload)
+        db.commit()
+        return AttachmentResponse.model_validate(attachment)
+    
+    try:
+        if content_length and upload_offset_header + int(content_length) > upload.size:
+            raise AttachmentTooLarge(f"Upload is declared as {upload.size} bytes")
+        # Completes the upload under the same lock as the write, so a racing PATCH cannot complete it twice
+        offset, attachment = await append_chunk(request, upload, upload_offset_header, complete)
+    except ATTACHMENT_ERRORS as exc:
+        raise attachment_error(exc)
+    
+    if attachment is None:
+        return Response(
+            status_code=status.HTTP_204_NO_CONTENT,
+            headers={"Upload-Offset": str(offset), "Upload-Length": str(upload.size)}
+        )
+    return json_response(attachment.model_dump_json().encode(), status_code=status.HTTP_201_CREATED)
 
 # Health check endpoint
-@app.get("/")
+@router.get("/")
 def read_root():
     return {"message": "KPA Form Data API is running", "version": "1.0.0"}
 
-@app.get("/health")
-def health_check():
-    return {"status": "healthy", "timestamp": datetime.utcnow()}
+@router.get("/health")
+def health_check(request: Request):
+    health = {
+        "status": "healthy",
+        "timestamp": datetime.utcnow(),
+        "password_hashing": password_hasher.stats(),
+        "user_cache": cache_stats(),
+        "database_pool": pool_stats(get_engine()),
+    }
+    if ASYNC_DB_ENABLED:
+        health["async_database_pool"] = pool_stats(get_async_engine())
+    if request.app.state.write_behind is not None:
+        health["write_behind"] = request.app.state.write_behind.stats()
+    health["idempotency_cache"] = idempotency_cache.stats()
+    health["rate_limit"] = request.app.state.rate_limit_backend.stats()
+    return health
+
+@router.get("/metrics", include_in_schema=False)
+def metrics():
+    """
+    Prometheus text-format metrics
+    """
+    gauges = {
+        f"db_pool_{name}": value for name, value in pool_stats(get_engine()).items() if isinstance(value, (int, float))
+    }
+    gauges.update({
+        f"password_hashing_{name}": value for name, value in password_hasher.stats().items()
+        if isinstance(value, (int, float))
+    })
+    return PlainTextResponse(render_metrics(gauges), media_type=CONTENT_TYPE)
+
+def __getattr__(name: str):
+    # `main:app` is built on first access, so importing main (serve.py, preload, tests) builds no app
+    if name == "app":
+        globals()["app"] = create_app()
+        return globals()["app"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # Single-process development server; in production run `python serve.py`
+    import uvicorn
+    uvicorn.run(create_app(), host="0.0.0.0", port=8000)
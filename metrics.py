@@ -0,0 +1,286 @@
+# metrics.py
+"""
+Request timing and Prometheus text-format metrics.
+
+MetricsMiddleware times every request and keeps a per-request breakdown in a
+context variable: time spent in named phases (JWT decode, user lookup,
+bcrypt, serialization) and in SQL statements, recorded by SQLAlchemy cursor
+events on every engine. Server-sent event streams are timed to their first
+byte, not until they close. render_metrics() produces the /metrics body.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import json
+import logging
+import os
+import threading
+import time
+
+# Configuration
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+# Log requests slower than this many milliseconds with their timing breakdown (0 disables the log)
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "0"))
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+slow_request_logger = logging.getLogger("kpa.slow_requests")
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram with one series per label-value tuple
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str],
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                # [bucket counts..., sum, count]
+                series = self._series[labelvalues] = [0] * len(self.buckets) + [0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            snapshot = {labels: list(series) for labels, series in self._series.items()}
+        for labelvalues, series in sorted(snapshot.items()):
+            labels = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, labelvalues)]
+            bounds = [f"{bound:g}" for bound in self.buckets] + ["+Inf"]
+            for bound, count in zip(bounds, series[:len(self.buckets)] + [series[-1]]):
+                bucket_labels = ",".join(labels + [f'le="{bound}"'])
+                yield f"{self.name}_bucket{{{bucket_labels}}} {count}"
+            label_text = f"{{{','.join(labels)}}}" if labels else ""
+            yield f"{self.name}_sum{label_text} {series[-2]:.6f}"
+            yield f"{self.name}_count{label_text} {series[-1]}"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Request latency by route template", ("method", "route", "status")
+)
+PHASE_SECONDS = Histogram(
+    "http_request_phase_seconds", "Time spent in one phase of a request", ("route", "phase")
+)
+REQUEST_DB_STATEMENTS = Histogram(
+    "http_request_db_statements", "SQL statements executed per request", ("route",), buckets=COUNT_BUCKETS
+)
+DB_STATEMENT_SECONDS = Histogram(
+    "db_statement_duration_seconds", "Duration of individual SQL statements", ("operation",)
+)
+PASSWORD_HASH_SECONDS = Histogram(
+    "password_hash_duration_seconds", "bcrypt time on the hashing pool, excluding queue wait", ("operation",)
+)
+
+REGISTRY = [REQUEST_SECONDS, PHASE_SECONDS, REQUEST_DB_STATEMENTS, DB_STATEMENT_SECONDS, PASSWORD_HASH_SECONDS]
+
+
+class RequestTimings:
+    """
+    Timing breakdown of the current request. Context variables are copied into
+    threadpool calls, so this object is mutated rather than replaced.
+    """
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        self.db_statements = 0
+        self.db_seconds = 0.0
+        self.slowest_statement: Tuple[float, str] = (0.0, "")
+
+    def add_phase(self, phase: str, seconds: float) -> None:
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def add_statement(self, statement: str, seconds: float) -> None:
+        self.db_statements += 1
+        self.db_seconds += seconds
+        if seconds > self.slowest_statement[0]:
+            self.slowest_statement = (seconds, statement)
+
+
+_current: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+def record_phase(phase: str, seconds: float) -> None:
+    timings = _current.get()
+    if timings is not None:
+        timings.add_phase(phase, seconds)
+
+
+@contextmanager
+def timed(phase: str) -> Iterator[None]:
+    """
+    Add the time spent in the block to the current request's phase
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_phase(phase, time.perf_counter() - started)
+
+
+def timed_phase(phase: str):
+    """
+    Decorator form of timed()
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(phase):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def observe_password_hash(operation: str, seconds: float) -> None:
+    PASSWORD_HASH_SECONDS.observe(seconds, operation)
+    record_phase("hash", seconds)
+
+
+def _statement_operation(statement: str) -> str:
+    verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    return verb if verb in ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH") else "OTHER"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    elapsed = time.perf_counter() - started
+    DB_STATEMENT_SECONDS.observe(elapsed, _statement_operation(statement))
+    timings = _current.get()
+    if timings is not None:
+        timings.add_statement(statement, elapsed)
+
+
+def _handle_error(context):
+    # A failed statement never reaches after_cursor_execute
+    stack = context.connection.info.get("query_started") if context.connection is not None else None
+    if stack:
+        stack.pop()
+
+
+if METRICS_ENABLED:
+    # Registered on the Engine class, so the sync and async engines are both covered
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(Engine, "handle_error", _handle_error)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording latency per route template and the request's timing breakdown
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._routes: Dict[object, str] = {}
+
+    def _route_template(self, scope) -> str:
+        # Routing stores the matched endpoint in the scope; label by its path template so
+        # /submissions/1 and /submissions/2 share a series
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        template = self._routes.get(endpoint)
+        if template is None:
+            app = scope.get("app")
+            for route in getattr(app, "routes", ()):
+                if getattr(route, "endpoint", None) is endpoint:
+                    template = route.path
+                    break
+            else:
+                template = getattr(endpoint, "__name__", "unmatched")
+            self._routes[endpoint] = template
+        return template
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+        status_code = 500
+        streaming = recorded = False
+
+        async def send_wrapper(message):
+            nonlocal status_code, streaming, recorded
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                streaming = (b"content-type", b"text/event-stream") in (
+                    (name.lower(), value.split(b";")[0].strip()) for name, value in message.get("headers", ())
+                )
+            await send(message)
+            if streaming and not recorded and message["type"] == "http.response.body":
+                # An event stream stays open for minutes or hours: its latency is the time to the first byte
+                recorded = True
+                self._record(scope, status_code, time.perf_counter() - started, timings)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _current.reset(token)
+            if not recorded:
+                self._record(scope, status_code, elapsed, timings)
+
+    def _record(self, scope, status_code: int, elapsed: float, timings: RequestTimings) -> None:
+        route = self._route_template(scope)
+        REQUEST_SECONDS.observe(elapsed, scope["method"], route, str(status_code))
+        for phase, seconds in timings.phases.items():
+            PHASE_SECONDS.observe(seconds, route, phase)
+        PHASE_SECONDS.observe(timings.db_seconds, route, "db")
+        REQUEST_DB_STATEMENTS.observe(timings.db_statements, route)
+
+        if SLOW_REQUEST_MS and elapsed * 1000 >= SLOW_REQUEST_MS:
+            slow_request_logger.warning(json.dumps({
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": route,
+                "status": status_code,
+                "duration_ms": round(elapsed * 1000, 2),
+                "phases_ms": {phase: round(seconds * 1000, 2) for phase, seconds in timings.phases.items()},
+                "db_ms": round(timings.db_seconds * 1000, 2),
+                "db_statements": timings.db_statements,
+                "slowest_statement_ms": round(timings.slowest_statement[0] * 1000, 2),
+                "slowest_statement": timings.slowest_statement[1][:500],
+            }))
+
+
+def render_metrics(extra_gauges: Optional[Dict[str, float]] = None) -> str:
+    """
+    All metrics in the Prometheus text exposition format
+    """
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    for name, value in (extra_gauges or {}).items():
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
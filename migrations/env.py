@@ -0,0 +1,69 @@
+# migrations/env.py
+from logging.config import fileConfig
+
+from alembic import context
+
+from database import Base, DATABASE_URL, get_engine
+import models  # noqa: F401  (registers the tables on Base.metadata)
+
+config = context.config
+
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+# Search structures created by raw DDL (search.py), not declared on the models
+SEARCH_TABLE_PREFIX = "form_submissions_fts"
+SEARCH_COLUMN = "search_vector"
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    """
+    Keep autogenerate from dropping the full-text search index: the FTS5 table
+    and its shadow tables on SQLite, the generated tsvector column on PostgreSQL
+    """
+    if type_ == "table" and name.startswith(SEARCH_TABLE_PREFIX):
+        return False
+    if type_ == "column" and name == SEARCH_COLUMN and reflected and compare_to is None:
+        return False
+    if type_ == "index" and name == f"ix_form_submissions_{SEARCH_COLUMN}":
+        return False
+    return True
+
+
+def run_migrations_offline() -> None:
+    """
+    Emit the migration SQL without connecting to the database
+    """
+    context.configure(
+        url=DATABASE_URL,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+        include_object=include_object,
+        render_as_batch=DATABASE_URL.startswith("sqlite"),
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    """
+    Run migrations against the application's engine
+    """
+    with get_engine().connect() as connection:
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            include_object=include_object,
+            render_as_batch=connection.dialect.name == "sqlite",
+        )
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,35 @@
+"""Composite indexes for the submissions list filters
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (user_id, submitted_at) is served by the leading columns of the first index.
+# The filter indexes carry the sort key too, so filtered pages need no sort step.
+INDEXES = {
+    "ix_form_submissions_user_submitted_id": ["user_id", "submitted_at", "id"],
+    "ix_form_submissions_user_status": ["user_id", "status", "submitted_at", "id"],
+    "ix_form_submissions_user_form_type": ["user_id", "form_type", "submitted_at", "id"],
+}
+
+
+def upgrade() -> None:
+    for name, columns in INDEXES.items():
+        op.create_index(name, "form_submissions", columns, if_not_exists=True)
+
+
+def downgrade() -> None:
+    for name in INDEXES:
+        op.drop_index(name, table_name="form_submissions", if_exists=True)
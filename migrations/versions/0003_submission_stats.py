@@ -0,0 +1,41 @@
+"""Per-user submission counters
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "submission_stats",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("status", sa.String(length=20), nullable=False),
+        sa.Column("form_type", sa.String(length=50), nullable=False),
+        sa.Column("priority", sa.String(length=20), nullable=False),
+        sa.Column("count", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("user_id", "status", "form_type", "priority"),
+    )
+    # Backfill from existing submissions
+    op.execute(
+        "INSERT INTO submission_stats (user_id, status, form_type, priority, count) "
+        "SELECT user_id, status, form_type, priority, COUNT(*) FROM form_submissions "
+        "GROUP BY user_id, status, form_type, priority"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("submission_stats")
@@ -0,0 +1,81 @@
+"""Full-text search index over submissions
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# The DDL of search.py at this revision: FTS5 table + triggers on SQLite, generated tsvector + GIN on PostgreSQL
+FORM_DATA_TEXT = "(SELECT group_concat(value, ' ') FROM json_tree({row}.form_data) WHERE type = 'text')"
+
+SQLITE_UPGRADE = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS form_submissions_fts USING fts5(
+        title, description, form_data_text, user_key, tokenize = 'unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS form_submissions_fts_insert AFTER INSERT ON form_submissions BEGIN
+        INSERT INTO form_submissions_fts (rowid, title, description, form_data_text, user_key)
+        VALUES (new.id, new.title, new.description, {FORM_DATA_TEXT.format(row="new")}, 'u' || new.user_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS form_submissions_fts_delete AFTER DELETE ON form_submissions BEGIN
+        DELETE FROM form_submissions_fts WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS form_submissions_fts_update
+    AFTER UPDATE OF title, description, form_data, user_id ON form_submissions BEGIN
+        UPDATE form_submissions_fts SET
+            title = new.title,
+            description = new.description,
+            form_data_text = {FORM_DATA_TEXT.format(row="new")},
+            user_key = 'u' || new.user_id
+        WHERE rowid = new.id;
+    END""",
+    # Backfill the rows that already exist
+    "DELETE FROM form_submissions_fts",
+    f"""INSERT INTO form_submissions_fts (rowid, title, description, form_data_text, user_key)
+    SELECT id, title, description, {FORM_DATA_TEXT.format(row="form_submissions")}, 'u' || user_id
+    FROM form_submissions""",
+]
+
+SQLITE_DOWNGRADE = [
+    "DROP TRIGGER IF EXISTS form_submissions_fts_update",
+    "DROP TRIGGER IF EXISTS form_submissions_fts_delete",
+    "DROP TRIGGER IF EXISTS form_submissions_fts_insert",
+    "DROP TABLE IF EXISTS form_submissions_fts",
+]
+
+# The generated column fills itself for existing rows
+POSTGRES_UPGRADE = [
+    """ALTER TABLE form_submissions ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(description, '')), 'B') ||
+        setweight(jsonb_to_tsvector('simple', coalesce(form_data::jsonb, '{}'::jsonb), '["string"]'), 'C')
+    ) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_form_submissions_search_vector ON form_submissions USING GIN (search_vector)",
+]
+
+POSTGRES_DOWNGRADE = [
+    "DROP INDEX IF EXISTS ix_form_submissions_search_vector",
+    "ALTER TABLE form_submissions DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def upgrade() -> None:
+    statements = {"sqlite": SQLITE_UPGRADE, "postgresql": POSTGRES_UPGRADE}.get(op.get_bind().dialect.name, [])
+    for statement in statements:
+        op.execute(statement)
+
+
+def downgrade() -> None:
+    statements = {"sqlite": SQLITE_DOWNGRADE, "postgresql": POSTGRES_DOWNGRADE}.get(op.get_bind().dialect.name, [])
+    for statement in statements:
+        op.execute(statement)
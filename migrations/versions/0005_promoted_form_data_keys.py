@@ -0,0 +1,48 @@
+"""Generated, indexed columns for promoted form_data keys
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (form_type, key) pairs from models.PROMOTED_FORM_DATA_KEYS at this revision
+PROMOTED = [("incident_report", "location")]
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    for form_type, key in PROMOTED:
+        name = f"fd_{form_type}_{key}"
+        if dialect == "postgresql":
+            value = f"CAST(form_data ->> '{key}' AS VARCHAR)"
+        else:
+            value = f"CAST(JSON_EXTRACT(form_data, '$.\"{key}\"') AS VARCHAR)"
+        # SQLite can only add VIRTUAL generated columns; PostgreSQL only has STORED ones
+        op.add_column("form_submissions", sa.Column(name, sa.String(), sa.Computed(
+            f"CASE WHEN form_type = '{form_type}' THEN {value} END",
+            persisted=True if dialect == "postgresql" else None
+        )))
+        op.create_index(
+            f"ix_form_submissions_{name}", "form_submissions", ["user_id", name, "submitted_at", "id"],
+            sqlite_where=sa.text(f"{name} IS NOT NULL"), postgresql_where=sa.text(f"{name} IS NOT NULL")
+        )
+
+
+def downgrade() -> None:
+    for form_type, key in reversed(PROMOTED):
+        name = f"fd_{form_type}_{key}"
+        op.drop_index(f"ix_form_submissions_{name}", table_name="form_submissions")
+        # Plain ALTER TABLE DROP COLUMN (SQLite 3.35+): a batch table rebuild would drop the search triggers
+        op.drop_column("form_submissions", name)
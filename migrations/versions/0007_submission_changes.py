@@ -0,0 +1,41 @@
+"""Submission change log for the SSE change feed
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0007"
+down_revision: Union[str, None] = "0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "submission_changes",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("submission_id", sa.Integer(), nullable=False),
+        sa.Column("event", sa.String(length=20), nullable=False),
+        sa.Column("payload", sa.JSON(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sqlite_autoincrement=True,
+    )
+    op.create_index("ix_submission_changes_user_id", "submission_changes", ["user_id", "id"], unique=False)
+    op.create_index("ix_submission_changes_created_at", "submission_changes", ["created_at"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_submission_changes_created_at", table_name="submission_changes")
+    op.drop_index("ix_submission_changes_user_id", table_name="submission_changes")
+    op.drop_table("submission_changes")
@@ -0,0 +1,30 @@
+"""Lease timestamp for in-progress idempotency claims
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0011"
+down_revision: Union[str, None] = "0010"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("idempotency_keys", sa.Column("claimed_at", sa.DateTime(), nullable=True))
+    op.execute("UPDATE idempotency_keys SET claimed_at = created_at")
+    with op.batch_alter_table("idempotency_keys") as batch_op:
+        batch_op.alter_column("claimed_at", existing_type=sa.DateTime(), nullable=False)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("idempotency_keys") as batch_op:
+        batch_op.drop_column("claimed_at")
@@ -1,6 +1,6 @@
 # models.py
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, JSON
-from sqlalchemy.orm import relationship 
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Float, ForeignKey, Text, JSON, LargeBinary, Index, Computed, case, cast
+from sqlalchemy.orm import relationship, deferred
 from database import Base
 from datetime import datetime
 
@@ -36,4 +36,126 @@ class FormSubmission(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationship with user
-    user = relationship("User", back_populates="form_submissions")
\ No newline at end of file
+    user = relationship("User", back_populates="form_submissions")
+
+    __table_args__ = (
+        # Serves the newest-first listing and its keyset pagination
+        Index("ix_form_submissions_user_submitted_id", "user_id", "submitted_at", "id"),
+        # Serve the status / form_type filters without a full scan or a sort step
+        Index("ix_form_submissions_user_status", "user_id", "status", "submitted_at", "id"),
+        Index("ix_form_submissions_user_form_type", "user_id", "form_type", "submitted_at", "id"),
+    )
+
+# form_data keys that get their own generated column and index, per form_type.
+# Adding a key here needs a migration that adds the column and index (see 0005).
+PROMOTED_FORM_DATA_KEYS = {
+    "incident_report": ("location",),
+}
+
+def form_data_value(path):
+    """
+    Text value at a key (or tuple path) inside form_data: json_extract on SQLite, ->> / #>> on PostgreSQL
+    """
+    return cast(FormSubmission.form_data[path].as_string(), String)
+
+def promoted_column_name(form_type: str, key: str) -> str:
+    return f"fd_{form_type}_{key}"
+
+for _form_type, _keys in PROMOTED_FORM_DATA_KEYS.items():
+    for _key in _keys:
+        _name = promoted_column_name(_form_type, _key)
+        # NULL unless the row is of this form_type, so the partial index only holds that type's rows
+        _column = Column(_name, String, Computed(
+            case((FormSubmission.form_type == _form_type, form_data_value(_key)))
+        ))
+        setattr(FormSubmission, _name, deferred(_column))
+        Index(f"ix_form_submissions_{_name}", FormSubmission.user_id, _column,
+              FormSubmission.submitted_at, FormSubmission.id,
+              sqlite_where=_column.isnot(None), postgresql_where=_column.isnot(None))
+
+class SubmissionStat(Base):
+    __tablename__ = "submission_stats"
+    
+    # One counter per user x status x form_type x priority, kept in step with form_submissions
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    status = Column(String(20), primary_key=True)
+    form_type = Column(String(50), primary_key=True)
+    priority = Column(String(20), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+class WriteBehindCheckpoint(Base):
+    __tablename__ = "write_behind_checkpoints"
+    
+    # Last write-behind journal sequence applied to the database, per journal file
+    journal = Column(String(255), primary_key=True)
+    sequence = Column(Integer, nullable=False, default=0)
+
+class SubmissionChange(Base):
+    __tablename__ = "submission_changes"
+    
+    # Change log behind the /api/forms/stream feed; id is the SSE event id
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    submission_id = Column(Integer, nullable=False)
+    event = Column(String(20), nullable=False)
+    payload = Column(JSON, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    
+    __table_args__ = (
+        Index("ix_submission_changes_user_id", "user_id", "id"),
+        Index("ix_submission_changes_created_at", "created_at"),
+        # Ids must never be reused, or a client resuming from Last-Event-ID could skip changes
+        {"sqlite_autoincrement": True},
+    )
+
+class Attachment(Base):
+    __tablename__ = "attachments"
+    
+    # File uploaded to a submission; the bytes live in the content-addressed blob store under sha256
+    id = Column(Integer, primary_key=True)
+    submission_id = Column(Integer, ForeignKey("form_submissions.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    filename = Column(String(255), nullable=False)
+    content_type = Column(String(100), nullable=False)
+    size = Column(Integer, nullable=False)
+    sha256 = Column(String(64), nullable=False, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    
+    __table_args__ = (
+        Index("ix_attachments_submission_id", "submission_id", "id"),
+    )
+
+class AttachmentUpload(Base):
+    __tablename__ = "attachment_uploads"
+    
+    # Resumable upload in progress; received bytes are in the store's uploads directory
+    id = Column(String(32), primary_key=True)
+    submission_id = Column(Integer, ForeignKey("form_submissions.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    filename = Column(String(255), nullable=False)
+    content_type = Column(String(100), nullable=False)
+    size = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    
+    # Stored response per (user, route, Idempotency-Key); status_code is NULL while the first request runs,
+    # which renews claimed_at so a claim left behind by a crashed worker can be taken over
+    key = Column(String(64), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    request_hash = Column(String(64), nullable=False)
+    status_code = Column(Integer, nullable=True)
+    response_headers = Column(JSON, nullable=True)
+    response_body = Column(LargeBinary, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    claimed_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+class RateLimitBucket(Base):
+    __tablename__ = "rate_limit_buckets"
+    
+    # Token bucket shared by all workers when RATE_LIMIT_BACKEND=database; times are Unix seconds
+    key = Column(String(255), primary_key=True)
+    tokens = Column(Float, nullable=False)
+    updated_at = Column(Float, nullable=False, index=True)
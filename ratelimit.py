@@ -0,0 +1,388 @@
+# ratelimit.py
+"""
+Token-bucket rate limiting for the API.
+
+Every request takes one token from a bucket. The bucket refills at `rate` tokens
+per second, up to `burst`. When the bucket is empty the request gets 429 with
+Retry-After. That happens before routing, so it costs no database connection
+and no bcrypt time.
+
+Other /api requests are keyed by the user id of their bearer token. Requests
+to /api/auth/* (no user yet, and where passwords get guessed) and requests
+without a valid token are keyed by client IP, but only with RATE_LIMIT_BY_IP:
+the client IP is the proxy's unless the proxy is trusted (serve.py
+--forwarded-allow-ips / FORWARDED_ALLOW_IPS, uvicorn --proxy-headers), and
+behind an untrusted proxy or a NAT every client would share one bucket.
+Without it, /api/auth/* is keyed by the phone_number in the JSON body, so
+guessing one account's password is still limited.
+
+Each route in ROUTE_LIMITS has its own bucket. RATE_LIMIT_ROUTES adds or
+overrides routes as `METHOD path=count/period[:burst]`, with entries separated
+by `;`:
+
+    RATE_LIMIT_ROUTES="GET /api/forms/search=5/s:10;POST /api/auth/login=20/m"
+
+All other /api routes share one bucket per user (RATE_LIMIT_PER_SECOND,
+RATE_LIMIT_BURST). The buckets live in a backend:
+
+    memory    per process, at most RATE_LIMIT_MAX_BUCKETS (least recently used evicted)
+    database  shared by all workers in rate_limit_buckets, one statement per check
+
+    python ratelimit.py prune      # delete database buckets that have refilled
+"""
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from sqlalchemy import case, delete, select
+from sqlalchemy.dialects import postgresql, sqlite
+from starlette.routing import compile_path
+import anyio
+import argparse
+import json
+import math
+import os
+import threading
+import time
+
+from cache import resolve_token
+from database import SessionLocal
+from models import RateLimitBucket
+
+# Configuration
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+# Opt-in: limit requests without a user by client IP, once the proxy in front is trusted to report it
+RATE_LIMIT_BY_IP = os.getenv("RATE_LIMIT_BY_IP", "false").lower() in ("1", "true", "yes")
+# Shared per-user bucket for /api routes without a limit of their own
+RATE_LIMIT_PER_SECOND = float(os.getenv("RATE_LIMIT_PER_SECOND", "20"))
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "50"))
+RATE_LIMIT_MAX_BUCKETS = int(os.getenv("RATE_LIMIT_MAX_BUCKETS", "100000"))
+RATE_LIMIT_ROUTES = os.getenv("RATE_LIMIT_ROUTES", "")
+
+API_PREFIX = "/api/"
+AUTH_PREFIX = "/api/auth/"
+# Longest phone_number kept in a bucket key; the route rejects anything near it anyway
+MAX_ACCOUNT_KEY_LENGTH = 64
+DEFAULT_ROUTE = "*"
+PERIODS = {"s": 1.0, "m": 60.0, "h": 3600.0}
+
+buckets_table = RateLimitBucket.__table__
+
+
+class Limit(NamedTuple):
+    rate: float
+    burst: float
+
+
+def parse_limit(spec: str) -> Limit:
+    """
+    "count/period[:burst]" with period s, m or h; burst defaults to count
+    """
+    try:
+        amount, _, burst = spec.strip().partition(":")
+        count, _, period = amount.partition("/")
+        limit = Limit(float(count) / PERIODS[period.strip()], float(burst) if burst else float(count))
+    except (KeyError, ValueError):
+        raise ValueError(f"Invalid rate limit {spec!r}, expected count/period[:burst] with period s, m or h")
+    if limit.rate <= 0 or limit.burst < 1:
+        raise ValueError(f"Invalid rate limit {spec!r}: the rate must be positive and the burst at least 1")
+    return limit
+
+
+# (method, path template) -> limit
+ROUTE_LIMITS: Dict[Tuple[str, str], Limit] = {
+    ("POST", "/api/auth/login"): parse_limit("10/m"),
+    ("POST", "/api/auth/register"): parse_limit("20/h:5"),
+    ("POST", "/api/forms/submit/bulk"): parse_limit("1/s:5"),
+    ("GET", "/api/forms/submissions/export"): parse_limit("6/m:2"),
+    ("GET", "/api/forms/search"): parse_limit("5/s:10"),
+}
+
+DEFAULT_LIMIT = Limit(RATE_LIMIT_PER_SECOND, RATE_LIMIT_BURST)
+
+
+def parse_routes(value: str) -> Dict[Tuple[str, str], Limit]:
+    routes = {}
+    for entry in filter(None, (entry.strip() for entry in value.split(";"))):
+        route, _, spec = entry.partition("=")
+        method, _, path = route.strip().partition(" ")
+        if not path.strip().startswith("/"):
+            raise ValueError(f"Invalid RATE_LIMIT_ROUTES entry {entry!r}, expected METHOD path=count/period[:burst]")
+        routes[(method.upper(), path.strip())] = parse_limit(spec)
+    return routes
+
+
+ROUTE_LIMITS.update(parse_routes(RATE_LIMIT_ROUTES))
+
+
+class RouteLimits:
+    """
+    Finds the limit of a request: a dict lookup for fixed paths, a regex for the few templated ones
+    """
+
+    def __init__(self, limits: Dict[Tuple[str, str], Limit], default: Limit):
+        self.default = default
+        self._exact: Dict[Tuple[str, str], Tuple[str, Limit]] = {}
+        self._templated = []
+        for (method, path), limit in limits.items():
+            route = f"{method} {path}"
+            if "{" in path:
+                self._templated.append((method, compile_path(path)[0], route, limit))
+            else:
+                self._exact[(method, path)] = (route, limit)
+
+    def match(self, method: str, path: str) -> Optional[Tuple[str, Limit]]:
+        """
+        (bucket name, limit) for a request, or None when it is not limited
+        """
+        if not path.startswith(API_PREFIX):
+            return None
+        if method == "HEAD":
+            method = "GET"
+        found = self._exact.get((method, path))
+        if found is not None:
+            return found
+        for route_method, regex, route, limit in self._templated:
+            if route_method == method and regex.match(path):
+                return route, limit
+        return DEFAULT_ROUTE, self.default
+
+    def longest_refill(self) -> float:
+        """
+        Seconds an empty bucket takes to fill up under the slowest limit
+        """
+        limits = [limit for _, limit in self._exact.values()] + [entry[3] for entry in self._templated]
+        return max(limit.burst / limit.rate for limit in limits + [self.default])
+
+
+route_limits = RouteLimits(ROUTE_LIMITS, DEFAULT_LIMIT)
+
+
+class MemoryBackend:
+    """
+    Buckets in this process, in an LRU bounded by max_buckets. An evicted bucket
+    was idle longest; if it comes back it starts full.
+    """
+
+    def __init__(self, max_buckets: int = RATE_LIMIT_MAX_BUCKETS):
+        self.max_buckets = max_buckets
+        # key -> [tokens, last refill (monotonic)]
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.rejected = 0
+
+    def take_now(self, key: str, limit: Limit) -> float:
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [limit.burst, now]
+                while len(self._buckets) > self.max_buckets:
+                    self._buckets.popitem(last=False)
+                    self.evictions += 1
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(limit.burst, bucket[0] + (now - bucket[1]) * limit.rate)
+                bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0.0
+            return (1 - bucket[0]) / limit.rate
+
+    async def take(self, key: str, limit: Limit) -> float:
+        """
+        Take a token: 0 when the request may proceed, else seconds until one is available
+        """
+        return self.take_now(key, limit)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"backend": "memory", "buckets": len(self._buckets), "max_buckets": self.max_buckets,
+                    "evictions": self.evictions, "rejected": self.rejected}
+
+
+class DatabaseBackend:
+    """
+    Buckets in the rate_limit_buckets table, so every worker draws from the same ones.
+    A check is one upsert that only takes a token if there is one to take.
+    """
+
+    INSERTS = {
+        "sqlite": sqlite.insert,
+        "postgresql": postgresql.insert,
+    }
+
+    def __init__(self):
+        self.rejected = 0
+
+    def take_statement(self, dialect: str, key: str, limit: Limit, now: float):
+        """
+        Upsert taking a token from the bucket at time now; RETURNING yields nothing when it is empty
+        """
+        if dialect not in self.INSERTS:
+            raise ValueError(f"RATE_LIMIT_BACKEND=database needs SQLite or PostgreSQL, not {dialect}")
+        refilled = buckets_table.c.tokens + (now - buckets_table.c.updated_at) * limit.rate
+        statement = self.INSERTS[dialect](buckets_table).values(key=key, tokens=limit.burst - 1, updated_at=now)
+        return statement.on_conflict_do_update(
+            index_elements=[buckets_table.c.key],
+            set_={
+                "tokens": case((refilled > limit.burst, limit.burst), else_=refilled) - 1,
+                "updated_at": now,
+            },
+            # No token to take: leave the row alone, and RETURNING yields nothing
+            where=refilled >= 1,
+        ).returning(buckets_table.c.tokens)
+
+    @staticmethod
+    def bucket_statement(key: str):
+        return select(buckets_table.c.tokens, buckets_table.c.updated_at).where(buckets_table.c.key == key)
+
+    def take_now(self, key: str, limit: Limit) -> float:
+        now = time.time()
+        with SessionLocal() as db:
+            taken = db.execute(self.take_statement(db.get_bind().dialect.name, key, limit, now)).first()
+            bucket = None if taken is not None else db.execute(self.bucket_statement(key)).first()
+            db.commit()
+        if taken is not None:
+            return 0.0
+        if bucket is None:
+            # Pruned in between: it would have been full, so retry right away
+            return 1 / limit.rate
+        return (1 - min(limit.burst, bucket.tokens + (now - bucket.updated_at) * limit.rate)) / limit.rate
+
+    async def take(self, key: str, limit: Limit) -> float:
+        return await anyio.to_thread.run_sync(self.take_now, key, limit)
+
+    def stats(self) -> dict:
+        return {"backend": "database", "rejected": self.rejected}
+
+
+BACKENDS = {
+    "memory": MemoryBackend,
+    "database": DatabaseBackend,
+}
+
+def prune_buckets() -> int:
+    """
+    Delete database buckets idle long enough to have refilled: a missing bucket starts full anyway
+    """
+    with SessionLocal() as db:
+        result = db.execute(
+            delete(buckets_table).where(buckets_table.c.updated_at < time.time() - route_limits.longest_refill())
+        )
+        db.commit()
+        return result.rowcount
+
+
+def _client_ip(scope) -> str:
+    # Behind a proxy, run uvicorn with --proxy-headers so this is the X-Forwarded-For client
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+def _is_auth(route: str) -> bool:
+    return route.split(" ", 1)[-1].startswith(AUTH_PREFIX)
+
+
+def _identity(scope, route: str) -> Optional[str]:
+    """
+    Bucket owner of a request by user or IP, or None when neither applies
+    """
+    if not _is_auth(route):
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                scheme, _, token = value.decode("latin-1").partition(" ")
+                user_id = resolve_token(token.strip()) if scheme.lower() == "bearer" and token.strip() else None
+                if user_id:
+                    return f"user:{user_id}"
+                break
+    return f"ip:{_client_ip(scope)}" if RATE_LIMIT_BY_IP else None
+
+
+def _account_identity(body: bytes) -> str:
+    """
+    Bucket owner of an /api/auth/* request by the phone_number it signs in or up with.
+    Bodies without one share a bucket: the route rejects them anyway.
+    """
+    try:
+        phone_number = json.loads(body).get("phone_number")
+    except (ValueError, AttributeError):
+        phone_number = None
+    if not isinstance(phone_number, str):
+        phone_number = ""
+    return f"phone:{phone_number.strip()[:MAX_ACCOUNT_KEY_LENGTH]}"
+
+
+async def _read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+def _replay_body(body: bytes, receive):
+    body_sent = False
+
+    async def replay_receive():
+        nonlocal body_sent
+        if not body_sent:
+            body_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return await receive()
+
+    return replay_receive
+
+
+class RateLimitMiddleware:
+    """
+    ASGI middleware answering 429 with Retry-After once a request's bucket is empty
+    """
+
+    def __init__(self, app, backend):
+        self.app = app
+        self.backend = backend
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not RATE_LIMIT_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        matched = route_limits.match(scope["method"], scope["path"])
+        if matched is None:
+            await self.app(scope, receive, send)
+            return
+        route, limit = matched
+        identity = _identity(scope, route)
+        if identity is None and _is_auth(route):
+            # Key sign-ins by account instead, and hand the buffered body on to the route
+            body = await _read_body(receive)
+            identity = _account_identity(body)
+            receive = _replay_body(body, receive)
+        if identity is None:
+            await self.app(scope, receive, send)
+            return
+        wait = await self.backend.take(f"{route}|{identity}", limit)
+        if not wait:
+            await self.app(scope, receive, send)
+            return
+        self.backend.rejected += 1
+        body = json.dumps({"detail": "Too many requests, please retry later"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(wait))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain shared rate-limit buckets")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    subcommands.add_parser("prune", help="delete buckets that have refilled")
+    parser.parse_args()
+    print(f"Deleted {prune_buckets()} idle rate-limit buckets")
@@ -1,7 +1,13 @@
 # schemas.py
-from pydantic import BaseModel, EmailStr, validator
+from pydantic import BaseModel, EmailStr, root_validator, validator
 from typing import Optional, Dict, Any, List
 from datetime import datetime
+import os
+
+# Maximum number of forms accepted by one bulk submission request
+BULK_SUBMIT_MAX_ITEMS = int(os.getenv("BULK_SUBMIT_MAX_ITEMS", "500"))
+# Maximum number of submissions one bulk update may touch
+BULK_UPDATE_MAX_ITEMS = int(os.getenv("BULK_UPDATE_MAX_ITEMS", "1000"))
 
 # User Schemas
 class UserBase(BaseModel):
@@ -31,7 +37,7 @@ class UserResponse(UserBase):
     created_at: datetime
     
     class Config:
-        orm_mode = True
+        from_attributes = True
 
 class UserLogin(BaseModel):
     phone_number: str
@@ -110,6 +116,17 @@ class FormSubmissionUpdate(BaseModel):
                 raise ValueError(f'Category must be one of: {", ".join(allowed_categories)}')
         return v
 
+class FormSubmissionMergePatch(FormSubmissionUpdate):
+    # RFC 7396 merge patch: absent members are left alone, null clears a member,
+    # and form_data is merged key by key (null inside it removes that key)
+    
+    @root_validator(pre=True)
+    def validate_required_members(cls, values):
+        for field in ('title', 'status', 'priority'):
+            if field in values and values[field] is None:
+                raise ValueError(f'{field} cannot be removed')
+        return values
+
 class FormSubmissionResponse(FormSubmissionBase):
     id: int
     user_id: int
@@ -118,7 +135,153 @@ class FormSubmissionResponse(FormSubmissionBase):
     updated_at: Optional[datetime] = None
     
     class Config:
-        orm_mode = True
+        from_attributes = True
+
+class FormSubmissionSummary(BaseModel):
+    # Compact list view for dashboards; skips the large text/JSON columns
+    id: int
+    title: str
+    status: str
+    priority: str
+    
+    class Config:
+        from_attributes = True
+
+# Bulk Submission Schemas
+class FormSubmissionBulkCreate(BaseModel):
+    # Items are validated one by one so a bad form doesn't reject the whole batch
+    items: List[Any]
+    
+    @validator('items')
+    def validate_items(cls, v):
+        if not v:
+            raise ValueError('At least one item is required')
+        if len(v) > BULK_SUBMIT_MAX_ITEMS:
+            raise ValueError(f'At most {BULK_SUBMIT_MAX_ITEMS} items can be submitted at once')
+        return v
+
+class BulkSubmitItemResult(BaseModel):
+    index: int
+    success: bool
+    id: Optional[int] = None
+    error: Optional[str] = None
+
+class BulkSubmitResponse(BaseModel):
+    created: int
+    failed: int
+    results: List[BulkSubmitItemResult]
+
+# Bulk Update Schemas
+class BulkUpdateFilter(BaseModel):
+    # Same meaning as the list/export filters
+    status: Optional[str] = None
+    form_type: Optional[str] = None
+    submitted_from: Optional[datetime] = None
+    submitted_to: Optional[datetime] = None
+
+class FormSubmissionBulkUpdate(BaseModel):
+    # Exactly one of ids / filter selects the submissions to change
+    ids: Optional[List[int]] = None
+    filter: Optional[BulkUpdateFilter] = None
+    status: Optional[str] = None
+    priority: Optional[str] = None
+    category: Optional[str] = None
+    
+    @validator('ids')
+    def validate_ids(cls, v):
+        if v is not None:
+            if not v:
+                raise ValueError('At least one id is required')
+            if len(v) > BULK_UPDATE_MAX_ITEMS:
+                raise ValueError(f'At most {BULK_UPDATE_MAX_ITEMS} submissions can be updated at once')
+        return v
+    
+    @validator('priority')
+    def validate_priority(cls, v):
+        if v is not None:
+            allowed_priorities = ['low', 'medium', 'high', 'urgent']
+            if v not in allowed_priorities:
+                raise ValueError(f'Priority must be one of: {", ".join(allowed_priorities)}')
+        return v
+    
+    @validator('status')
+    def validate_status(cls, v):
+        if v is not None:
+            allowed_statuses = ['submitted', 'in_progress', 'completed', 'rejected']
+            if v not in allowed_statuses:
+                raise ValueError(f'Status must be one of: {", ".join(allowed_statuses)}')
+        return v
+    
+    @validator('category')
+    def validate_category(cls, v):
+        if v is not None:
+            allowed_categories = ['safety', 'hr', 'it', 'facilities', 'finance', 'general']
+            if v not in allowed_categories:
+                raise ValueError(f'Category must be one of: {", ".join(allowed_categories)}')
+        return v
+    
+    @root_validator(skip_on_failure=True)
+    def validate_selection(cls, values):
+        if (values.get('ids') is None) == (values.get('filter') is None):
+            raise ValueError('Provide either ids or filter')
+        if all(values.get(field) is None for field in ('status', 'priority', 'category')):
+            raise ValueError('Provide at least one of status, priority or category')
+        return values
+
+class BulkUpdateItemResult(BaseModel):
+    id: int
+    success: bool
+    changed: bool = False
+    error: Optional[str] = None
+
+class BulkUpdateResponse(BaseModel):
+    updated: int
+    unchanged: int
+    failed: int
+    results: List[BulkUpdateItemResult]
+
+# Attachment Schemas
+class AttachmentResponse(BaseModel):
+    id: int
+    submission_id: int
+    filename: str
+    content_type: str
+    size: int
+    sha256: str
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+class AttachmentUploadCreate(BaseModel):
+    filename: str
+    size: int
+    content_type: Optional[str] = None
+    
+    @validator('size')
+    def validate_size(cls, v):
+        if v < 0:
+            raise ValueError('Size cannot be negative')
+        return v
+
+class AttachmentUploadResponse(BaseModel):
+    id: str
+    submission_id: int
+    filename: str
+    size: int
+    offset: int
+
+class QueuedSubmissionResponse(BaseModel):
+    receipt: str
+    status: str
+    submitted_at: datetime
+
+# Statistics Schema
+class SubmissionStatsResponse(BaseModel):
+    total: int
+    by_status: Dict[str, int]
+    by_form_type: Dict[str, int]
+    by_priority: Dict[str, int]
 
 # Error Response Schema
 class ErrorResponse(BaseModel):
@@ -0,0 +1,199 @@
+# search.py
+"""
+Full-text search over submission title, description and the string values
+inside form_data.
+
+SQLite: an FTS5 table (rowid = submission id) kept in sync by triggers. Each
+row also carries a "u<user_id>" token so a user's matches are found by
+intersecting posting lists instead of filtering every match in the table.
+PostgreSQL: a generated tsvector column with a GIN index.
+
+Pages are offsets into the ranking, limited to the submissions that existed
+when the first page was read, so new submissions never shift later pages.
+Scores are not frozen: editing a match, or enough other changes to the
+index, can still move a row across a page boundary between requests.
+"""
+from typing import List, Optional, Tuple
+from sqlalchemy import column, event, func, literal_column, select, table, text
+from sqlalchemy.orm import Query, Session
+import base64
+import json
+import re
+
+from database import UnsupportedDialect
+from models import FormSubmission
+
+FTS_TABLE = "form_submissions_fts"
+
+# Relative weight of matches in title, description and form_data values
+TITLE_WEIGHT, DESCRIPTION_WEIGHT, FORM_DATA_WEIGHT = 10.0, 5.0, 1.0
+
+_FORM_DATA_TEXT = "(SELECT group_concat(value, ' ') FROM json_tree({row}.form_data) WHERE type = 'text')"
+
+SQLITE_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        title, description, form_data_text, user_key, tokenize = 'unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS form_submissions_fts_insert AFTER INSERT ON form_submissions BEGIN
+        INSERT INTO {FTS_TABLE} (rowid, title, description, form_data_text, user_key)
+        VALUES (new.id, new.title, new.description, {_FORM_DATA_TEXT.format(row="new")}, 'u' || new.user_id);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS form_submissions_fts_delete AFTER DELETE ON form_submissions BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS form_submissions_fts_update
+    AFTER UPDATE OF title, description, form_data, user_id ON form_submissions BEGIN
+        UPDATE {FTS_TABLE} SET
+            title = new.title,
+            description = new.description,
+            form_data_text = {_FORM_DATA_TEXT.format(row="new")},
+            user_key = 'u' || new.user_id
+        WHERE rowid = new.id;
+    END""",
+]
+
+SQLITE_BACKFILL = f"""INSERT INTO {FTS_TABLE} (rowid, title, description, form_data_text, user_key)
+    SELECT id, title, description, {_FORM_DATA_TEXT.format(row="form_submissions")}, 'u' || user_id
+    FROM form_submissions"""
+
+SQLITE_DROP = [
+    "DROP TRIGGER IF EXISTS form_submissions_fts_update",
+    "DROP TRIGGER IF EXISTS form_submissions_fts_delete",
+    "DROP TRIGGER IF EXISTS form_submissions_fts_insert",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+POSTGRES_DDL = [
+    """ALTER TABLE form_submissions ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(description, '')), 'B') ||
+        setweight(jsonb_to_tsvector('simple', coalesce(form_data::jsonb, '{}'::jsonb), '["string"]'), 'C')
+    ) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_form_submissions_search_vector ON form_submissions USING GIN (search_vector)",
+]
+
+POSTGRES_DROP = [
+    "DROP INDEX IF EXISTS ix_form_submissions_search_vector",
+    "ALTER TABLE form_submissions DROP COLUMN IF EXISTS search_vector",
+]
+
+
+class InvalidSearch(ValueError):
+    """
+    Raised for an empty query or an undecodable search cursor
+    """
+
+
+def install_search(connection, backfill: bool = False) -> None:
+    """
+    Create the search index structures for the connection's dialect
+    """
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        for statement in SQLITE_DDL:
+            connection.execute(text(statement))
+        if backfill:
+            connection.execute(text(f"DELETE FROM {FTS_TABLE}"))
+            connection.execute(text(SQLITE_BACKFILL))
+    elif dialect == "postgresql":
+        # The generated column fills itself for existing rows
+        for statement in POSTGRES_DDL:
+            connection.execute(text(statement))
+
+
+def uninstall_search(connection) -> None:
+    statements = {"sqlite": SQLITE_DROP, "postgresql": POSTGRES_DROP}.get(connection.dialect.name, [])
+    for statement in statements:
+        connection.execute(text(statement))
+
+
+@event.listens_for(FormSubmission.__table__, "after_create")
+def _install_search_after_create(target, connection, **kw):
+    # Fresh databases built with create_all get the index too
+    install_search(connection)
+
+
+def _terms(q: str) -> List[str]:
+    terms = re.findall(r"\w+", q)
+    if not terms:
+        raise InvalidSearch("Search query must contain at least one word")
+    return terms
+
+
+def encode_search_cursor(offset: int, max_id: int) -> str:
+    raw = json.dumps([offset, max_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_search_cursor(cursor: str) -> Tuple[int, int]:
+    """
+    (offset into the ranking, highest submission id the ranking covers)
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        offset, max_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        offset, max_id = int(offset), int(max_id)
+    except (ValueError, TypeError) as exc:
+        raise InvalidSearch("Invalid search cursor") from exc
+    if offset < 0:
+        raise InvalidSearch("Invalid search cursor")
+    return offset, max_id
+
+
+def search_query(db: Session, user_id: int, q: str) -> Tuple[Query, object]:
+    """
+    Query of (FormSubmission, score) for the user's matches; higher score ranks first
+    """
+    terms = _terms(q)
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        fts_table = table(FTS_TABLE, column("rowid"))
+        # Auxiliary functions and MATCH take the table name itself as their argument
+        fts = literal_column(FTS_TABLE)
+        # Every term must appear in the searchable columns, and the row must belong to the user
+        match = 'user_key : "u{}" AND {{title description form_data_text}} : ({})'.format(
+            int(user_id), " ".join(f'"{term}"' for term in terms)
+        )
+        # bm25() is lower-is-better, negate it so both dialects sort descending
+        score = (-func.bm25(fts, TITLE_WEIGHT, DESCRIPTION_WEIGHT, FORM_DATA_WEIGHT, 0.0)).label("score")
+        query = db.query(FormSubmission, score).select_from(fts_table).join(
+            FormSubmission, FormSubmission.id == fts_table.c.rowid
+        ).filter(fts.op("MATCH")(match))
+    elif dialect == "postgresql":
+        vector = literal_column("form_submissions.search_vector")
+        tsquery = func.websearch_to_tsquery("simple", " ".join(terms))
+        score = func.ts_rank_cd(vector, tsquery).label("score")
+        query = db.query(FormSubmission, score).filter(
+            FormSubmission.user_id == user_id, vector.op("@@")(tsquery)
+        )
+    else:
+        raise UnsupportedDialect(f"Full-text search is not supported on {dialect}")
+    return query, score
+
+
+def search_submissions(
+    db: Session, user_id: int, q: str, limit: int = 10, cursor: Optional[str] = None
+) -> Tuple[List[FormSubmission], Optional[str]]:
+    """
+    One ranked page of matches plus the cursor for the next page.
+
+    bm25 / ts_rank_cd score every match whatever the page, so an offset costs no
+    more than a keyset on the score would, and unlike one it does not depend on
+    scores staying put between requests.
+    """
+    query, score = search_query(db, user_id, q)
+    if cursor:
+        offset, max_id = decode_search_cursor(cursor)
+    else:
+        # max(id) is one index probe; later pages never see rows added after this one
+        offset, max_id = 0, db.execute(select(func.max(FormSubmission.id))).scalar() or 0
+    rows = (
+        query.filter(FormSubmission.id <= max_id)
+        .order_by(score.element.desc(), FormSubmission.id.desc())
+        .offset(offset)
+        .limit(limit)
+        .all()
+    )
+    submissions = [submission for submission, _ in rows]
+    next_page = encode_search_cursor(offset + len(rows), max_id) if rows and len(rows) == limit else None
+    return submissions, next_page
@@ -0,0 +1,55 @@
+# serializers.py
+from typing import Dict, Iterable, List, Optional
+from fastapi.responses import Response
+from pydantic import TypeAdapter
+import orjson
+
+from schemas import FormSubmissionResponse, FormSubmissionSummary
+from metrics import timed_phase
+
+submission_list_adapter = TypeAdapter(List[FormSubmissionResponse])
+summary_list_adapter = TypeAdapter(List[FormSubmissionSummary])
+
+
+@timed_phase("serialize")
+def submission_json(submission) -> bytes:
+    """
+    Validate an ORM row into FormSubmissionResponse once and encode it to JSON in one step
+    """
+    return FormSubmissionResponse.model_validate(submission).model_dump_json().encode()
+
+
+@timed_phase("serialize")
+def submissions_json(submissions: Iterable) -> bytes:
+    return submission_list_adapter.dump_json(
+        [FormSubmissionResponse.model_validate(submission) for submission in submissions]
+    )
+
+
+@timed_phase("serialize")
+def summaries_json(rows: Iterable) -> bytes:
+    return summary_list_adapter.dump_json([FormSubmissionSummary.model_validate(row) for row in rows])
+
+
+@timed_phase("serialize")
+def projected_json(rows: Iterable, names: List[str]) -> bytes:
+    """
+    Encode column-projected rows keeping only the requested fields
+    """
+    return orjson.dumps([{name: row._mapping[name] for name in names} for row in rows])
+
+
+def json_response(body: bytes, status_code: int = 200, headers: Optional[Dict[str, str]] = None) -> Response:
+    """
+    Wrap already-encoded JSON. Returning a Response skips FastAPI's second
+    validation and encoding pass against response_model.
+    """
+    return Response(content=body, status_code=status_code, headers=headers, media_type="application/json")
+
+
+def submission_response(submission, status_code: int = 200, headers: Optional[Dict[str, str]] = None) -> Response:
+    return json_response(submission_json(submission), status_code=status_code, headers=headers)
+
+
+def submissions_response(submissions: Iterable, headers: Optional[Dict[str, str]] = None) -> Response:
+    return json_response(submissions_json(submissions), headers=headers)
@@ -0,0 +1,297 @@
+# serve.py
+"""
+Production entry point: runs the API in several worker processes.
+
+    python serve.py                       # one worker per CPU, gunicorn if installed
+    python serve.py --workers 8 --preload
+    python serve.py --check               # print the resolved settings and exit
+
+The default server is gunicorn with uvicorn workers. It supports --preload
+(import the app once in the master and fork it), restarts workers that die,
+and replaces them one at a time on SIGHUP, each old worker finishing its
+requests first. Without gunicorn, uvicorn's own process supervisor is used.
+It has no preload and no reload.
+
+Before any worker starts, the launcher:
+
+* runs the DB_SCHEMA_CHECK once, so workers skip it and never race on create_all;
+* exports WEB_CONCURRENCY, so database.py gives every worker an equal share of
+  DB_MAX_CONNECTIONS (see database.pool_limits). On PostgreSQL, when it is not
+  set, it is read from the server's max_connections and exported for the
+  workers. When the budget leaves a worker no connection, startup fails;
+* picks uvloop and httptools when they are installed.
+
+Every option has an environment default; the command line overrides it.
+"""
+from typing import Callable, Dict, Optional
+import argparse
+import importlib.util
+import json
+import logging
+import os
+import sys
+
+# Configuration
+SERVER = os.getenv("SERVER", "gunicorn" if importlib.util.find_spec("gunicorn") else "uvicorn")
+SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8000"))
+SERVER_WORKERS = int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+SERVER_PRELOAD = os.getenv("SERVER_PRELOAD", "false").lower() in ("1", "true", "yes")
+# Event loop and HTTP parser: "auto" picks uvloop and httptools when installed
+SERVER_LOOP = os.getenv("SERVER_LOOP", "auto")
+SERVER_HTTP = os.getenv("SERVER_HTTP", "auto")
+# Longer than the load balancer's idle timeout, or it may reuse a connection the server is closing (502s)
+SERVER_KEEPALIVE_SECONDS = int(os.getenv("SERVER_KEEPALIVE_SECONDS", "75"))
+SERVER_BACKLOG = int(os.getenv("SERVER_BACKLOG", "2048"))
+# Time a stopping worker gets to finish in-flight requests before they are cancelled
+SERVER_GRACEFUL_TIMEOUT = int(os.getenv("SERVER_GRACEFUL_TIMEOUT", "30"))
+# Recycle a worker after this many requests (0 = never); jitter keeps workers from restarting together
+SERVER_MAX_REQUESTS = int(os.getenv("SERVER_MAX_REQUESTS", "0"))
+SERVER_MAX_REQUESTS_JITTER = int(os.getenv("SERVER_MAX_REQUESTS_JITTER", "0"))
+SERVER_LIMIT_CONCURRENCY = int(os.getenv("SERVER_LIMIT_CONCURRENCY", "0"))
+# Proxies whose X-Forwarded-For is trusted; RATE_LIMIT_BY_IP is only meaningful with the proxy in front listed
+FORWARDED_ALLOW_IPS = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "info")
+
+APP = "main:create_app"
+
+logger = logging.getLogger("serve")
+
+
+def available(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def resolve_loop(loop: str) -> str:
+    if loop == "auto":
+        return "uvloop" if available("uvloop") else "asyncio"
+    return loop
+
+
+def resolve_http(http: str) -> str:
+    if http == "auto":
+        return "httptools" if available("httptools") else "h11"
+    return http
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--server", choices=["gunicorn", "uvicorn"], default=SERVER)
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS)
+    parser.add_argument("--preload", action=argparse.BooleanOptionalAction, default=SERVER_PRELOAD,
+                        help="import the app in the master and fork workers from it (gunicorn only)")
+    parser.add_argument("--loop", choices=["auto", "uvloop", "asyncio"], default=SERVER_LOOP)
+    parser.add_argument("--http", choices=["auto", "httptools", "h11"], default=SERVER_HTTP)
+    parser.add_argument("--keep-alive", type=int, default=SERVER_KEEPALIVE_SECONDS, help="idle keep-alive seconds")
+    parser.add_argument("--backlog", type=int, default=SERVER_BACKLOG)
+    parser.add_argument("--graceful-timeout", type=int, default=SERVER_GRACEFUL_TIMEOUT)
+    parser.add_argument("--max-requests", type=int, default=SERVER_MAX_REQUESTS)
+    parser.add_argument("--max-requests-jitter", type=int, default=SERVER_MAX_REQUESTS_JITTER)
+    parser.add_argument("--limit-concurrency", type=int, default=SERVER_LIMIT_CONCURRENCY,
+                        help="connections per worker before new ones get 503 (0 = no limit)")
+    parser.add_argument("--forwarded-allow-ips", default=FORWARDED_ALLOW_IPS)
+    parser.add_argument("--log-level", default=LOG_LEVEL)
+    parser.add_argument("--check", action="store_true", help="run the schema check, print the resolved settings and exit")
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.server == "gunicorn" and not available("gunicorn"):
+        parser.error("gunicorn is not installed; pip install gunicorn or use --server uvicorn")
+    args.loop = resolve_loop(args.loop)
+    args.http = resolve_http(args.http)
+    return args
+
+
+def prepare_database(workers: int) -> dict:
+    """
+    Share the connection budget among the workers and run the schema check once.
+    Must run before anything imports database, which reads its configuration on import.
+    """
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+    schema_check = os.environ.get("DB_SCHEMA_CHECK", "create")
+    # The workers inherit this: the check below already ran
+    os.environ["DB_SCHEMA_CHECK"] = "skip"
+
+    from sqlalchemy import create_engine
+    import database
+    import models  # noqa: F401  (registers the tables on Base.metadata)
+    import search  # noqa: F401  (installs the full-text index when form_submissions is created)
+
+    engines = 2 if database.ASYNC_DB_ENABLED else 1
+    # A throwaway engine: nothing pooled in this process may leak into forked workers
+    engine = database.configure_engine(create_engine(database.DATABASE_URL))
+    try:
+        max_connections = database.DB_MAX_CONNECTIONS or server_max_connections(engine)
+        # Raises when the budget leaves a worker no connection, before the schema check touches anything
+        pool_size, max_overflow = database.pool_limits(workers, max_connections)
+        if max_connections:
+            # The workers (and a --preload app built in this process) size their pools from it
+            os.environ["DB_MAX_CONNECTIONS"] = str(max_connections)
+            database.DB_MAX_CONNECTIONS = max_connections
+        database.check_schema(engine, schema_check)
+    finally:
+        engine.dispose()
+    return {
+        "dialect": engine.dialect.name,
+        "schema_check": schema_check,
+        "max_connections": max_connections or None,
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "connections_per_worker": (pool_size + max_overflow) * engines,
+        "connections_total": (pool_size + max_overflow) * engines * workers,
+    }
+
+
+def server_max_connections(engine) -> int:
+    """
+    Connections PostgreSQL accepts from ordinary roles; 0 (no limit) for other databases
+    """
+    if engine.dialect.name != "postgresql":
+        return 0
+    from sqlalchemy import text
+    with engine.connect() as connection:
+        limit = int(connection.execute(text("SHOW max_connections")).scalar())
+        reserved = int(connection.execute(text("SHOW superuser_reserved_connections")).scalar())
+    return limit - reserved
+
+
+def warn_single_process_backends(workers: int) -> None:
+    if workers == 1:
+        return
+    from change_feed import CHANGE_FEED_BACKEND
+    from ratelimit import RATE_LIMIT_BACKEND, RATE_LIMIT_ENABLED
+    if CHANGE_FEED_BACKEND == "memory":
+        logger.warning("CHANGE_FEED_BACKEND=memory: SSE clients only see changes made by their own worker; "
+                       "use CHANGE_FEED_BACKEND=database")
+    if RATE_LIMIT_ENABLED and RATE_LIMIT_BACKEND == "memory":
+        logger.warning("RATE_LIMIT_BACKEND=memory: every worker has its own buckets, so limits are %dx higher; "
+                       "use RATE_LIMIT_BACKEND=database", workers)
+
+
+def gunicorn_options(args: argparse.Namespace) -> Dict[str, object]:
+    return {
+        "bind": f"{args.host}:{args.port}",
+        "workers": args.workers,
+        "worker_class": "serve.Worker",
+        "preload_app": args.preload,
+        "keepalive": args.keep_alive,
+        "backlog": args.backlog,
+        "graceful_timeout": args.graceful_timeout,
+        # Heartbeat: a worker whose event loop is blocked this long is killed and replaced
+        "timeout": max(30, args.graceful_timeout),
+        "max_requests": args.max_requests,
+        "max_requests_jitter": args.max_requests_jitter,
+        "forwarded_allow_ips": args.forwarded_allow_ips,
+        "loglevel": args.log_level,
+        "accesslog": "-" if args.log_level == "debug" else None,
+    }
+
+
+def run_gunicorn(args: argparse.Namespace) -> None:
+    from gunicorn.app.base import BaseApplication
+
+    # gunicorn imports serve.Worker as a fresh module, which reads its settings from the environment
+    os.environ.update(
+        SERVER_LOOP=args.loop,
+        SERVER_HTTP=args.http,
+        SERVER_LIMIT_CONCURRENCY=str(args.limit_concurrency),
+        SERVER_GRACEFUL_TIMEOUT=str(args.graceful_timeout),
+    )
+
+    class Application(BaseApplication):
+        def __init__(self, options: Dict[str, object], load_app: Callable):
+            self.options = options
+            self.load_app = load_app
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return self.load_app()
+
+    def load_app():
+        from main import create_app
+        return create_app()
+
+    Application(gunicorn_options(args), load_app).run()
+
+
+def run_uvicorn(args: argparse.Namespace) -> None:
+    import uvicorn
+
+    if args.preload:
+        logger.warning("--preload needs gunicorn; uvicorn workers each import the app")
+    uvicorn.run(
+        APP,
+        factory=True,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        loop=args.loop,
+        http=args.http,
+        timeout_keep_alive=args.keep_alive,
+        backlog=args.backlog,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        limit_concurrency=args.limit_concurrency or None,
+        limit_max_requests=args.max_requests or None,
+        forwarded_allow_ips=args.forwarded_allow_ips,
+        log_level=args.log_level,
+    )
+
+
+def main(argv=None) -> Optional[int]:
+    args = parse_args(argv)
+    logging.basicConfig(level=args.log_level.upper(), format="%(levelname)s:     %(message)s")
+    try:
+        database = prepare_database(args.workers)
+    except ValueError as exc:
+        logger.error("%s", exc)
+        return 1
+    settings = {
+        "server": args.server,
+        "bind": f"{args.host}:{args.port}",
+        "workers": args.workers,
+        "preload": args.preload and args.server == "gunicorn",
+        "loop": args.loop,
+        "http": args.http,
+        "keep_alive_s": args.keep_alive,
+        "backlog": args.backlog,
+        "graceful_timeout_s": args.graceful_timeout,
+        "database": database,
+    }
+    if args.check:
+        print(json.dumps(settings, indent=2))
+        return 0
+    logger.info("Starting %s", json.dumps(settings))
+    warn_single_process_backends(args.workers)
+    if args.server == "gunicorn":
+        run_gunicorn(args)
+    else:
+        run_uvicorn(args)
+    return 0
+
+
+if available("gunicorn"):
+    from uvicorn.workers import UvicornWorker
+
+    class Worker(UvicornWorker):
+        """
+        gunicorn worker running uvicorn with the launcher's loop, parser and drain settings
+        """
+
+        CONFIG_KWARGS = {
+            "loop": resolve_loop(SERVER_LOOP),
+            "http": resolve_http(SERVER_HTTP),
+            "limit_concurrency": SERVER_LIMIT_CONCURRENCY or None,
+            # Cancel what is still running (e.g. SSE streams) and run the lifespan shutdown,
+            # flushing write-behind, before gunicorn's graceful timeout kills the worker
+            "timeout_graceful_shutdown": max(1, SERVER_GRACEFUL_TIMEOUT - 5),
+        }
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+# stats.py
+"""
+Per-user submission counters by status x form_type x priority.
+
+The counters are adjusted in the same transaction as the submission change,
+so reads never need a GROUP BY over form_submissions. To backfill or repair:
+
+    python stats.py rebuild [--user-id N]
+"""
+from collections import Counter
+from typing import Dict, Iterable, Optional, Tuple
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+import argparse
+
+from database import UnsupportedDialect
+from models import FormSubmission, SubmissionStat
+
+StatKey = Tuple[str, str, str]  # (status, form_type, priority)
+
+stats_table = SubmissionStat.__table__
+
+
+def _upsert(dialect_name: str):
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise UnsupportedDialect(f"Submission stats are not supported on {dialect_name}")
+    statement = insert(stats_table)
+    return statement.on_conflict_do_update(
+        index_elements=["user_id", "status", "form_type", "priority"],
+        set_={"count": stats_table.c.count + statement.excluded.count},
+    )
+
+
+def adjust_stats(db: Session, user_id: int, deltas: Dict[StatKey, int]) -> None:
+    """
+    Add deltas to the user's counters with one upsert. Runs inside the caller's transaction.
+    """
+    rows = [
+        {"user_id": user_id, "status": status, "form_type": form_type, "priority": priority, "count": delta}
+        for (status, form_type, priority), delta in deltas.items()
+        if delta
+    ]
+    if rows:
+        db.execute(_upsert(db.get_bind().dialect.name), rows)
+
+
+def record_created(db: Session, user_id: int, keys: Iterable[StatKey]) -> None:
+    """
+    Count newly inserted submissions
+    """
+    adjust_stats(db, user_id, Counter(keys))
+
+
+def record_changed(db: Session, user_id: int, old_key: StatKey, new_key: StatKey) -> None:
+    """
+    Move one submission between counters when its status or priority changed
+    """
+    if old_key != new_key:
+        adjust_stats(db, user_id, {old_key: -1, new_key: 1})
+
+
+def record_changed_many(db: Session, user_id: int, changes: Iterable[Tuple[StatKey, StatKey]]) -> None:
+    """
+    Move many submissions between counters with one upsert
+    """
+    deltas = Counter()
+    for old_key, new_key in changes:
+        if old_key != new_key:
+            deltas[old_key] -= 1
+            deltas[new_key] += 1
+    adjust_stats(db, user_id, deltas)
+
+
+def user_stats_statement(user_id: int):
+    return select(
+        stats_table.c.status, stats_table.c.form_type, stats_table.c.priority, stats_table.c.count
+    ).where(stats_table.c.user_id == user_id, stats_table.c.count != 0)
+
+
+def user_stats(db: Session, user_id: int) -> dict:
+    """
+    Totals for one user, read from at most a few dozen counter rows
+    """
+    by_status, by_form_type, by_priority = Counter(), Counter(), Counter()
+    rows = db.execute(user_stats_statement(user_id)).all()
+    for status, form_type, priority, count in rows:
+        by_status[status] += count
+        by_form_type[form_type] += count
+        by_priority[priority] += count
+    return {
+        "total": sum(by_status.values()),
+        "by_status": dict(by_status),
+        "by_form_type": dict(by_form_type),
+        "by_priority": dict(by_priority),
+    }
+
+
+def rebuild_stats(db: Session, user_id: Optional[int] = None) -> int:
+    """
+    Recompute counters from form_submissions (all users, or one). Returns the number of counter rows.
+    """
+    delete_statement = delete(stats_table)
+    grouped = select(
+        FormSubmission.user_id, FormSubmission.status, FormSubmission.form_type,
+        FormSubmission.priority, func.count().label("count")
+    ).group_by(FormSubmission.user_id, FormSubmission.status, FormSubmission.form_type, FormSubmission.priority)
+    if user_id is not None:
+        delete_statement = delete_statement.where(stats_table.c.user_id == user_id)
+        grouped = grouped.where(FormSubmission.user_id == user_id)
+    db.execute(delete_statement)
+    result = db.execute(
+        stats_table.insert().from_select(["user_id", "status", "form_type", "priority", "count"], grouped)
+    )
+    return result.rowcount
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Submission statistics maintenance")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    rebuild = subcommands.add_parser("rebuild", help="Recompute counters from form_submissions")
+    rebuild.add_argument("--user-id", type=int, default=None)
+    args = parser.parse_args()
+
+    with SessionLocal() as session:
+        written = rebuild_stats(session, user_id=args.user_id)
+        session.commit()
+    print(f"✅ Rebuilt submission stats ({written} counter rows).")
@@ -0,0 +1,146 @@
+# tests/test_query_plans.py
+"""
+Run EXPLAIN QUERY PLAN on SQLite for every query shape the API issues and
+fail any that scans a whole table instead of searching an index.
+
+Usage (from the project root):
+    python -m pytest tests
+"""
+from datetime import datetime
+from typing import NamedTuple
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+import pytest
+import re
+
+from database import Base
+from models import User, FormSubmission
+from crud import (
+    submissions_query, submission_by_id_query, paginate_submissions, encode_cursor,
+    project_columns, bulk_rows_query, bulk_update_statement, SUMMARY_FIELDS
+)
+from export import export_statement
+from stats import user_stats_statement
+from search import search_query
+from change_feed import changes_since_statement
+from attachments import attachments_query, attachment_by_id_query, upload_by_id_query
+from idempotency import key_statement, takeover_statement
+from ratelimit import DatabaseBackend, parse_limit
+
+USER_ID = 1
+CURSOR = encode_cursor(datetime(2024, 1, 1), 100)
+IDEMPOTENCY_KEY = "0" * 64
+BUCKET_KEY = "POST /api/auth/login|phone:5550001111"
+
+
+class BulkRow(NamedTuple):
+    id: int
+    version: datetime
+
+
+BULK_ROWS = [BulkRow(submission_id, datetime(2024, 1, 1)) for submission_id in (1, 2, 3)]
+
+# name -> builder returning the query exactly as the endpoint issues it
+QUERY_SHAPES = {
+    "user by phone number (register/login)": lambda db: db.query(User).filter(User.phone_number == "1234567890"),
+    "user by id (get_current_user)": lambda db: db.query(User).filter(User.id == USER_ID),
+    "submission by id (get/update)": lambda db: submission_by_id_query(db, USER_ID, 1),
+    "list": lambda db: paginate_submissions(submissions_query(db, USER_ID), 10),
+    "list offset": lambda db: paginate_submissions(submissions_query(db, USER_ID), 10, skip=100),
+    "list cursor": lambda db: paginate_submissions(submissions_query(db, USER_ID), 10, cursor=CURSOR),
+    "list by status": lambda db: paginate_submissions(
+        submissions_query(db, USER_ID, status="submitted"), 10
+    ),
+    "list by form_type": lambda db: paginate_submissions(
+        submissions_query(db, USER_ID, form_type="feedback"), 10
+    ),
+    "list by status and form_type": lambda db: paginate_submissions(
+        submissions_query(db, USER_ID, status="submitted", form_type="feedback"), 10
+    ),
+    "list by status cursor": lambda db: paginate_submissions(
+        submissions_query(db, USER_ID, status="submitted"), 10, cursor=CURSOR
+    ),
+    "list by form_data key": lambda db: paginate_submissions(
+        submissions_query(db, USER_ID, form_data={"location": "plant-3"}), 10
+    ),
+    "list by promoted form_data key": lambda db: paginate_submissions(
+        submissions_query(db, USER_ID, form_type="incident_report", form_data={"location": "plant-3"}), 10
+    ),
+    "list summary fields": lambda db: paginate_submissions(
+        project_columns(submissions_query(db, USER_ID), list(SUMMARY_FIELDS)), 10, cursor=CURSOR
+    ),
+    "export by date range": lambda db: export_statement(
+        submissions_query(db, USER_ID, submitted_from=datetime(2024, 1, 1), submitted_to=datetime(2025, 1, 1))
+    ),
+    "export by status": lambda db: export_statement(submissions_query(db, USER_ID, status="submitted")),
+    "stats": lambda db: user_stats_statement(USER_ID),
+    "search": lambda db: search_query(db, USER_ID, "printer toner")[0],
+    "change feed replay (Last-Event-ID)": lambda db: changes_since_statement(USER_ID, 100),
+    "bulk update read by id list": lambda db: bulk_rows_query(
+        submissions_query(db, USER_ID).filter(FormSubmission.id.in_([row.id for row in BULK_ROWS])), 1000
+    ),
+    "bulk update by id list": lambda db: bulk_update_statement(USER_ID, BULK_ROWS, {"status": "completed"}),
+    "attachment list": lambda db: attachments_query(db, USER_ID, 1),
+    "attachment by id (download/delete)": lambda db: attachment_by_id_query(db, USER_ID, 1, 1),
+    "upload by id (resumable PATCH/HEAD)": lambda db: upload_by_id_query(db, USER_ID, "0" * 32),
+    "idempotency key claim": lambda db: key_statement(IDEMPOTENCY_KEY),
+    "idempotency stale claim takeover": lambda db: takeover_statement(
+        IDEMPOTENCY_KEY, datetime(2024, 1, 1), "0" * 64, datetime(2024, 1, 2)
+    ),
+    "rate-limit bucket take (upsert)": lambda db: DatabaseBackend().take_statement(
+        "sqlite", BUCKET_KEY, parse_limit("10/m"), 0.0
+    ),
+    "rate-limit bucket read": lambda db: DatabaseBackend.bucket_statement(BUCKET_KEY),
+}
+
+# Shapes that read a whole index on purpose (none yet). Their "SCAN ... USING [COVERING] INDEX"
+# lines pass; a scan of the table itself still fails.
+UNBOUNDED_SHAPES = set()
+
+_FTS_MATCH = re.compile(r"VIRTUAL TABLE INDEX \d+:M")
+# The literal list of a row-value IN, e.g. "(id, version) IN ((1, ...), (2, ...))"
+_CONSTANT_ROWS = re.compile(r"^SCAN (\d+ )?CONSTANT ROWS?$")
+
+
+def explain(db: Session, query) -> list:
+    """
+    Return the EXPLAIN QUERY PLAN detail lines for a query
+    """
+    statement = getattr(query, "statement", query)
+    compiled = statement.compile(db.get_bind(), compile_kwargs={"literal_binds": True})
+    # literal_binds does not reach an upsert's ON CONFLICT ... SET values: pass those as parameters
+    parameters = tuple(compiled.params[name] for name in compiled.positiontup or [])
+    return [row[-1] for row in db.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", parameters)]
+
+
+def is_full_scan(detail: str, unbounded: bool = False) -> bool:
+    # Only "SEARCH ..." is bounded. "SCAN t USING [COVERING] INDEX ix" still reads every entry of
+    # the index; the one SCAN that is a lookup is an FTS5 MATCH ("VIRTUAL TABLE INDEX <n>:M...")
+    if not detail.startswith("SCAN") or _FTS_MATCH.search(detail) or _CONSTANT_ROWS.match(detail):
+        return False
+    return not (unbounded and " USING " in detail and "INDEX" in detail)
+
+
+def uses_index(detail: str) -> bool:
+    return detail.startswith("SEARCH") or bool(_FTS_MATCH.search(detail)) or (
+        " USING " in detail and "INDEX" in detail
+    )
+
+
+@pytest.fixture(scope="module")
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+@pytest.mark.parametrize("name", list(QUERY_SHAPES))
+def test_query_uses_an_index(db, name):
+    plan = explain(db, QUERY_SHAPES[name](db))
+    unbounded = name in UNBOUNDED_SHAPES
+    assert not any(is_full_scan(detail, unbounded) for detail in plan), f"{name} scans a whole table: {plan}"
+    # An INSERT has no plan to read; the bucket upsert's conflict target is the primary key
+    assert not plan or any(uses_index(detail) for detail in plan), f"{name} uses no index: {plan}"
@@ -0,0 +1,418 @@
+# write_behind.py
+"""
+Optional write-behind mode for POST /api/forms/submit.
+
+A submission is appended to a local journal and acknowledged once the journal
+is fsynced. Concurrent requests share one fsync (group commit). A background
+thread then inserts queued submissions in batches, one transaction per batch,
+and records the last applied journal sequence in write_behind_checkpoints in
+the same transaction. On startup, journal entries past the checkpoint are
+replayed, so a crash loses nothing that was acknowledged.
+
+Each process locks its own journal file (<WRITE_BEHIND_JOURNAL>.<slot>), so
+several workers can run side by side. A restarted worker picks up whichever
+unlocked journal it finds first and replays it. It also applies every other
+unlocked journal that still has entries, so nothing is stranded in a slot no
+worker takes any more (e.g. after the worker count went down).
+"""
+from collections import deque
+from datetime import datetime
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+from sqlalchemy import update
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.orm import Session
+import json
+import logging
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single journal, no cross-process lock
+    fcntl = None
+
+from models import WriteBehindCheckpoint
+from schemas import FormSubmissionCreate
+from crud import submission_row, insert_submission_rows
+from stats import record_created
+from change_feed import record_changes, submission_payload
+
+# Configuration
+WRITE_BEHIND_ENABLED = os.getenv("WRITE_BEHIND_ENABLED", "false").lower() in ("1", "true", "yes")
+# Journal path prefix; empty keeps the queue in memory only (acknowledged forms are lost on a crash)
+WRITE_BEHIND_JOURNAL = os.getenv("WRITE_BEHIND_JOURNAL", "write_behind.journal")
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "200"))
+WRITE_BEHIND_FLUSH_MS = float(os.getenv("WRITE_BEHIND_FLUSH_MS", "50"))
+# Submissions accepted but not yet in the database before submit returns 503
+WRITE_BEHIND_QUEUE_MAX = int(os.getenv("WRITE_BEHIND_QUEUE_MAX", "10000"))
+
+JOURNAL_SLOTS = 64
+RETRY_DELAY_MIN, RETRY_DELAY_MAX = 0.1, 5.0
+
+logger = logging.getLogger("kpa.write_behind")
+
+
+class WriteBehindOverloaded(Exception):
+    """
+    Raised when the write-behind queue is full
+    """
+
+
+class Journal:
+    """
+    Append-only NDJSON journal with group fsync
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._written_seq = 0
+        self._synced_seq = 0
+
+    def try_open(self) -> bool:
+        """
+        Open and exclusively lock the journal; False if another process holds it
+        """
+        handle = open(self.path, "a+b")
+        if fcntl is not None:
+            try:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                handle.close()
+                return False
+        self._file = handle
+        return True
+
+    def read(self) -> List[dict]:
+        """
+        Records in the journal. A torn final line from a crash mid-append is cut off.
+        """
+        self._file.seek(0)
+        data = self._file.read()
+        valid = data[:data.rfind(b"\n") + 1]
+        if len(valid) != len(data):
+            self._file.truncate(len(valid))
+        records = [json.loads(line) for line in valid.splitlines() if line.strip()]
+        if records:
+            self._written_seq = self._synced_seq = records[-1]["seq"]
+        return records
+
+    def append(self, record: dict) -> None:
+        line = json.dumps(record, separators=(",", ":")).encode() + b"\n"
+        with self._lock:
+            self._file.write(line)
+            self._written_seq = record["seq"]
+
+    def sync(self, seq: int) -> None:
+        """
+        Return once record seq is on disk. Whoever holds the sync lock fsyncs
+        everything written so far, so waiting requests share one fsync.
+        """
+        with self._sync_lock:
+            if self._synced_seq >= seq:
+                return
+            with self._lock:
+                target = self._written_seq
+                self._file.flush()
+            os.fsync(self._file.fileno())
+            self._synced_seq = target
+
+    def truncate_if_applied(self, applied_seq: int) -> None:
+        """
+        Empty the journal once everything in it is in the database
+        """
+        with self._sync_lock, self._lock:
+            if applied_seq >= self._written_seq and self._file.tell() > 0:
+                self._file.flush()
+                self._file.truncate(0)
+                self._file.seek(0)
+                os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class Entry:
+    __slots__ = ("seq", "user_id", "form", "submitted_at", "enqueued")
+
+    def __init__(self, seq: int, user_id: int, form: FormSubmissionCreate, submitted_at: datetime):
+        self.seq = seq
+        self.user_id = user_id
+        self.form = form
+        self.submitted_at = submitted_at
+        self.enqueued = time.monotonic()
+
+
+class WriteBehindWriter:
+    """
+    Bounded submission queue drained by a background group-commit thread
+    """
+
+    def __init__(self, session_factory: Callable[[], Session], journal_path: str = WRITE_BEHIND_JOURNAL,
+                 batch_size: int = WRITE_BEHIND_BATCH_SIZE, flush_ms: float = WRITE_BEHIND_FLUSH_MS,
+                 queue_max: int = WRITE_BEHIND_QUEUE_MAX):
+        self.session_factory = session_factory
+        self.journal_path = journal_path
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_ms / 1000
+        self.queue_max = max(1, queue_max)
+        self.journal: Optional[Journal] = None
+        self.journal_name = "memory"
+        self._queue: Deque[Entry] = deque()
+        self._cond = threading.Condition()
+        self._pending = 0
+        self._seq = 0
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._applied_seq = 0
+        self.flushed = 0
+        self.batches = 0
+        self.rejected = 0
+        self.dropped = 0
+        self.deferred = 0
+        self.replayed = 0
+
+    def start(self) -> None:
+        """
+        Open a journal, replay what the database has not seen yet and start the writer thread
+        """
+        if self._thread is not None:
+            return
+        if self.journal_path:
+            self.journal = self._open_journal()
+            self.journal_name = os.path.basename(self.journal.path)
+            self._apply_orphaned_journals()
+        entries = self._unapplied_entries()
+        with self._cond:
+            for entry in entries:
+                self._enqueue(entry)
+        if entries:
+            self.replayed += len(entries)
+            logger.warning("Replaying %d journaled submissions from %s", len(entries), self.journal.path)
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    def _open_journal(self) -> Journal:
+        directory = os.path.dirname(os.path.abspath(self.journal_path))
+        os.makedirs(directory, exist_ok=True)
+        for slot in range(JOURNAL_SLOTS if fcntl is not None else 1):
+            journal = Journal(f"{self.journal_path}.{slot}")
+            if journal.try_open():
+                return journal
+        raise RuntimeError(f"All {JOURNAL_SLOTS} write-behind journals at {self.journal_path}.* are locked")
+
+    def _unapplied_entries(self) -> List[Entry]:
+        """
+        Journal entries past this journal's checkpoint, in order
+        """
+        checkpoint = self._load_checkpoint()
+        self._seq = self._applied_seq = checkpoint
+        entries = []
+        if self.journal is not None:
+            for record in self.journal.read():
+                self._seq = max(self._seq, record["seq"])
+                if record["seq"] > checkpoint:
+                    entries.append(Entry(
+                        record["seq"], record["user_id"], FormSubmissionCreate.model_validate(record["form"]),
+                        datetime.fromisoformat(record["submitted_at"])
+                    ))
+        return entries
+
+    def _apply_orphaned_journals(self) -> None:
+        """
+        Flush the other journals no process holds, each under its own checkpoint, and empty them
+        """
+        for slot in range(JOURNAL_SLOTS if fcntl is not None else 1):
+            path = f"{self.journal_path}.{slot}"
+            if path == self.journal.path or not os.path.exists(path) or not os.path.getsize(path):
+                continue
+            journal = Journal(path)
+            if not journal.try_open():
+                # A running worker's own journal
+                continue
+            orphan = WriteBehindWriter(self.session_factory, self.journal_path, self.batch_size)
+            orphan.journal, orphan.journal_name = journal, os.path.basename(path)
+            try:
+                entries = orphan._unapplied_entries()
+                if entries:
+                    logger.warning("Replaying %d journaled submissions from unclaimed %s", len(entries), path)
+                for start in range(0, len(entries), self.batch_size):
+                    orphan._flush(entries[start:start + self.batch_size])
+                journal.truncate_if_applied(orphan._applied_seq)
+                self.replayed += len(entries)
+                self.flushed += orphan.flushed
+                self.dropped += orphan.dropped
+            except Exception:
+                # Left as it is; the next start tries again
+                logger.exception("Replaying unclaimed write-behind journal %s failed", path)
+            finally:
+                journal.close()
+
+    def _load_checkpoint(self) -> int:
+        with self.session_factory() as db:
+            checkpoint = db.get(WriteBehindCheckpoint, self.journal_name)
+            if checkpoint is None:
+                db.add(WriteBehindCheckpoint(journal=self.journal_name, sequence=0))
+                db.commit()
+                return 0
+            return checkpoint.sequence
+
+    def _enqueue(self, entry: Entry) -> None:
+        self._queue.append(entry)
+        self._pending += 1
+        self._cond.notify()
+
+    def submit(self, user_id: int, form: FormSubmissionCreate) -> Tuple[str, datetime]:
+        """
+        Journal and queue a submission. Returns (receipt, submitted_at) once it is durable.
+        """
+        submitted_at = datetime.utcnow()
+        with self._cond:
+            if self._pending >= self.queue_max:
+                self.rejected += 1
+                raise WriteBehindOverloaded("Submission queue is full")
+            self._seq += 1
+            entry = Entry(self._seq, user_id, form, submitted_at)
+            if self.journal is not None:
+                # Appending under the queue lock keeps journal order equal to queue order
+                self.journal.append({
+                    "seq": entry.seq, "user_id": user_id, "form": form.model_dump(mode="json"),
+                    "submitted_at": submitted_at.isoformat(),
+                })
+            self._enqueue(entry)
+        if self.journal is not None:
+            self.journal.sync(entry.seq)
+        return f"{self.journal_name}:{entry.seq}", submitted_at
+
+    def _next_batch(self) -> List[Entry]:
+        with self._cond:
+            while not self._queue and not self._stopping:
+                self._cond.wait()
+            # Let the batch fill up until the oldest entry has waited flush_interval
+            while self._queue and len(self._queue) < self.batch_size and not self._stopping:
+                remaining = self._queue[0].enqueued + self.flush_interval - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+
+    def _run(self) -> None:
+        delay = RETRY_DELAY_MIN
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+            try:
+                self._flush(batch)
+                delay = RETRY_DELAY_MIN
+            except Exception:
+                logger.exception("Write-behind flush of %d submissions failed", len(batch))
+                with self._cond:
+                    retry = not self._stopping
+                    if retry:
+                        # Put the batch back in order and retry once the database recovers
+                        self._queue.extendleft(reversed(batch))
+                    else:
+                        # Stop here: committing a later batch would move the checkpoint past this one.
+                        # This batch and everything queued after it stay in the journal for the next start
+                        batch.extend(self._queue)
+                        self._queue.clear()
+                        self._pending -= len(batch)
+                        self.deferred += len(batch)
+                if not retry:
+                    return
+                time.sleep(delay)
+                delay = min(delay * 2, RETRY_DELAY_MAX)
+                continue
+            with self._cond:
+                self._pending -= len(batch)
+                drained = self._pending == 0 and not self.deferred
+            if drained and self.journal is not None:
+                self.journal.truncate_if_applied(self._applied_seq)
+
+    def _flush(self, batch: List[Entry]) -> None:
+        """
+        Insert a batch, its stats and the new checkpoint in one transaction
+        """
+        # Entries committed before a failed attempt are not inserted twice
+        batch = [entry for entry in batch if entry.seq > self._applied_seq]
+        if not batch:
+            return
+        dropped = 0
+        with self.session_factory() as db:
+            try:
+                self._insert(db, batch)
+                db.commit()
+                self._applied_seq = batch[-1].seq
+            except (IntegrityError, DataError):
+                db.rollback()
+                # Isolate the bad row(s) so one invalid submission does not hold back the rest
+                for entry in batch:
+                    try:
+                        self._insert(db, [entry])
+                        db.commit()
+                    except (IntegrityError, DataError):
+                        db.rollback()
+                        logger.exception("Dropping write-behind submission %s", entry.seq)
+                        dropped += 1
+                        db.execute(self._checkpoint(entry.seq))
+                        db.commit()
+                    self._applied_seq = entry.seq
+        self.dropped += dropped
+        self.flushed += len(batch) - dropped
+        self.batches += 1
+
+    def _checkpoint(self, seq: int):
+        return update(WriteBehindCheckpoint).where(
+            WriteBehindCheckpoint.journal == self.journal_name
+        ).values(sequence=seq)
+
+    def _insert(self, db: Session, batch: List[Entry]) -> None:
+        rows = [submission_row(entry.user_id, entry.form, entry.submitted_at) for entry in batch]
+        ids = insert_submission_rows(db, rows)
+        keys_by_user: Dict[int, list] = {}
+        payloads_by_user: Dict[int, list] = {}
+        for entry, new_id, row in zip(batch, ids, rows):
+            keys_by_user.setdefault(entry.user_id, []).append(("submitted", entry.form.form_type, entry.form.priority))
+            payloads_by_user.setdefault(entry.user_id, []).append(submission_payload(new_id, row))
+        for user_id, keys in keys_by_user.items():
+            record_created(db, user_id, keys)
+            record_changes(db, user_id, "created", payloads_by_user[user_id])
+        db.execute(self._checkpoint(batch[-1].seq))
+
+    def stop(self) -> None:
+        """
+        Flush everything still queued, then stop the writer and release the journal
+        """
+        if self._thread is None:
+            return
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        # The thread drains the queue before it exits
+        self._thread.join()
+        self._thread = None
+        if self.journal is not None:
+            self.journal.close()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "journal": self.journal.path if self.journal is not None else None,
+                "pending": self._pending,
+                "queue_max": self.queue_max,
+                "batch_size": self.batch_size,
+                "flush_ms": self.flush_interval * 1000,
+                "flushed": self.flushed,
+                "batches": self.batches,
+                "rejected": self.rejected,
+                "dropped": self.dropped,
+                "deferred_to_replay": self.deferred,
+                "replayed": self.replayed,
+            }